@@ -1,5 +1,7 @@
+from store.customers import CUSTOMER_ID_CLAIM, customers
 from store.models import Customer
 from djoser.serializers import UserSerializer as BaseUserSerializer, UserCreateSerializer as BaseUserCreateSerializer
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer as BaseTokenObtainPairSerializer
 
 
 class UserCreateSerializer(BaseUserCreateSerializer):
@@ -10,4 +12,17 @@ class UserCreateSerializer(BaseUserCreateSerializer):
 
 class UserSerializer(BaseUserSerializer):
     class Meta(BaseUserSerializer.Meta):
-        fields = ['id', 'username', 'email', 'first_name', 'last_name']
\ No newline at end of file
+        fields = ['id', 'username', 'email', 'first_name', 'last_name']
+
+
+class TokenObtainPairSerializer(BaseTokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        # Access tokens minted from this refresh token inherit the claim, so
+        # authenticated store requests can skip the customer lookup.
+        try:
+            token[CUSTOMER_ID_CLAIM] = customers.get(user.id)
+        except Customer.DoesNotExist:
+            pass
+        return token
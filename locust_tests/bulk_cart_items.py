@@ -0,0 +1,56 @@
+# Compares restoring a basket with one POST per line against a single POST
+# to /store/carts/<id>/items/bulk/. Both users create a fresh cart and add
+# the same BASKET_SIZE products; compare the "restore" rows in the stats
+# table, which time the whole basket.
+import os
+import django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'storefront.settings.dev')
+django.setup()
+
+from random import sample
+from time import perf_counter
+from django.urls import reverse
+from locust import HttpUser, task, constant
+
+
+BASKET_SIZE = 20
+PRODUCT_IDS = range(1, 1001)
+
+
+def record_restore(environment, name, start):
+    environment.events.request.fire(
+        request_type='RESTORE',
+        name=name,
+        response_time=(perf_counter() - start) * 1000,
+        response_length=0,
+        exception=None)
+
+
+class SingleCallsUser(HttpUser):
+    wait_time = constant(0)
+
+    @task
+    def restore_basket(self):
+        cart_id = self.client.post(reverse('cart-list')).json()['id']
+        start = perf_counter()
+        for product_id in sample(PRODUCT_IDS, BASKET_SIZE):
+            self.client.post(
+                reverse('cart-items-list', kwargs={'cart_pk': cart_id}),
+                json={'product_id': product_id, 'quantity': 1},
+                name='/store/carts/items')
+        record_restore(self.environment, f'restore [{BASKET_SIZE} single calls]', start)
+
+
+class BulkCallUser(HttpUser):
+    wait_time = constant(0)
+
+    @task
+    def restore_basket(self):
+        cart_id = self.client.post(reverse('cart-list')).json()['id']
+        start = perf_counter()
+        self.client.post(
+            reverse('cart-items-bulk', kwargs={'cart_pk': cart_id}),
+            json=[{'product_id': product_id, 'quantity': 1}
+                  for product_id in sample(PRODUCT_IDS, BASKET_SIZE)],
+            name='/store/carts/items/bulk')
+        record_restore(self.environment, f'restore [{BASKET_SIZE} lines in bulk]', start)
@@ -0,0 +1,54 @@
+# Compares offset pagination against cursor pagination on /store/products/.
+# Run against a catalog of at least 100k products (10,000 pages of 10) and
+# compare the per-depth rows in the stats table: offset latency grows with the
+# page number, cursor latency should stay flat.
+import os
+import django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'storefront.settings.dev')
+django.setup()
+
+from django.urls import reverse
+from locust import HttpUser, task, constant
+
+
+DEPTHS = [1, 10, 100, 1000, 10000]
+
+
+def depth_bucket(page):
+    for depth in DEPTHS:
+        if page <= depth:
+            return depth
+    return DEPTHS[-1]
+
+
+class OffsetUser(HttpUser):
+    wait_time = constant(0)
+
+    @task
+    def view_deep_pages(self):
+        for depth in DEPTHS:
+            self.client.get(
+                reverse('products-list'),
+                params={'page': depth, 'ordering': 'unit_price'},
+                name=f'/store/products?page [{depth}]')
+
+
+class CursorUser(HttpUser):
+    wait_time = constant(0)
+
+    def on_start(self):
+        self.restart()
+
+    def restart(self):
+        self.page = 0
+        self.next_url = reverse('products-list') + '?pagination=cursor&ordering=unit_price'
+
+    @task
+    def view_next_page(self):
+        self.page += 1
+        response = self.client.get(
+            self.next_url,
+            name=f'/store/products?cursor [<={depth_bucket(self.page)}]')
+        self.next_url = response.json()['next']
+        if self.next_url is None or self.page >= DEPTHS[-1]:
+            self.restart()
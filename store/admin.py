@@ -1,9 +1,10 @@
 from django.contrib import admin, messages
-from django.db.models.aggregates import Count
+from django.db.models import Q
 from django.db.models.query import QuerySet
 from django.utils.html import format_html, urlencode
 from django.urls import reverse
 from . import models
+from .filters import sort_key_prefix
 
 
 class InventoryFilter(admin.SimpleListFilter):
@@ -35,7 +36,7 @@ class ProductAdmin(admin.ModelAdmin):
     autocomplete_fields = ['collection']
     inlines = [ProductImageInline]
     list_display = ['title', 'unit_price',
-                    'inventory_status', 'collection_title']
+                    'inventory_status', 'collection_title', 'reviews_count']
     list_editable = ['unit_price']
     list_filter = ['collection', 'last_update', InventoryFilter]
     list_per_page = 10
@@ -85,20 +86,22 @@ class CollectionAdmin(admin.ModelAdmin):
             }))
         return format_html('<a href="{}">{} Products</a>', url, collection.products_count)
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(
-            products_count=Count('products')
-        )
-
 
 @admin.register(models.Customer)
 class CustomerAdmin(admin.ModelAdmin):
     list_display = ['first_name', 'last_name',  'membership', 'orders']
     list_editable = ['membership']
     list_per_page = 10
-    list_select_related = ['user']
-    ordering = ['user__first_name', 'user__last_name']
-    search_fields = ['first_name__istartswith', 'last_name__istartswith']
+    ordering = ['sort_key', 'id']
+    search_fields = ['sort_key', 'last_name']
+
+    def get_search_results(self, request, queryset, search_term):
+        # Same lookups as CustomerSearchFilter. The sort key prefix is a
+        # range, which search_fields cannot express.
+        for term in search_term.split():
+            queryset = queryset.filter(
+                sort_key_prefix(term) | Q(last_name__istartswith=term))
+        return queryset, False
 
     @admin.display(ordering='orders_count')
     def orders(self, customer):
@@ -110,11 +113,6 @@ class CustomerAdmin(admin.ModelAdmin):
             }))
         return format_html('<a href="{}">{} Orders</a>', url, customer.orders_count)
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(
-            orders_count=Count('order')
-        )
-
 
 class OrderItemInline(admin.TabularInline):
     autocomplete_fields = ['product']
@@ -128,4 +126,31 @@ class OrderItemInline(admin.TabularInline):
 class OrderAdmin(admin.ModelAdmin):
     autocomplete_fields = ['customer']
     inlines = [OrderItemInline]
-    list_display = ['id', 'placed_at', 'customer']
+    list_display = ['id', 'placed_at', 'customer', 'item_count', 'total']
+    readonly_fields = ['item_count', 'total']
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        models.Order.objects.filter(pk=form.instance.pk).update_totals()
+
+
+class ArchivedOrderItemInline(admin.TabularInline):
+    model = models.ArchivedOrderItem
+    fields = ['product', 'quantity', 'unit_price']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+
+@admin.register(models.ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    inlines = [ArchivedOrderItemInline]
+    list_display = ['id', 'placed_at', 'customer', 'item_count', 'total']
+    list_select_related = ['customer']
+    readonly_fields = ['id', 'placed_at', 'payment_status', 'customer', 'total', 'item_count', 'archived_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
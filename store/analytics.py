@@ -0,0 +1,197 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Max, Min, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import (
+    ArchivedOrder, ArchivedOrderItem, CollectionSalesDay, Order, OrderItem,
+    ProductSalesDay, SalesDay)
+
+
+logger = logging.getLogger(__name__)
+
+TOTALS = ['revenue', 'units', 'orders']
+
+# model -> the field rows are keyed on besides the date.
+ROLLUPS = {
+    SalesDay: None,
+    ProductSalesDay: 'product_id',
+    CollectionSalesDay: 'collection_id',
+}
+
+# model -> the order item lookup rows are grouped on when rebuilding.
+LINE_KEYS = {
+    SalesDay: None,
+    ProductSalesDay: 'product_id',
+    CollectionSalesDay: 'product__collection_id',
+}
+
+REPORT_GROUPS = {
+    'product': (ProductSalesDay, 'product'),
+    'collection': (CollectionSalesDay, 'collection'),
+}
+
+
+def line_revenue():
+    return ExpressionWrapper(
+        F('quantity') * F('unit_price'),
+        output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def tally(lines):
+    """
+    Sum (product_id, collection_id, quantity, unit_price) lines of one order
+    into {model: {key: [revenue, units, orders]}}.
+    """
+    totals = {model: defaultdict(lambda: [Decimal(0), 0, 1]) for model in ROLLUPS}
+    for product_id, collection_id, quantity, unit_price in lines:
+        for model, key in ((SalesDay, None),
+                           (ProductSalesDay, product_id),
+                           (CollectionSalesDay, collection_id)):
+            row = totals[model][key]
+            row[0] += quantity * unit_price
+            row[1] += quantity
+    return totals
+
+
+def record_order(order):
+    """Add an order's items to the rollups of the day it was placed."""
+    lines = list(order.items.values_list(
+        'product_id', 'product__collection_id', 'quantity', 'unit_price'))
+    if not lines:
+        return
+    day = timezone.localdate(order.placed_at)
+    totals = tally(lines)
+    try:
+        increment(day, totals)
+    except IntegrityError:
+        # A concurrent order created one of the day's rows first; the
+        # retry sees it and adds to it instead.
+        increment(day, totals)
+
+
+def increment(day, totals):
+    with transaction.atomic():
+        for model, key_field in ROLLUPS.items():
+            rows = totals[model]
+            existing = model.objects.select_for_update().filter(date=day)
+            if key_field is not None:
+                existing = existing.filter(**{f'{key_field}__in': rows}).order_by(key_field)
+            existing = {getattr(row, key_field) if key_field else None: row for row in existing}
+
+            for key, row in existing.items():
+                revenue, units, orders = rows[key]
+                row.revenue += revenue
+                row.units += units
+                row.orders += orders
+            model.objects.bulk_update(existing.values(), TOTALS)
+            model.objects.bulk_create([
+                model(date=day, revenue=revenue, units=units, orders=orders,
+                      **({key_field: key} if key_field else {}))
+                for key, (revenue, units, orders) in sorted(rows.items())
+                if key not in existing
+            ])
+
+
+def day_range(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def rebuild_day(day):
+    """Recompute one day's rollups from the order and archive tables."""
+    start, end = day_range(day)
+    totals = {model: defaultdict(lambda: [Decimal(0), 0, 0]) for model in ROLLUPS}
+    sums = {
+        'revenue': Sum(line_revenue()),
+        'units': Sum('quantity'),
+        'orders': Count('order_id', distinct=True),
+    }
+    for item_model in (OrderItem, ArchivedOrderItem):
+        lines = item_model.objects \
+            .filter(order__placed_at__gte=start, order__placed_at__lt=end) \
+            .order_by()
+        for model, lookup in LINE_KEYS.items():
+            if lookup is None:
+                rows = [{'key': None, **lines.aggregate(**sums)}]
+            else:
+                rows = lines.values(key=F(lookup)).annotate(**sums)
+            for row in rows:
+                if not row['units']:
+                    continue
+                total = totals[model][row['key']]
+                total[0] += row['revenue']
+                total[1] += row['units']
+                total[2] += row['orders']
+
+    with transaction.atomic():
+        for model, key_field in ROLLUPS.items():
+            model.objects.filter(date=day).delete()
+            model.objects.bulk_create([
+                model(date=day, revenue=revenue, units=units, orders=orders,
+                      **({key_field: key} if key_field else {}))
+                for key, (revenue, units, orders) in totals[model].items()
+            ], batch_size=1000)
+
+
+def rebuild_rollups(since=None, until=None):
+    """
+    Rebuild the rollups of every day from `since` to `until` inclusive (the
+    first and last day with orders by default), one day per transaction,
+    and return the number of days rebuilt.
+    """
+    if since is None or until is None:
+        bounds = [model.objects.aggregate(first=Min('placed_at'), last=Max('placed_at'))
+                  for model in (Order, ArchivedOrder)]
+        firsts = [bound['first'] for bound in bounds if bound['first'] is not None]
+        lasts = [bound['last'] for bound in bounds if bound['last'] is not None]
+        if not firsts:
+            return 0
+        since = since or timezone.localdate(min(firsts))
+        until = until or timezone.localdate(max(lasts))
+
+    day = since
+    while day <= until:
+        rebuild_day(day)
+        logger.debug('Rebuilt sales rollups for %s.', day)
+        day += timedelta(days=1)
+    return (until - since).days + 1
+
+
+def sales_report(since, until, group_by='day', limit=100):
+    """
+    Totals for the days from `since` to `until` inclusive, read from the
+    rollups only, with a row per day or the top `limit` products or
+    collections by revenue.
+    """
+    days = SalesDay.objects.filter(date__gte=since, date__lte=until)
+    report = {
+        'since': since,
+        'until': until,
+        'group_by': group_by,
+        'totals': days.aggregate(
+            revenue=Coalesce(Sum('revenue'), Decimal(0)),
+            units=Coalesce(Sum('units'), 0),
+            orders=Coalesce(Sum('orders'), 0)),
+    }
+
+    if group_by == 'day':
+        report['results'] = list(days.order_by('date').values('date', *TOTALS))
+        return report
+
+    model, related = REPORT_GROUPS[group_by]
+    rows = model.objects \
+        .filter(date__gte=since, date__lte=until) \
+        .values_list(f'{related}_id', f'{related}__title') \
+        .annotate(total_revenue=Sum('revenue'), total_units=Sum('units'), total_orders=Sum('orders')) \
+        .order_by('-total_revenue', f'{related}_id')[:limit]
+    report['results'] = [
+        {'id': id, 'title': title, 'revenue': revenue, 'units': units, 'orders': orders}
+        for id, title, revenue, units, orders in rows
+    ]
+    return report
@@ -0,0 +1,76 @@
+from time import perf_counter
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .counters import counters
+from .models import ArchivedOrder, ArchivedOrderItem, Customer, Order, OrderItem, raw_delete
+
+
+logger = logging.getLogger(__name__)
+
+ORDER_FIELDS = ['id', 'placed_at', 'payment_status', 'customer_id', 'total', 'item_count']
+ITEM_FIELDS = ['id', 'order_id', 'product_id', 'quantity', 'unit_price']
+
+
+def archive_orders(age=None, chunk_size=1000):
+    """
+    Move orders placed more than `age` (STORE_ORDER_ARCHIVE_AGE by default)
+    ago, with their items, into the ArchivedOrder/ArchivedOrderItem tables,
+    `chunk_size` orders per transaction, and return the counts and timings.
+
+    Rows are copied with bulk_create and removed with plain DELETE
+    statements, so locks are held only for one chunk and no model signals
+    are sent. Counters over orders, such as Customer.orders_count, only
+    count the recent orders left in the Order table and are recomputed for
+    the customers touched.
+    """
+    if age is None:
+        age = settings.STORE_ORDER_ARCHIVE_AGE
+    cutoff = timezone.now() - age
+    stats = {'orders': 0, 'items': 0, 'chunks': 0, 'seconds': 0.0, 'slowest_chunk_seconds': 0.0}
+    start = perf_counter()
+
+    while True:
+        chunk_start = perf_counter()
+        with transaction.atomic():
+            orders = list(Order.objects
+                          .select_for_update()
+                          .filter(placed_at__lt=cutoff)
+                          .order_by('placed_at')
+                          .values(*ORDER_FIELDS)[:chunk_size])
+            if not orders:
+                break
+            order_ids = [order['id'] for order in orders]
+            items = OrderItem.objects.filter(order_id__in=order_ids)
+
+            ArchivedOrder.objects.bulk_create(
+                [ArchivedOrder(**order) for order in orders])
+            ArchivedOrderItem.objects.bulk_create(
+                [ArchivedOrderItem(**item) for item in items.values(*ITEM_FIELDS)])
+            item_count = raw_delete(items)
+            raw_delete(Order.objects.filter(pk__in=order_ids))
+
+            customer_ids = {order['customer_id'] for order in orders}
+            for counter in counters:
+                if counter.child_model is Order:
+                    counter.repair(Customer.objects.filter(pk__in=customer_ids))
+
+        chunk_seconds = perf_counter() - chunk_start
+        stats['orders'] += len(orders)
+        stats['items'] += item_count
+        stats['chunks'] += 1
+        stats['slowest_chunk_seconds'] = max(stats['slowest_chunk_seconds'], chunk_seconds)
+        logger.debug('Archived %d orders and %d items in %.3fs.', len(orders), item_count, chunk_seconds)
+        if len(orders) < chunk_size:
+            break
+
+    stats['seconds'] = perf_counter() - start
+    logger.info(
+        'Archived %(orders)d orders and %(items)d items placed before %(cutoff)s '
+        'in %(chunks)d chunks, %(seconds).3fs (slowest chunk %(slowest_chunk_seconds).3fs).',
+        {**stats, 'cutoff': cutoff.isoformat()},
+        extra={'archive_orders': stats})
+    return stats
@@ -0,0 +1,200 @@
+from hashlib import md5
+from math import ceil
+from time import time, time_ns
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+from .models import Product
+
+
+def version_key(resource, pk=None):
+    if pk is None:
+        return f'store:{resource}:version'
+    return f'store:{resource}:{pk}:version'
+
+
+def modified_key(resource, pk=None):
+    if pk is None:
+        return f'store:{resource}:modified'
+    return f'store:{resource}:{pk}:modified'
+
+
+def get_version(resource, pk=None):
+    key = version_key(resource, pk)
+    version = cache.get(key)
+    if version is None:
+        # Start from a timestamp rather than 1 so an evicted version key can
+        # never bring back entries stored under an earlier version.
+        cache.add(key, time_ns(), timeout=None)
+        cache.add(modified_key(resource, pk), time(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def get_modified(resource, pk=None):
+    """
+    When the version was last bumped, in seconds since the epoch, or None if
+    that is not known. It is never earlier than the actual change.
+    """
+    return cache.get(modified_key(resource, pk))
+
+
+def bump_version(resource, pk=None):
+    key = version_key(resource, pk)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time_ns(), timeout=None)
+    cache.set(modified_key(resource, pk), time(), timeout=None)
+
+
+def forget_version(resource, pk):
+    """
+    Drop the version keys of an object that turned out not to exist, so
+    requests for made-up IDs leave nothing behind. A later version starts
+    from a newer timestamp, so nothing cached earlier comes back.
+    """
+    cache.delete_many([version_key(resource, pk), modified_key(resource, pk)])
+
+
+def invalidate(resource, pk=None):
+    """
+    Bump the version now and again once the current transaction commits, so
+    a read racing the commit cannot keep stale data cached.
+    """
+    bump_version(resource, pk)
+    transaction.on_commit(lambda: bump_version(resource, pk))
+
+
+def product_exists_key(product_id):
+    return f'store:products:{product_id}:exists'
+
+
+def product_exists(product_id):
+    """
+    Cached `Product.objects.filter(pk=...).exists()`. The entry is dropped
+    whenever the product is saved or deleted. Misses are not cached, so
+    probing random IDs cannot fill the cache.
+    """
+    key = product_exists_key(product_id)
+    exists = cache.get(key)
+    if exists is None:
+        exists = Product.objects.filter(pk=product_id).exists()
+        if exists:
+            cache.set(key, True, timeout=None)
+    return exists
+
+
+def forget_product(product_id):
+    cache.delete(product_exists_key(product_id))
+
+
+def cart_summary_key(cart_id):
+    # Summaries depend on the prices of every product in the cart, so a
+    # price change bumps the `prices` version instead of looking up the
+    # carts that hold the product.
+    return f'store:carts:{cart_id}:summary:{get_version("prices")}'
+
+
+def forget_cart_summaries(cart_ids):
+    """
+    Drop the cached summaries of `cart_ids`, now and again once the current
+    transaction commits.
+    """
+    keys = [cart_summary_key(cart_id) for cart_id in cart_ids]
+    if keys:
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def history_key(customer_id, url):
+    """
+    Key of a cached page of a customer's order history, `url` being the page
+    URL from `HistoryPagination.get_page_url`.
+    """
+    version = get_version('history', customer_id)
+    digest = md5(url.encode()).hexdigest()
+    return f'store:history:{customer_id}:response:{version}:{digest}'
+
+
+class CachedResponseMixin:
+    """
+    Caches successful list and retrieve responses. List entries are keyed on
+    the resource version and retrieve entries on the object version, so a
+    change only evicts the responses it can affect.
+    """
+    cache_resource = None
+    cache_timeout = 60 * 10
+
+    def list(self, request, *args, **kwargs):
+        version = get_version(self.cache_resource)
+        return self.cached_response(version, super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        object_id = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        version = get_version(self.cache_resource, object_id)
+        try:
+            return self.cached_response(version, super().retrieve, request, *args, **kwargs)
+        except Http404:
+            forget_version(self.cache_resource, object_id)
+            raise
+
+    def get_cache_key(self, request, version):
+        url = request.build_absolute_uri()
+        digest = md5(f'{request.accepted_media_type}:{url}'.encode()).hexdigest()
+        return f'store:{self.cache_resource}:response:{version}:{digest}'
+
+    def cached_response(self, version, view, request, *args, **kwargs):
+        key = self.get_cache_key(request, version)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = view(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, self.cache_timeout)
+        return response
+
+
+class ConditionalGetMixin:
+    """
+    Adds ETag and Last-Modified validators to list and retrieve and answers
+    matching conditional requests with a 304 before the view does any
+    serialization. The validators come from the `cache_resource` version
+    keys, so checking them costs no query.
+    """
+    cache_resource = None
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, None, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        object_id = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        try:
+            return self.conditional_response(request, object_id, super().retrieve, *args, **kwargs)
+        except Http404:
+            forget_version(self.cache_resource, object_id)
+            raise
+
+    def conditional_response(self, request, object_id, view, *args, **kwargs):
+        # The URL and media type are part of the tag because the query string
+        # (fields, page, ordering...) changes the representation.
+        version = get_version(self.cache_resource, object_id)
+        modified = get_modified(self.cache_resource, object_id)
+        url = request.build_absolute_uri()
+        token = f'{version}:{request.accepted_media_type}:{url}'
+        etag = quote_etag(md5(token.encode()).hexdigest())
+        timestamp = ceil(modified) if modified is not None else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = view(request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+        return response
@@ -0,0 +1,304 @@
+from functools import lru_cache
+from threading import Lock
+from time import perf_counter, time
+from uuid import UUID, uuid4
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .cache import forget_cart_summaries
+from .models import Cart, CartItem, Product, raw_delete
+from .reservations import get_reservation_store
+
+
+logger = logging.getLogger(__name__)
+
+
+class CartStore:
+    """
+    Keeps anonymous carts outside the database. Every write marks the cart
+    dirty; `flush` copies a cart into the Cart/CartItem tables, which happens
+    at checkout and from the periodic `flush_carts` task.
+
+    Carts map product IDs to quantities. A cart that does not exist is
+    reported as None.
+    """
+
+    def create(self):
+        raise NotImplementedError
+
+    def get_items(self, cart_id):
+        raise NotImplementedError
+
+    def add_item(self, cart_id, product_id, quantity):
+        """Add to the line's quantity and return the new quantity."""
+        raise NotImplementedError
+
+    def set_item(self, cart_id, product_id, quantity):
+        """Replace the quantity of an existing line, or return None."""
+        raise NotImplementedError
+
+    def remove_item(self, cart_id, product_id):
+        raise NotImplementedError
+
+    def delete(self, cart_id):
+        raise NotImplementedError
+
+    def pop_dirty(self, count):
+        """Take up to `count` dirty cart IDs off the dirty set."""
+        raise NotImplementedError
+
+    def exists(self, cart_id):
+        return self.get_items(cart_id) is not None
+
+    def flush(self, cart_id):
+        """
+        Make the Cart/CartItem rows match the stored cart. Returns False if
+        the cart no longer exists in the store.
+        """
+        items = self.get_items(cart_id)
+        if items is None:
+            return False
+
+        # Lines for products deleted in the meantime are dropped, like the
+        # CartItem rows that cascade with them.
+        product_ids = set(Product.objects
+                          .filter(pk__in=items)
+                          .values_list('id', flat=True))
+        items = {product_id: quantity for product_id, quantity in items.items()
+                 if product_id in product_ids}
+
+        with transaction.atomic():
+            Cart.objects.get_or_create(pk=cart_id)
+            CartItem.objects \
+                .filter(cart_id=cart_id) \
+                .exclude(product_id__in=items) \
+                .delete()
+
+            existing = {item.product_id: item for item in CartItem.objects.filter(cart_id=cart_id)}
+            for product_id, item in existing.items():
+                item.quantity = items[product_id]
+            CartItem.objects.bulk_update(existing.values(), ['quantity'])
+            CartItem.objects.bulk_create([
+                CartItem(cart_id=cart_id, product_id=product_id, quantity=quantity)
+                for product_id, quantity in items.items()
+                if product_id not in existing
+            ])
+        return True
+
+
+class RedisCartStore(CartStore):
+    """
+    One hash per cart (`store:cart:<id>`, product ID -> quantity) that
+    expires STORE_CART_TTL after the last write, plus a set of dirty cart
+    IDs. Writes run as Lua scripts so they are atomic per cart.
+    """
+    key_prefix = 'store:cart:'
+    dirty_key = 'store:carts:dirty'
+    created_field = '_created_at'
+
+    ADD_ITEM = """
+        if redis.call('EXISTS', KEYS[1]) == 0 then return false end
+        local quantity = redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+        redis.call('EXPIRE', KEYS[1], ARGV[3])
+        redis.call('SADD', KEYS[2], ARGV[4])
+        return quantity
+    """
+    SET_ITEM = """
+        if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 0 then return false end
+        redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+        redis.call('EXPIRE', KEYS[1], ARGV[3])
+        redis.call('SADD', KEYS[2], ARGV[4])
+        return tonumber(ARGV[2])
+    """
+    REMOVE_ITEM = """
+        local removed = redis.call('HDEL', KEYS[1], ARGV[1])
+        if removed == 1 then redis.call('SADD', KEYS[2], ARGV[2]) end
+        return removed
+    """
+
+    def __init__(self, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(settings.STORE_CART_REDIS_URL)
+        self.client = client
+        self.ttl = int(settings.STORE_CART_TTL.total_seconds())
+        self._add_item = client.register_script(self.ADD_ITEM)
+        self._set_item = client.register_script(self.SET_ITEM)
+        self._remove_item = client.register_script(self.REMOVE_ITEM)
+
+    def key(self, cart_id):
+        return f'{self.key_prefix}{cart_id}'
+
+    def create(self):
+        cart_id = uuid4()
+        with self.client.pipeline() as pipe:
+            pipe.hset(self.key(cart_id), self.created_field, int(time()))
+            pipe.expire(self.key(cart_id), self.ttl)
+            pipe.execute()
+        return cart_id
+
+    def get_items(self, cart_id):
+        values = self.client.hgetall(self.key(cart_id))
+        if not values:
+            return None
+        return {
+            int(field): int(quantity)
+            for field, quantity in values.items()
+            if field.decode() != self.created_field
+        }
+
+    def add_item(self, cart_id, product_id, quantity):
+        return self._add_item(
+            keys=[self.key(cart_id), self.dirty_key],
+            args=[product_id, quantity, self.ttl, str(cart_id)])
+
+    def set_item(self, cart_id, product_id, quantity):
+        return self._set_item(
+            keys=[self.key(cart_id), self.dirty_key],
+            args=[product_id, quantity, self.ttl, str(cart_id)])
+
+    def remove_item(self, cart_id, product_id):
+        return bool(self._remove_item(
+            keys=[self.key(cart_id), self.dirty_key],
+            args=[product_id, str(cart_id)]))
+
+    def delete(self, cart_id):
+        with self.client.pipeline() as pipe:
+            pipe.delete(self.key(cart_id))
+            pipe.srem(self.dirty_key, str(cart_id))
+            deleted, _ = pipe.execute()
+        return bool(deleted)
+
+    def pop_dirty(self, count):
+        return [UUID(cart_id.decode()) for cart_id in self.client.spop(self.dirty_key, count)]
+
+
+class InMemoryCartStore(CartStore):
+    """
+    Process-local stand-in for RedisCartStore, used by the tests.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._carts = {}
+        self._dirty = set()
+
+    def create(self):
+        cart_id = uuid4()
+        with self._lock:
+            self._carts[cart_id] = {}
+        return cart_id
+
+    def get_items(self, cart_id):
+        with self._lock:
+            items = self._carts.get(cart_id)
+            return None if items is None else dict(items)
+
+    def add_item(self, cart_id, product_id, quantity):
+        with self._lock:
+            if cart_id not in self._carts:
+                return None
+            items = self._carts[cart_id]
+            items[product_id] = items.get(product_id, 0) + quantity
+            self._dirty.add(cart_id)
+            return items[product_id]
+
+    def set_item(self, cart_id, product_id, quantity):
+        with self._lock:
+            items = self._carts.get(cart_id, {})
+            if product_id not in items:
+                return None
+            items[product_id] = quantity
+            self._dirty.add(cart_id)
+            return quantity
+
+    def remove_item(self, cart_id, product_id):
+        with self._lock:
+            items = self._carts.get(cart_id, {})
+            if items.pop(product_id, None) is None:
+                return False
+            self._dirty.add(cart_id)
+            return True
+
+    def delete(self, cart_id):
+        with self._lock:
+            self._dirty.discard(cart_id)
+            return self._carts.pop(cart_id, None) is not None
+
+    def pop_dirty(self, count):
+        with self._lock:
+            cart_ids = list(self._dirty)[:count]
+            self._dirty.difference_update(cart_ids)
+            return cart_ids
+
+
+@lru_cache
+def load_cart_store(path):
+    return import_string(path)()
+
+
+def get_cart_store():
+    """
+    Return the store named by STORE_CART_BACKEND, or None when carts live in
+    the database.
+    """
+    path = getattr(settings, 'STORE_CART_BACKEND', None)
+    return load_cart_store(path) if path else None
+
+
+def reap_carts(ttl=None, chunk_size=1000):
+    """
+    Delete database carts created more than `ttl` (STORE_CART_TTL by
+    default) ago, `chunk_size` carts per transaction, and return the counts
+    and timings.
+
+    Each chunk locks its carts, deletes their items and then the carts with
+    plain DELETE statements, so locks are held only for one chunk and no
+    rows are loaded into Python, and releases the stock the carts held.
+    """
+    if ttl is None:
+        ttl = settings.STORE_CART_TTL
+    cutoff = timezone.now() - ttl
+    stats = {'carts': 0, 'items': 0, 'chunks': 0, 'seconds': 0.0, 'slowest_chunk_seconds': 0.0}
+    start = perf_counter()
+
+    while True:
+        chunk_start = perf_counter()
+        with transaction.atomic():
+            # The carts stay locked until their rows are gone, so an item
+            # cannot be added to one between the two DELETEs below.
+            cart_ids = list(Cart.objects
+                            .select_for_update()
+                            .filter(created_at__lt=cutoff)
+                            .order_by('created_at')
+                            .values_list('pk', flat=True)[:chunk_size])
+            if not cart_ids:
+                break
+            items = raw_delete(CartItem.objects.filter(cart_id__in=cart_ids))
+            carts = raw_delete(Cart.objects.filter(pk__in=cart_ids))
+            # What the CartItem post_delete receivers would have done.
+            forget_cart_summaries(cart_ids)
+            reservations = get_reservation_store()
+            if reservations is not None:
+                reservations.release_carts(cart_ids)
+
+        chunk_seconds = perf_counter() - chunk_start
+        stats['carts'] += carts
+        stats['items'] += items
+        stats['chunks'] += 1
+        stats['slowest_chunk_seconds'] = max(stats['slowest_chunk_seconds'], chunk_seconds)
+        logger.debug('Reaped %d carts and %d items in %.3fs.', carts, items, chunk_seconds)
+        if len(cart_ids) < chunk_size:
+            break
+
+    stats['seconds'] = perf_counter() - start
+    logger.info(
+        'Reaped %(carts)d carts and %(items)d items older than %(cutoff)s '
+        'in %(chunks)d chunks, %(seconds).3fs (slowest chunk %(slowest_chunk_seconds).3fs).',
+        {**stats, 'cutoff': cutoff.isoformat()},
+        extra={'reap_carts': stats})
+    return stats
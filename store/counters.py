@@ -0,0 +1,108 @@
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.aggregates import Count
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+
+
+counters = []
+
+# The original foreign key of a child loaded with that field deferred.
+UNKNOWN = object()
+
+
+class Counter:
+    """
+    Keeps `parent_model.field` equal to the number of `child_model` rows
+    pointing at it through `foreign_key`.
+
+    Inserts, deletes and reparenting of a child adjust the stored value with
+    an `F()` update in the same transaction. Writes that skip model signals
+    (`bulk_create`, `QuerySet.update`, raw SQL) are not tracked; use `repair`
+    (or the `recount` command) to fix the drift they leave behind.
+    """
+
+    def __init__(self, parent_model, field, child_model, foreign_key):
+        self.parent_model = parent_model
+        self.field = field
+        self.child_model = child_model
+        self.foreign_key = foreign_key
+        self.attname = child_model._meta.get_field(foreign_key).attname
+        self.original_attname = f'_counter_original_{self.attname}'
+
+    def __str__(self):
+        return f'{self.parent_model.__name__}.{self.field}'
+
+    def connect(self):
+        uid = f'counter:{self}'
+        post_init.connect(self.remember, sender=self.child_model, dispatch_uid=uid, weak=False)
+        pre_save.connect(self.load_original, sender=self.child_model, dispatch_uid=uid, weak=False)
+        post_save.connect(self.on_save, sender=self.child_model, dispatch_uid=uid, weak=False)
+        post_delete.connect(self.on_delete, sender=self.child_model, dispatch_uid=uid, weak=False)
+
+    def remember(self, sender, instance, **kwargs):
+        # Read __dict__ directly so a deferred foreign key is not loaded.
+        instance.__dict__[self.original_attname] = instance.__dict__.get(self.attname, UNKNOWN)
+
+    def load_original(self, sender, instance, **kwargs):
+        # A deferred foreign key that has since been set is about to be
+        # saved; read what it was so a move can be counted.
+        if instance.__dict__.get(self.original_attname) is UNKNOWN and \
+                self.attname in instance.__dict__ and instance.pk is not None:
+            instance.__dict__[self.original_attname] = self.child_model._base_manager \
+                .filter(pk=instance.pk) \
+                .values_list(self.attname, flat=True) \
+                .first()
+
+    def on_save(self, sender, instance, created, **kwargs):
+        if self.attname not in instance.__dict__:
+            # Still deferred, so it was not saved and cannot have changed.
+            return
+        current = instance.__dict__[self.attname]
+        if created:
+            self.add(current, 1)
+        else:
+            original = instance.__dict__.get(self.original_attname)
+            if original != current:
+                self.add(original, -1)
+                self.add(current, 1)
+        instance.__dict__[self.original_attname] = current
+
+    def on_delete(self, sender, instance, **kwargs):
+        self.add(getattr(instance, self.attname), -1)
+
+    def add(self, parent_id, delta):
+        if parent_id is None:
+            return
+        self.parent_model.objects \
+            .filter(pk=parent_id) \
+            .update(**{self.field: F(self.field) + delta})
+
+    def actual_count(self):
+        counts = self.child_model.objects \
+            .filter(**{self.attname: OuterRef('pk')}) \
+            .order_by() \
+            .values(self.attname) \
+            .annotate(count=Count('pk')) \
+            .values('count')
+        return Coalesce(Subquery(counts), 0)
+
+    def drifted(self):
+        return self.parent_model.objects \
+            .annotate(actual_count=self.actual_count()) \
+            .exclude(**{self.field: F('actual_count')})
+
+    def repair(self, queryset=None):
+        """
+        Recompute the stored value for `queryset` (all parent rows by default)
+        and return the number of rows updated.
+        """
+        if queryset is None:
+            queryset = self.parent_model.objects.all()
+        return queryset.update(**{self.field: self.actual_count()})
+
+
+def register_counter(parent_model, field, child_model, foreign_key):
+    counter = Counter(parent_model, field, child_model, foreign_key)
+    counter.connect()
+    counters.append(counter)
+    return counter
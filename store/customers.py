@@ -0,0 +1,71 @@
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Customer
+
+
+CUSTOMER_ID_CLAIM = 'customer_id'
+
+
+class CustomerResolver:
+    """
+    Maps user IDs to customer IDs without a query per request.
+
+    Lookups go through the access token's `customer_id` claim, then an
+    in-process table whose entries live STORE_CUSTOMER_LOCAL_TTL seconds,
+    then the shared cache and finally the database. `forget` clears this
+    process and the shared cache; other processes drop their copy when it
+    expires.
+    """
+
+    max_entries = 10000
+
+    def __init__(self):
+        self._lock = Lock()
+        self._local = {}
+
+    def key(self, user_id):
+        return f'store:users:{user_id}:customer'
+
+    def resolve(self, request):
+        """
+        Return the customer ID of the request's user, remembered on the
+        request. Raises Customer.DoesNotExist like `Customer.objects.get`.
+        """
+        if not hasattr(request, '_customer_id'):
+            claims = request.auth if hasattr(request.auth, 'get') else {}
+            request._customer_id = claims.get(CUSTOMER_ID_CLAIM) or self.get(request.user.id)
+        return request._customer_id
+
+    def get(self, user_id):
+        now = monotonic()
+        with self._lock:
+            entry = self._local.get(user_id)
+        if entry is not None and entry[1] > now:
+            return entry[0]
+
+        customer_id = cache.get(self.key(user_id))
+        if customer_id is None:
+            customer_id = Customer.objects.values_list('id', flat=True).get(user_id=user_id)
+            cache.set(self.key(user_id), customer_id, settings.STORE_CUSTOMER_CACHE_TTL)
+
+        with self._lock:
+            if len(self._local) >= self.max_entries:
+                self._local.clear()
+            self._local[user_id] = (customer_id, now + settings.STORE_CUSTOMER_LOCAL_TTL)
+        return customer_id
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+
+    def forget(self, user_id):
+        with self._lock:
+            self._local.pop(user_id, None)
+        cache.delete(self.key(user_id))
+
+
+customers = CustomerResolver()
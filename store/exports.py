@@ -0,0 +1,90 @@
+from heapq import merge
+from itertools import groupby
+from operator import itemgetter
+import csv
+import json
+
+
+ORDER_COLUMNS = ['order_id', 'placed_at', 'payment_status', 'customer_id', 'total', 'item_count']
+ITEM_COLUMNS = ['item_id', 'product_id', 'product_title', 'quantity', 'unit_price']
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def order_rows(orders, chunk_size=1000):
+    """
+    Yield one tuple of ORDER_COLUMNS + ITEM_COLUMNS per order item (and one
+    with empty item columns for an order without items), in order ID order.
+    `orders` is a queryset of Order or ArchivedOrder.
+
+    Orders are read in keyset chunks of `chunk_size` IDs, so memory use does
+    not depend on the size of the export even on drivers that buffer a
+    whole result set.
+    """
+    last_id = 0
+    while True:
+        order_ids = list(orders
+                         .filter(pk__gt=last_id)
+                         .order_by('pk')
+                         .values_list('pk', flat=True)[:chunk_size])
+        if not order_ids:
+            return
+
+        yield from orders.model.objects \
+            .filter(pk__in=order_ids) \
+            .order_by('pk', 'items__id') \
+            .values_list(
+                'pk', 'placed_at', 'payment_status', 'customer_id', 'total', 'item_count',
+                'items__id', 'items__product_id', 'items__product__title',
+                'items__quantity', 'items__unit_price') \
+            .iterator(chunk_size=chunk_size)
+
+        if len(order_ids) < chunk_size:
+            return
+        last_id = order_ids[-1]
+
+
+def merged_order_rows(querysets, chunk_size=1000):
+    """
+    The `order_rows` of each queryset (the orders and the archived orders)
+    merged into one stream in order ID order. IDs are kept on archiving, so
+    no order is in more than one of them.
+    """
+    return merge(*(order_rows(orders, chunk_size) for orders in querysets), key=itemgetter(0))
+
+
+class Echo:
+    """A file-like object that hands back what csv.writer writes to it."""
+
+    def write(self, value):
+        return value
+
+
+def export_csv(querysets, chunk_size=1000):
+    writer = csv.writer(Echo())
+    yield writer.writerow(ORDER_COLUMNS + ITEM_COLUMNS)
+    for row in merged_order_rows(querysets, chunk_size):
+        yield writer.writerow(row)
+
+
+def export_ndjson(querysets, chunk_size=1000):
+    """One JSON document per order, with its items nested."""
+    for _, rows in groupby(merged_order_rows(querysets, chunk_size), key=itemgetter(0)):
+        rows = list(rows)
+        document = dict(zip(ORDER_COLUMNS, rows[0]))
+        document['placed_at'] = document['placed_at'].isoformat()
+        document['items'] = [
+            dict(zip(ITEM_COLUMNS, row[len(ORDER_COLUMNS):]))
+            for row in rows if row[len(ORDER_COLUMNS)] is not None
+        ]
+        yield json.dumps(document, default=str) + '\n'
+
+
+def export_orders(querysets, export_format, chunk_size=1000):
+    """Stream the orders of `querysets` in `export_format`."""
+    if export_format == 'ndjson':
+        return export_ndjson(querysets, chunk_size)
+    return export_csv(querysets, chunk_size)
@@ -1,5 +1,8 @@
+from django.db.models import Q
 from django_filters.rest_framework import FilterSet
-from .models import Product
+from rest_framework.filters import SearchFilter
+from .models import ArchivedOrder, Order, Product
+from .search import get_search_backend, tokenize
 
 class ProductFilter(FilterSet):
   class Meta:
@@ -7,4 +10,49 @@ class ProductFilter(FilterSet):
     fields = {
       'collection_id': ['exact'],
       'unit_price': ['gt', 'lt']
-    }
\ No newline at end of file
+    }
+
+
+class OrderFilter(FilterSet):
+  class Meta:
+    model = Order
+    fields = {
+      'placed_at': ['gte', 'lt'],
+      'payment_status': ['exact']
+    }
+
+
+class ArchivedOrderFilter(FilterSet):
+  class Meta:
+    model = ArchivedOrder
+    fields = OrderFilter.Meta.fields
+
+
+class ProductSearchFilter(SearchFilter):
+  def filter_queryset(self, request, queryset, view):
+    terms = tokenize(' '.join(self.get_search_terms(request)))
+    if not terms:
+      return queryset
+    return get_search_backend().search(queryset, terms)
+
+
+def sort_key_prefix(term):
+  """
+  Customers whose sort key starts with the lowercase `term`, as a range on
+  the indexed column. A case-sensitive `startswith` is a LIKE BINARY on
+  MySQL, which compares bytes instead of the column's collation and so
+  cannot use the index.
+  """
+  term = term.lower()
+  return Q(sort_key__gte=term, sort_key__lt=term + '\uffff')
+
+
+class CustomerSearchFilter(SearchFilter):
+  """
+  Prefix search on the lowercase sort key ("first last") or the last name,
+  both indexed columns of the customer table. Every term has to match.
+  """
+  def filter_queryset(self, request, queryset, view):
+    for term in self.get_search_terms(request):
+      queryset = queryset.filter(sort_key_prefix(term) | Q(last_name__istartswith=term))
+    return queryset
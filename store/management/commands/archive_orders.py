@@ -0,0 +1,20 @@
+from datetime import timedelta
+from django.core.management import BaseCommand
+from store.archive import archive_orders
+
+
+class Command(BaseCommand):
+    help = "Move orders older than STORE_ORDER_ARCHIVE_AGE to the archive tables in bounded chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int,
+            help='Archive orders older than this many days instead of STORE_ORDER_ARCHIVE_AGE.')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        age = timedelta(days=options['days']) if options['days'] is not None else None
+        stats = archive_orders(age, options['chunk_size'])
+        print(f"Archived {stats['orders']} orders and {stats['items']} items "
+              f"in {stats['chunks']} chunks, {stats['seconds']:.2f}s "
+              f"(slowest chunk {stats['slowest_chunk_seconds']:.2f}s).")
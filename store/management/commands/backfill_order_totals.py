@@ -0,0 +1,32 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from store.models import Order
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored total and item_count of orders in primary key batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--missing', action='store_true',
+            help='Only orders that were never filled in (item_count = 0).')
+
+    def handle(self, *args, **options):
+        orders = Order.objects.all()
+        if options['missing']:
+            orders = orders.filter(item_count=0)
+
+        updated = 0
+        last_id = 0
+        while True:
+            order_ids = list(orders
+                             .filter(pk__gt=last_id)
+                             .order_by('pk')
+                             .values_list('pk', flat=True)[:options['batch_size']])
+            if not order_ids:
+                break
+            with transaction.atomic():
+                updated += Order.objects.filter(pk__in=order_ids).update_totals()
+            last_id = order_ids[-1]
+            print(f'Updated {updated} orders (up to #{last_id}).')
@@ -0,0 +1,85 @@
+from random import Random
+from statistics import median
+from time import perf_counter
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from store.filters import sort_key_prefix
+from store.models import Customer, raw_delete
+from store.onboarding import save_batch
+
+
+PREFIX = 'benchmark-customer-'
+SYLLABLES = ['al', 'an', 'ar', 'be', 'da', 'el', 'ka', 'li', 'ma', 'no', 'ra', 'sa', 'ta', 'vi', 'yo']
+
+
+class Command(BaseCommand):
+    help = "Compare customer listing and prefix search through the user join with the denormalized name columns."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=1_000_000)
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--prefix', default='ma', help='Search term for the prefix queries.')
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Keep the seeded customers, so a later run can reuse them.')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        seeded = User.objects.filter(username__startswith=PREFIX).count()
+        if seeded < options['customers']:
+            self.seed(seeded, options['customers'], options['batch_size'])
+
+        prefix = options['prefix']
+        queries = [
+            ('list, user join', lambda: Customer.objects.order_by('user__first_name', 'user__last_name', 'id')),
+            ('list, sort_key', lambda: Customer.objects.order_by('sort_key', 'id')),
+            ('search, user join', lambda: Customer.objects
+                .filter(user__first_name__istartswith=prefix)
+                .order_by('user__first_name', 'user__last_name', 'id')),
+            ('search, sort_key', lambda: Customer.objects
+                .filter(sort_key_prefix(prefix))
+                .order_by('sort_key', 'id')),
+        ]
+        try:
+            print(f"First page of 10 out of {max(seeded, options['customers'])} customers, "
+                  f"median of {options['repeat']} runs:")
+            for name, queryset in queries:
+                timings = []
+                for _ in range(options['repeat']):
+                    start = perf_counter()
+                    list(queryset().values_list('id', flat=True)[:10])
+                    timings.append(perf_counter() - start)
+                print(f'  {name}: {median(timings) * 1000:.2f}ms')
+        finally:
+            if not options['keep']:
+                self.clean(options['batch_size'])
+
+    def seed(self, start, count, batch_size):
+        User = get_user_model()
+        random = Random(start)
+
+        def name():
+            return ''.join(random.choice(SYLLABLES) for _ in range(random.randint(2, 4))).title()
+
+        for offset in range(start, count, batch_size):
+            users = [
+                User(username=f'{PREFIX}{i}', email=f'{PREFIX}{i}@example.com',
+                     first_name=name(), last_name=name(), password='!')
+                for i in range(offset, min(offset + batch_size, count))
+            ]
+            # Bulk inserts, like `import_customers`; the per-user post_save
+            # receiver would dominate the seeding time.
+            save_batch(users, [Customer() for _ in users])
+            print(f'Seeded {offset + len(users)} customers.')
+
+    def clean(self, batch_size):
+        User = get_user_model()
+        while True:
+            user_ids = list(User.objects
+                            .filter(username__startswith=PREFIX)
+                            .values_list('id', flat=True)[:batch_size])
+            if not user_ids:
+                break
+            raw_delete(Customer.objects.filter(user_id__in=user_ids))
+            raw_delete(User.objects.filter(pk__in=user_ids))
@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from uuid import uuid4
+from django.core.management import BaseCommand
+from django.db import connection
+from store.models import Collection, Product, Reservation
+from store.reservations import load_reservation_store
+
+
+class Command(BaseCommand):
+    help = "Measure reservation throughput on one hot product and check that it never oversells."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backend', action='append', dest='backends',
+            help='Reservation store to measure (repeatable). Defaults to both stores.')
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--attempts', type=int, default=5000)
+        parser.add_argument('--inventory', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        backends = options['backends'] or [
+            'store.reservations.DatabaseReservationStore',
+            'store.reservations.RedisReservationStore',
+        ]
+        # The workers run on their own connections, so the product has to be
+        # committed; it is deleted again at the end.
+        collection = Collection.objects.create(title='Reservation benchmark')
+        product = Product.objects.create(
+            title='Reservation benchmark', slug='reservation-benchmark',
+            unit_price=1, inventory=options['inventory'], collection=collection)
+        try:
+            print(f"{options['attempts']} reservations of 1 unit, {options['threads']} threads, "
+                  f"inventory {options['inventory']}:")
+            for backend in backends:
+                self.measure(load_reservation_store(backend), product, options)
+        finally:
+            Reservation.objects.filter(product=product).delete()
+            product.delete()
+            collection.delete()
+
+    def measure(self, store, product, options):
+        store.reconcile([product.pk])
+
+        def perform_reserve(_):
+            try:
+                return store.reserve(uuid4(), product.pk, 1)
+            finally:
+                connection.close()
+
+        start = perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            results = list(executor.map(perform_reserve, range(options['attempts'])))
+        elapsed = perf_counter() - start
+
+        held = results.count(True)
+        expected = min(options['attempts'], options['inventory'])
+        verdict = 'ok' if held == expected else f'OVERSOLD, expected {expected}'
+        print(f'  {store.__class__.__name__}: {options["attempts"] / elapsed:.0f} reservations/s, '
+              f'{held} held ({verdict}), {store.available(product.pk)} left')
@@ -0,0 +1,73 @@
+from decimal import Decimal
+from time import perf_counter
+from django.core.management import BaseCommand
+from django.db import transaction
+from store.models import Collection, Product
+from store.serializers import CollectionSerializer, CompiledCollectionSerializer, CompiledProductSerializer, CompiledSimpleProductSerializer, ProductSerializer, SimpleProductSerializer
+
+
+class Command(BaseCommand):
+    help = "Compare the DRF serializers with their compiled counterparts on a large list."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        self.repeat = options['repeat']
+
+        # The rows are created inside a transaction that is rolled back, so
+        # the benchmark leaves the database untouched.
+        with transaction.atomic():
+            self.seed(rows)
+
+            products = Product.objects.prefetch_related('images')
+            collections = Collection.objects.all()
+
+            print(f'Serializing {rows} rows, best of {self.repeat}:')
+            self.compare(
+                'ProductSerializer',
+                lambda: ProductSerializer(products.all(), many=True).data,
+                lambda: self.compiled(CompiledProductSerializer(), products.all()))
+            self.compare(
+                'SimpleProductSerializer',
+                lambda: SimpleProductSerializer(Product.objects.all(), many=True).data,
+                lambda: self.compiled(CompiledSimpleProductSerializer(), Product.objects.all()))
+            self.compare(
+                'CollectionSerializer',
+                lambda: CollectionSerializer(collections.all(), many=True).data,
+                lambda: self.compiled(CompiledCollectionSerializer(), collections.all()))
+
+            transaction.set_rollback(True)
+
+    def seed(self, rows):
+        Collection.objects.bulk_create(
+            [Collection(title=f'Collection {i}') for i in range(rows)], batch_size=1000)
+        collection_ids = list(Collection.objects.values_list('id', flat=True))
+        Product.objects.bulk_create([
+            Product(
+                title=f'Product {i}',
+                slug=f'product-{i}',
+                description='Benchmark product',
+                unit_price=Decimal(i % 1000) + Decimal('1.99'),
+                inventory=i % 100,
+                collection_id=collection_ids[i % len(collection_ids)])
+            for i in range(rows)
+        ], batch_size=1000)
+
+    def compiled(self, serializer, queryset):
+        return serializer.to_representation(serializer.get_queryset(queryset))
+
+    def compare(self, name, serialize, serialize_compiled):
+        baseline = self.measure(serialize)
+        compiled = self.measure(serialize_compiled)
+        print(f'  {name}: {baseline * 1000:.0f}ms -> {compiled * 1000:.0f}ms ({baseline / compiled:.1f}x)')
+
+    def measure(self, serialize):
+        timings = []
+        for _ in range(self.repeat):
+            start = perf_counter()
+            serialize()
+            timings.append(perf_counter() - start)
+        return min(timings)
@@ -0,0 +1,37 @@
+import sys
+from django.core.management import BaseCommand, CommandError
+from store.exports import EXPORT_FORMATS, export_orders
+from store.filters import ArchivedOrderFilter, OrderFilter
+from store.models import ArchivedOrder, Order
+
+
+class Command(BaseCommand):
+    help = "Stream orders, archived ones included, with their items as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--since', help='Only orders placed at or after this date/time.')
+        parser.add_argument('--until', help='Only orders placed before this date/time.')
+        parser.add_argument('--payment-status', choices=[choice for choice, _ in Order.PAYMENT_STATUS_CHOICES])
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--output', help='File to write to instead of standard output.')
+
+    def handle(self, *args, **options):
+        data = {
+            'placed_at__gte': options['since'],
+            'placed_at__lt': options['until'],
+            'payment_status': options['payment_status'],
+        }
+        data = {key: value for key, value in data.items() if value}
+        orders = OrderFilter(data, queryset=Order.objects.all())
+        if not orders.is_valid():
+            raise CommandError(orders.errors.as_text())
+        archived = ArchivedOrderFilter(data, queryset=ArchivedOrder.objects.all())
+
+        output = open(options['output'], 'w', newline='') if options['output'] else sys.stdout
+        try:
+            for chunk in export_orders([orders.qs, archived.qs], options['format'], options['chunk_size']):
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
@@ -0,0 +1,20 @@
+from datetime import timedelta
+from django.core.management import BaseCommand
+from store.carts import reap_carts
+
+
+class Command(BaseCommand):
+    help = "Delete carts older than STORE_CART_TTL in bounded chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int,
+            help='Delete carts older than this many days instead of STORE_CART_TTL.')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        ttl = timedelta(days=options['days']) if options['days'] is not None else None
+        stats = reap_carts(ttl, options['chunk_size'])
+        print(f"Deleted {stats['carts']} carts and {stats['items']} items "
+              f"in {stats['chunks']} chunks, {stats['seconds']:.2f}s "
+              f"(slowest chunk {stats['slowest_chunk_seconds']:.2f}s).")
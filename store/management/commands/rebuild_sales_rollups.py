@@ -0,0 +1,19 @@
+from datetime import date
+from django.core.management import BaseCommand
+from store.analytics import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily sales rollups from the order and archive tables, one day per transaction."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since', type=date.fromisoformat,
+            help='First day to rebuild (YYYY-MM-DD). Defaults to the first day with orders.')
+        parser.add_argument(
+            '--until', type=date.fromisoformat,
+            help='Last day to rebuild (YYYY-MM-DD). Defaults to the last day with orders.')
+
+    def handle(self, *args, **options):
+        days = rebuild_rollups(options['since'], options['until'])
+        print(f'Rebuilt sales rollups for {days} days.')
@@ -0,0 +1,26 @@
+from django.core.management import BaseCommand
+from store.counters import counters
+
+
+class Command(BaseCommand):
+    help = "Recompute denormalized counter columns and repair any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only report drifted rows, do not repair them.')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        for counter in counters:
+            # MySQL cannot UPDATE a table filtered on a subquery of the same
+            # table, so the drifted keys are read first.
+            drifted = list(counter.drifted().values_list('pk', flat=True))
+            if options['check'] or not drifted:
+                print(f'{counter}: {len(drifted)} drifted rows.')
+            else:
+                for start in range(0, len(drifted), chunk_size):
+                    counter.repair(counter.parent_model.objects.filter(
+                        pk__in=drifted[start:start + chunk_size]))
+                print(f'{counter}: repaired {len(drifted)} drifted rows.')
@@ -1,4 +1,4 @@
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, call_command
 from django.db import connection
 from pathlib import Path
 import os
@@ -17,4 +17,7 @@ class Command(BaseCommand):
 
         with connection.cursor() as cursor:
             cursor.execute(sql)
+        # The raw inserts bypass the receivers that keep the counter
+        # columns up to date.
+        call_command('recount')
         print('Done.')
\ No newline at end of file
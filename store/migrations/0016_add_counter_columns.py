@@ -0,0 +1,52 @@
+# Generated by Django 5.1.6 on 2026-10-18 02:54
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.aggregates import Count
+from django.db.models.functions import Coalesce
+
+
+COUNTERS = [
+    ('Collection', 'products_count', 'Product', 'collection_id'),
+    ('Customer', 'orders_count', 'Order', 'customer_id'),
+    ('Product', 'reviews_count', 'Review', 'product_id'),
+]
+
+
+def populate_counters(apps, schema_editor):
+    for parent_name, field, child_name, attname in COUNTERS:
+        parent = apps.get_model('store', parent_name)
+        child = apps.get_model('store', child_name)
+        counts = child.objects \
+            .filter(**{attname: OuterRef('pk')}) \
+            .order_by() \
+            .values(attname) \
+            .annotate(count=Count('pk')) \
+            .values('count')
+        parent.objects.update(**{field: Coalesce(Subquery(counts), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_product_fulltext_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collection',
+            name='products_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='orders_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='reviews_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.1.6 on 2026-10-18 03:23
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Concat, Lower, Substr
+
+
+def populate_names(apps, schema_editor):
+    Customer = apps.get_model('store', 'Customer')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    users = User.objects.filter(pk=OuterRef('user_id'))
+    Customer.objects.update(
+        first_name=Subquery(users.values('first_name')),
+        last_name=Subquery(users.values('last_name')),
+        sort_key=Subquery(users.values(sort_key=Substr(
+            Lower(Concat('first_name', Value(' '), 'last_name')), 1, 255))))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0024_add_order_customer_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='customer',
+            options={'ordering': ['sort_key', 'id'], 'permissions': [('view_history', 'Can view history')]},
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='first_name',
+            field=models.CharField(blank=True, editable=False, max_length=150),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='last_name',
+            field=models.CharField(blank=True, editable=False, max_length=150),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='sort_key',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(populate_names, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['sort_key', 'id'], name='store_customer_sort_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['last_name'], name='store_customer_last_name_idx'),
+        ),
+    ]
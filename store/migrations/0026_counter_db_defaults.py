@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-18 03:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0025_denormalize_customer_names'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='collection',
+            name='products_count',
+            field=models.PositiveIntegerField(db_default=0, default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='orders_count',
+            field=models.PositiveIntegerField(db_default=0, default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='reviews_count',
+            field=models.PositiveIntegerField(db_default=0, default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.6 on 2026-10-18 03:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0026_counter_db_defaults'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessedEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.UUIDField()),
+                ('consumer', models.CharField(max_length=255)),
+                ('processed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['processed_at'], name='store_processedevent_at_idx')],
+                'unique_together': {('event_id', 'consumer')},
+            },
+        ),
+    ]
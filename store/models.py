@@ -1,13 +1,29 @@
 from decimal import Decimal
-from django.contrib import admin
 from django.conf import settings
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models.functions import Coalesce
 from uuid import uuid4
 
 from .validators import validate_file_size
 
 
+def raw_delete(queryset):
+    """
+    Delete the rows of `queryset` with a single DELETE statement and return
+    how many were deleted.
+
+    Unlike `QuerySet.delete`, this skips Django's deletion collector, so no
+    rows are loaded into Python for large deletes. In exchange, no
+    pre_delete or post_delete signals are sent, and on_delete is not
+    applied: rows that point at the deleted ones must be deleted first.
+    Callers do whatever the skipped receivers would have done themselves.
+    """
+    queryset = queryset.all()
+    queryset._for_write = True
+    return queryset._raw_delete(queryset.db)
+
+
 class Promotion(models.Model):
     description = models.CharField(max_length=255)
     discount = models.FloatField()
@@ -17,6 +33,7 @@ class Collection(models.Model):
     title = models.CharField(max_length=255)
     featured_product = models.ForeignKey(
         'Product', on_delete=models.SET_NULL, null=True, related_name='+', blank=True)
+    products_count = models.PositiveIntegerField(default=0, db_default=0, editable=False)
 
     def __str__(self) -> str:
         return self.title
@@ -38,12 +55,19 @@ class Product(models.Model):
     collection = models.ForeignKey(
         Collection, on_delete=models.PROTECT, related_name='products')
     promotions = models.ManyToManyField(Promotion, blank=True)
+    reviews_count = models.PositiveIntegerField(default=0, db_default=0, editable=False)
 
     def __str__(self) -> str:
         return self.title
 
     class Meta:
         ordering = ['title']
+        indexes = [
+            models.Index(fields=['title'], name='store_product_title_idx'),
+            models.Index(fields=['collection', 'unit_price'], name='store_product_coll_price_idx'),
+            models.Index(fields=['unit_price', 'id'], name='store_product_price_id_idx'),
+            models.Index(fields=['last_update', 'id'], name='store_product_updated_id_idx'),
+        ]
 
 
 class ProductImage(models.Model):
@@ -69,23 +93,55 @@ class Customer(models.Model):
         max_length=1, choices=MEMBERSHIP_CHOICES, default=MEMBERSHIP_BRONZE)
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Orders still in the Order table; archived orders are not counted.
+    orders_count = models.PositiveIntegerField(default=0, db_default=0, editable=False)
+    # Copies of the user's names, kept in sync by the post_save receiver of
+    # the user model, so listing and searching customers needs no join.
+    first_name = models.CharField(max_length=150, blank=True, editable=False)
+    last_name = models.CharField(max_length=150, blank=True, editable=False)
+    sort_key = models.CharField(max_length=255, blank=True, editable=False)
 
     def __str__(self):
-        return f'{self.user.first_name} {self.user.last_name}'
-
-    @admin.display(ordering='user__first_name')
-    def first_name(self):
-        return self.user.first_name
+        return f'{self.first_name} {self.last_name}'
 
-    @admin.display(ordering='user__last_name')
-    def last_name(self):
-        return self.user.last_name
+    @staticmethod
+    def name_fields(user):
+        """The denormalized name columns for `user`."""
+        return {
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'sort_key': f'{user.first_name} {user.last_name}'.lower()[:255],
+        }
 
     class Meta:
-        ordering = ['user__first_name', 'user__last_name']
+        ordering = ['sort_key', 'id']
         permissions = [
             ('view_history', 'Can view history')
         ]
+        indexes = [
+            models.Index(fields=['sort_key', 'id'], name='store_customer_sort_idx'),
+            models.Index(fields=['last_name'], name='store_customer_last_name_idx'),
+        ]
+
+
+class OrderQuerySet(models.QuerySet):
+    def update_totals(self):
+        """Recompute the stored total and item_count from the order items."""
+        items = OrderItem.objects \
+            .filter(order_id=models.OuterRef('pk')) \
+            .order_by() \
+            .values('order_id')
+        total = items \
+            .annotate(total=models.Sum(models.ExpressionWrapper(
+                models.F('quantity') * models.F('unit_price'),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2)))) \
+            .values('total')
+        item_count = items \
+            .annotate(item_count=models.Sum('quantity')) \
+            .values('item_count')
+        return self.update(
+            total=Coalesce(models.Subquery(total), models.Value(Decimal(0))),
+            item_count=Coalesce(models.Subquery(item_count), 0))
 
 
 class Order(models.Model):
@@ -98,15 +154,25 @@ class Order(models.Model):
         (PAYMENT_STATUS_FAILED, 'Failed')
     ]
 
+    objects = OrderQuerySet.as_manager()
     placed_at = models.DateTimeField(auto_now_add=True)
     payment_status = models.CharField(
         max_length=1, choices=PAYMENT_STATUS_CHOICES, default=PAYMENT_STATUS_PENDING)
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT)
+    # Kept equal to the sum of the items by checkout and OrderAdmin; run
+    # `backfill_order_totals` after writing items any other way.
+    total = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, editable=False)
+    item_count = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         permissions = [
             ('cancel_order', 'Can cancel order')
         ]
+        indexes = [
+            models.Index(fields=['placed_at'], name='store_order_placed_idx'),
+            models.Index(fields=['customer', 'placed_at'], name='store_order_customer_idx'),
+        ]
 
 
 class OrderItem(models.Model):
@@ -117,6 +183,72 @@ class OrderItem(models.Model):
     unit_price = models.DecimalField(max_digits=6, decimal_places=2)
 
 
+class ArchivedOrder(models.Model):
+    """
+    An order moved out of the Order table by `archive_orders`. It keeps its
+    original ID, so order URLs keep working, and is read-only.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    placed_at = models.DateTimeField()
+    payment_status = models.CharField(
+        max_length=1, choices=Order.PAYMENT_STATUS_CHOICES)
+    customer = models.ForeignKey(
+        Customer, on_delete=models.PROTECT, related_name='archived_orders')
+    total = models.DecimalField(max_digits=12, decimal_places=2)
+    item_count = models.PositiveIntegerField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'placed_at'], name='store_archivedorder_cust_idx'),
+        ]
+
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(
+        ArchivedOrder, on_delete=models.PROTECT, related_name='items')
+    product = models.ForeignKey(
+        Product, on_delete=models.PROTECT, related_name='archived_orderitems')
+    quantity = models.PositiveSmallIntegerField()
+    unit_price = models.DecimalField(max_digits=6, decimal_places=2)
+
+
+class SalesTotals(models.Model):
+    date = models.DateField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.PositiveIntegerField(default=0)
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class SalesDay(SalesTotals):
+    """
+    Sales per day, kept up to date by the order_created consumer in
+    `store.analytics` and rebuilt with `rebuild_sales_rollups`.
+    """
+    class Meta:
+        unique_together = [['date']]
+
+
+class ProductSalesDay(SalesTotals):
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        unique_together = [['date', 'product']]
+
+
+class CollectionSalesDay(SalesTotals):
+    collection = models.ForeignKey(
+        Collection, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        unique_together = [['date', 'collection']]
+
+
 class Address(models.Model):
     street = models.CharField(max_length=255)
     city = models.CharField(max_length=255)
@@ -124,12 +256,41 @@ class Address(models.Model):
         Customer, on_delete=models.CASCADE)
 
 
+def line_total(prefix=''):
+    """`quantity * product.unit_price` of a cart item, computed by the database."""
+    return models.ExpressionWrapper(
+        models.F(f'{prefix}quantity') * models.F(f'{prefix}product__unit_price'),
+        output_field=models.DecimalField(max_digits=11, decimal_places=2))
+
+
+class CartManager(models.Manager):
+    def with_totals(self):
+        return self.get_queryset().annotate(
+            items_count=Coalesce(models.Sum('items__quantity'), 0),
+            total_price=Coalesce(
+                models.Sum(line_total('items__')),
+                models.Value(Decimal(0)),
+                output_field=models.DecimalField(max_digits=14, decimal_places=2)))
+
+
+class CartItemManager(models.Manager):
+    def with_total_price(self):
+        return self.get_queryset().annotate(total_price=line_total())
+
+
 class Cart(models.Model):
+    objects = CartManager()
     id = models.UUIDField(primary_key=True, default=uuid4)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='store_cart_created_idx'),
+        ]
+
 
 class CartItem(models.Model):
+    objects = CartItemManager()
     cart = models.ForeignKey(
         Cart, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -141,6 +302,64 @@ class CartItem(models.Model):
         unique_together = [['cart', 'product']]
 
 
+class Reservation(models.Model):
+    """
+    Stock held for a cart by DatabaseReservationStore. `cart_id` is not a
+    foreign key because carts kept in the cart store have no Cart row.
+    """
+    cart_id = models.UUIDField()
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = [['cart_id', 'product']]
+        indexes = [
+            models.Index(fields=['product', 'expires_at'], name='store_reservation_product_idx'),
+        ]
+
+
+class OutboxEvent(models.Model):
+    """
+    An event written in the same transaction as the change it describes and
+    delivered after commit by the `relay_outbox` task. Delivery is
+    at-least-once; consumers deduplicate on `event_id`.
+    """
+    event_id = models.UUIDField(default=uuid4, unique=True, editable=False)
+    topic = models.CharField(max_length=255)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['dispatched_at', 'id'], name='store_outbox_pending_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.topic} {self.event_id}'
+
+
+class ProcessedEvent(models.Model):
+    """
+    Marks an outbox event as handled by a consumer. Written in the same
+    transaction as the consumer's own writes, so the two commit or roll back
+    together.
+    """
+    event_id = models.UUIDField()
+    consumer = models.CharField(max_length=255)
+    processed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = [['event_id', 'consumer']]
+        indexes = [
+            models.Index(fields=['processed_at'], name='store_processedevent_at_idx'),
+        ]
+
+
 class Review(models.Model):
     product = models.ForeignKey(
         Product, on_delete=models.CASCADE, related_name='reviews')
@@ -0,0 +1,147 @@
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from time import perf_counter
+import csv
+import logging
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Customer
+
+
+logger = logging.getLogger(__name__)
+
+USER_FIELDS = ['username', 'email', 'first_name', 'last_name']
+CUSTOMER_FIELDS = ['phone', 'birth_date', 'membership']
+COLUMNS = USER_FIELDS + ['password'] + CUSTOMER_FIELDS
+
+
+def read_csv(file):
+    """
+    Yield `(line number, row)` for each row of a CSV file with a header of
+    COLUMNS (only username and email are required), one row at a time.
+    """
+    reader = csv.DictReader(file)
+    missing = {'username', 'email'} - set(reader.fieldnames or [])
+    if missing:
+        raise ValueError(f'Missing columns: {", ".join(sorted(missing))}.')
+    for row in reader:
+        yield reader.line_num, row
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def import_customers(rows, batch_size=1000, workers=None, max_errors=100):
+    """
+    Create a user and its customer for every `(line number, row)` in `rows`,
+    `batch_size` rows per transaction, and return the counts and timings.
+
+    Users and customers are inserted with bulk_create, so the post_save
+    receiver that creates a customer for each new user is not involved.
+    Passwords are hashed in a pool of `workers` processes (one per CPU by
+    default, or in this process with 0). Rows whose username or email is
+    already taken are skipped; invalid rows are reported by line number, up
+    to `max_errors` of them.
+    """
+    stats = {'created': 0, 'skipped': 0, 'invalid': 0, 'batches': 0, 'seconds': 0.0, 'errors': []}
+    start = perf_counter()
+
+    executor = ProcessPoolExecutor(workers, initializer=django.setup) if workers != 0 else None
+    try:
+        for batch in batched(rows, batch_size):
+            accounts = skip_existing(list(validate(batch, stats, max_errors)), stats)
+            if not accounts:
+                continue
+            users, customers, passwords = zip(*accounts)
+
+            if executor is None:
+                hashed = map(make_password, passwords)
+            else:
+                hashed = executor.map(make_password, passwords, chunksize=max(1, len(passwords) // 32))
+            for user, password in zip(users, hashed):
+                user.password = password
+
+            save_batch(users, customers)
+            stats['created'] += len(users)
+            stats['batches'] += 1
+            logger.debug('Imported %d customers (%d so far).', len(users), stats['created'])
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    stats['seconds'] = perf_counter() - start
+    logger.info(
+        'Imported %(created)d customers in %(batches)d batches, %(seconds).3fs '
+        '(%(skipped)d already existed, %(invalid)d invalid).',
+        stats, extra={'import_customers': {key: value for key, value in stats.items() if key != 'errors'}})
+    return stats
+
+
+def validate(batch, stats, max_errors):
+    """Yield `(user, customer, password)` for the valid rows of a batch."""
+    User = get_user_model()
+    seen = set()
+    for line, row in batch:
+        row = {column: (value or '').strip() for column, value in row.items() if column in COLUMNS}
+        user = User(**{field: row.get(field, '') for field in USER_FIELDS})
+        customer = Customer(
+            phone=row.get('phone', ''),
+            birth_date=row.get('birth_date') or None,
+            membership=row.get('membership') or Customer.MEMBERSHIP_BRONZE)
+        try:
+            user.clean_fields(exclude=['password'])
+            # Customers created at signup have no phone either.
+            customer.clean_fields(exclude=['user'] if customer.phone else ['user', 'phone'])
+            if user.username in seen or user.email in seen:
+                raise ValidationError({'username': 'Duplicate username or email in the same batch.'})
+        except ValidationError as error:
+            stats['invalid'] += 1
+            if len(stats['errors']) < max_errors:
+                stats['errors'].append((line, '; '.join(
+                    f'{field}: {" ".join(messages)}' for field, messages in error.message_dict.items())))
+            continue
+        seen.update([user.username, user.email])
+        yield user, customer, row.get('password') or None
+
+
+def skip_existing(accounts, stats):
+    """Drop the accounts whose username or email is already taken."""
+    taken = set()
+    for username, email in get_user_model().objects \
+            .filter(Q(username__in=[user.username for user, _, _ in accounts]) |
+                    Q(email__in=[user.email for user, _, _ in accounts])) \
+            .values_list('username', 'email'):
+        taken.update([username, email])
+
+    kept = [account for account in accounts
+            if account[0].username not in taken and account[0].email not in taken]
+    stats['skipped'] += len(accounts) - len(kept)
+    return kept
+
+
+def save_batch(users, customers):
+    User = get_user_model()
+    with transaction.atomic():
+        User.objects.bulk_create(users)
+        if users[0].pk is None:
+            # Backends that cannot return inserted IDs (MySQL) need them
+            # read back before the customers can point at the users.
+            ids = dict(User.objects
+                       .filter(username__in=[user.username for user in users])
+                       .values_list('username', 'id'))
+            for user in users:
+                user.pk = ids[user.username]
+        for user, customer in zip(users, customers):
+            customer.user = user
+            for field, value in Customer.name_fields(user).items():
+                setattr(customer, field, value)
+        Customer.objects.bulk_create(customers)
@@ -0,0 +1,142 @@
+from collections import defaultdict
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Order, OutboxEvent, ProcessedEvent, raw_delete
+from .signals import order_created
+
+
+logger = logging.getLogger(__name__)
+
+# topic -> (signal, load). `load` turns a batch of payloads into the keyword
+# arguments the signal is sent with, or None for events that can no longer be
+# delivered.
+topics = {}
+
+
+def register_topic(name, signal, load):
+    topics[name] = (signal, load)
+
+
+def load_orders(payloads):
+    orders = Order.objects.in_bulk([payload['order_id'] for payload in payloads])
+    return [
+        {'order': orders[payload['order_id']]} if payload['order_id'] in orders else None
+        for payload in payloads
+    ]
+
+
+register_topic('order_created', order_created, load_orders)
+
+
+def publish(topic, payload):
+    """
+    Record an event in the current transaction. The relay is started once
+    the transaction commits; the periodic `relay_outbox` run picks up
+    anything that start misses.
+    """
+    event = OutboxEvent.objects.create(topic=topic, payload=payload)
+    transaction.on_commit(schedule_relay, robust=True)
+    return event
+
+
+def schedule_relay():
+    from .tasks import relay_outbox
+    relay_outbox.delay()
+
+
+def relay(batch_size=100, max_attempts=10):
+    """
+    Deliver pending events in batches and return how many were delivered.
+    Rows are locked with SKIP LOCKED, so concurrent relays share the work.
+    Events whose receivers raise stay pending until `max_attempts`, and
+    what their receivers wrote is rolled back.
+    """
+    delivered = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            events = list(OutboxEvent.objects
+                          .select_for_update(skip_locked=True)
+                          .filter(dispatched_at__isnull=True, attempts__lt=max_attempts, id__gt=last_id)
+                          .order_by('id')[:batch_size])
+            if not events:
+                break
+            delivered += dispatch(events)
+        last_id = events[-1].id
+        if len(events) < batch_size:
+            break
+    return delivered
+
+
+def dispatch(events):
+    by_topic = defaultdict(list)
+    for event in events:
+        by_topic[event.topic].append(event)
+
+    now = timezone.now()
+    delivered = 0
+    for topic, topic_events in by_topic.items():
+        if topic not in topics:
+            for event in topic_events:
+                event.attempts += 1
+                event.last_error = f'Unknown topic {topic!r}.'
+            continue
+
+        signal, load = topics[topic]
+        for event, kwargs in zip(topic_events, load([event.payload for event in topic_events])):
+            event.attempts += 1
+            if kwargs is None:
+                event.dispatched_at = now
+                continue
+            # Each event gets a savepoint: a receiver that fails rolls back
+            # the writes of this event's receivers only, and cannot leave
+            # the transaction holding the batch's locks unusable.
+            with transaction.atomic():
+                errors = [
+                    f'{receiver.__module__}.{receiver.__qualname__}: {response!r}'
+                    for receiver, response in signal.send_robust(OutboxEvent, event_id=event.event_id, **kwargs)
+                    if isinstance(response, Exception)
+                ]
+                if errors:
+                    transaction.set_rollback(True)
+            if errors:
+                event.last_error = '\n'.join(errors)
+                logger.warning('Delivering %s failed: %s', event, event.last_error)
+            else:
+                event.dispatched_at = now
+                event.last_error = ''
+                delivered += 1
+
+    OutboxEvent.objects.bulk_update(events, ['dispatched_at', 'attempts', 'last_error'])
+    return delivered
+
+
+def prune(retention=None):
+    """
+    Delete events delivered more than `retention` ago, and the markers of
+    their processing, and return the number of events deleted.
+    """
+    if retention is None:
+        retention = settings.STORE_OUTBOX_RETENTION
+    cutoff = timezone.now() - retention
+    raw_delete(ProcessedEvent.objects.filter(processed_at__lt=cutoff))
+    return raw_delete(OutboxEvent.objects.filter(dispatched_at__lt=cutoff))
+
+
+def first_delivery(event_id, consumer):
+    """
+    True the first time `consumer` is handed `event_id`. Receivers with side
+    effects use it to ignore redelivered events, calling it in the same
+    transaction as their writes: if they roll back, the event is handed to
+    the consumer again.
+    """
+    try:
+        with transaction.atomic():
+            ProcessedEvent.objects.create(event_id=event_id, consumer=consumer)
+    except IntegrityError:
+        return False
+    return True
@@ -1,4 +1,201 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
 
 class DefaultPagination(PageNumberPagination):
-  page_size = 10
\ No newline at end of file
+  page_size = 10
+
+
+class KeysetPagination(BasePagination):
+  """
+  Seek-based pagination over `(ordering field, id)`.
+
+  Pages are fetched with a `WHERE (field, id) > (last seen)` condition
+  instead of an OFFSET, and no COUNT query is issued, so every page costs
+  the same no matter how deep it is.
+  """
+  page_size = 10
+  page_size_query_param = None
+  max_page_size = None
+  cursor_query_param = 'cursor'
+  ordering_param = 'ordering'
+  ordering_fields = ['unit_price', 'last_update']
+  default_ordering = 'id'
+  tiebreaker = 'id'
+  invalid_cursor_message = 'Invalid cursor'
+
+  def paginate_queryset(self, queryset, request, view=None):
+    return self.paginate_querysets([queryset], request, view)
+
+  def paginate_querysets(self, querysets, request, view=None):
+    """
+    Paginate several querysets as one sequence. Under the page ordering,
+    every row of a queryset must sort before every row of the next one.
+    """
+    self.request = request
+    self.page_size = self.get_page_size(request)
+    self.base_url = self.get_base_url(request)
+    self.ordering = self.get_ordering(request, view)
+    self.fields = [field.lstrip('-') for field in self.ordering]
+
+    cursor = self.decode_cursor(request, querysets[0].model)
+    reverse, position = cursor if cursor else (False, None)
+
+    ordering = self.ordering
+    if reverse:
+      ordering = [self._invert(field) for field in ordering]
+      querysets = querysets[::-1]
+
+    # Later querysets are only read when the earlier ones run out.
+    results = []
+    for queryset in querysets:
+      queryset = queryset.order_by(*ordering)
+      if position is not None:
+        queryset = queryset.filter(self.seek(ordering, position))
+      results += queryset[:self.page_size + 1 - len(results)]
+      if len(results) > self.page_size:
+        break
+    has_more = len(results) > self.page_size
+    results = results[:self.page_size]
+
+    if reverse:
+      results.reverse()
+      self.has_next, self.has_previous = True, has_more
+    else:
+      self.has_next, self.has_previous = has_more, position is not None
+
+    self.page = results
+    return results
+
+  def get_paginated_response(self, data):
+    return Response(OrderedDict([
+      ('next', self.get_next_link()),
+      ('previous', self.get_previous_link()),
+      ('results', data),
+    ]))
+
+  def get_page_size(self, request):
+    if self.page_size_query_param:
+      try:
+        page_size = int(request.query_params[self.page_size_query_param])
+        if page_size > 0:
+          return min(page_size, self.max_page_size or page_size)
+      except (KeyError, ValueError):
+        pass
+    return self.page_size
+
+  def get_base_url(self, request):
+    """The URL the previous and next links are built on."""
+    return request.build_absolute_uri()
+
+  def get_ordering(self, request, view):
+    allowed = getattr(view, 'ordering_fields', None) or self.ordering_fields
+    param = request.query_params.get(self.ordering_param, '')
+    field = param.split(',')[0].strip()
+    if field.lstrip('-') not in allowed:
+      field = self.default_ordering
+
+    if field.lstrip('-') == self.tiebreaker:
+      return [field]
+    # The tiebreaker follows the direction of the main field so a single
+    # (field, id) index serves both ascending and descending scans.
+    prefix = '-' if field.startswith('-') else ''
+    return [field, prefix + self.tiebreaker]
+
+  def seek(self, ordering, position):
+    """
+    Build `(a, b) > (x, y)` as `a > x OR (a = x AND b > y)`, honouring the
+    direction of each field.
+    """
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, position):
+      name = field.lstrip('-')
+      lookup = 'lt' if field.startswith('-') else 'gt'
+      condition |= Q(**equal, **{f'{name}__{lookup}': value})
+      equal[name] = value
+    return condition
+
+  def get_next_link(self):
+    if not self.has_next or not self.page:
+      return None
+    return self.encode_cursor(False, self.page[-1])
+
+  def get_previous_link(self):
+    if not self.has_previous or not self.page:
+      return None
+    return self.encode_cursor(True, self.page[0])
+
+  def encode_cursor(self, reverse, item):
+    position = [getattr(item, field) for field in self.fields]
+    payload = json.dumps({'r': reverse, 'p': position}, default=str)
+    token = urlsafe_b64encode(payload.encode()).decode()
+    url = remove_query_param(self.base_url, 'page')
+    return replace_query_param(url, self.cursor_query_param, token)
+
+  def decode_cursor(self, request, model):
+    token = request.query_params.get(self.cursor_query_param)
+    if not token:
+      return None
+
+    try:
+      payload = json.loads(urlsafe_b64decode(token.encode()).decode())
+      reverse, position = bool(payload['r']), payload['p']
+      if len(position) != len(self.fields):
+        raise ValueError
+      position = [
+        model._meta.get_field(field).to_python(value)
+        for field, value in zip(self.fields, position)
+      ]
+    except Exception:
+      raise NotFound(self.invalid_cursor_message)
+
+    return reverse, position
+
+  def _invert(self, field):
+    return field[1:] if field.startswith('-') else '-' + field
+
+
+
+class OrderPagination(KeysetPagination):
+  page_size_query_param = 'page_size'
+  max_page_size = 100
+  ordering_fields = ['placed_at']
+  default_ordering = '-id'
+
+
+class CustomerPagination(KeysetPagination):
+  page_size_query_param = 'page_size'
+  max_page_size = 100
+  ordering_fields = ['sort_key']
+  default_ordering = 'sort_key'
+
+
+class HistoryPagination(OrderPagination):
+  """
+  Newest first only: live orders are always newer than archived ones, so the
+  two tables can be paged as one sequence in that direction.
+  """
+  def get_ordering(self, request, view):
+    return ['-placed_at', '-id']
+
+  def get_base_url(self, request):
+    # Only the page size and the cursor select a page, so links drop any
+    # other parameter.
+    url = request.build_absolute_uri(request.path)
+    return replace_query_param(url, self.page_size_query_param, self.get_page_size(request))
+
+  def get_page_url(self, request):
+    """The request URL reduced to the page size and the cursor."""
+    url = self.get_base_url(request)
+    cursor = request.query_params.get(self.cursor_query_param)
+    if cursor:
+      url = replace_query_param(url, self.cursor_query_param, cursor)
+    return url
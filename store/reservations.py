@@ -0,0 +1,330 @@
+from functools import lru_cache
+from time import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Product, Reservation, raw_delete
+
+
+class ReservationStore:
+    """
+    Holds stock for carts so that adding to a cart fails once a product is
+    sold out, instead of the checkout failing later.
+
+    A product's available stock is its inventory minus the quantities held
+    by carts whose reservation has not expired. Holds expire
+    STORE_RESERVATION_TTL after the cart last reserved the product and are
+    consumed by `commit` when the cart is checked out.
+    """
+
+    @property
+    def ttl(self):
+        return settings.STORE_RESERVATION_TTL
+
+    def reserve(self, cart_id, product_id, quantity):
+        """Hold `quantity` more units for the cart. Returns False if sold out."""
+        raise NotImplementedError
+
+    def release(self, cart_id, product_id, quantity=None):
+        """Give back `quantity` held units, or the whole hold when None."""
+        raise NotImplementedError
+
+    def release_cart(self, cart_id):
+        raise NotImplementedError
+
+    def release_carts(self, cart_ids):
+        for cart_id in cart_ids:
+            self.release_cart(cart_id)
+
+    def commit(self, cart_id, quantities):
+        """
+        Drop the cart's holds after checkout has decremented the inventory
+        by `quantities` ({product_id: quantity}).
+        """
+        raise NotImplementedError
+
+    def available(self, product_id):
+        raise NotImplementedError
+
+    def reconcile(self, product_ids=None, batch_size=500):
+        """
+        Drop expired holds and recompute the available stock from
+        Product.inventory, `batch_size` products at a time. Returns the
+        number of expired holds dropped.
+        """
+        raise NotImplementedError
+
+    def reserve_all(self, cart_id, quantities):
+        """
+        Hold every line of `quantities` or none of them. Returns the IDs of
+        the products that could not be held.
+        """
+        held = {}
+        sold_out = []
+        for product_id, quantity in quantities.items():
+            if self.reserve(cart_id, product_id, quantity):
+                held[product_id] = quantity
+            else:
+                sold_out.append(product_id)
+        if sold_out:
+            for product_id, quantity in held.items():
+                self.release(cart_id, product_id, quantity)
+        return sold_out
+
+    def adjust(self, cart_id, product_id, old_quantity, new_quantity):
+        """Move a line's hold from `old_quantity` to `new_quantity`."""
+        if new_quantity > old_quantity:
+            return self.reserve(cart_id, product_id, new_quantity - old_quantity)
+        if new_quantity < old_quantity:
+            self.release(cart_id, product_id, old_quantity - new_quantity)
+        return True
+
+
+class RedisReservationStore(ReservationStore):
+    """
+    Per product, an available-stock counter (`store:stock:<id>`), a hash of
+    the quantity held by each cart and a sorted set of hold expiry times.
+    Each cart also has a set of the products it holds. Every operation is a
+    single Lua script, so concurrent reservations can never take the
+    counter below zero.
+
+    Expired holds are returned to the counter by the next reservation of
+    the same product, and by `reconcile`.
+    """
+    key_prefix = 'store:stock:'
+    cart_key_prefix = 'store:reservations:'
+
+    # Shared by the scripts below: hand back the holds of expired carts.
+    EXPIRE_HOLDS = """
+        local expired = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', ARGV[3])
+        for _, cart in ipairs(expired) do
+            local held = redis.call('HGET', KEYS[2], cart)
+            if held then redis.call('INCRBY', KEYS[1], held) end
+            redis.call('HDEL', KEYS[2], cart)
+            redis.call('ZREM', KEYS[3], cart)
+        end
+    """
+    RESERVE = """
+        if redis.call('EXISTS', KEYS[1]) == 0 then return -1 end
+    """ + EXPIRE_HOLDS + """
+        local quantity = tonumber(ARGV[2])
+        if tonumber(redis.call('GET', KEYS[1])) < quantity then return 0 end
+        redis.call('DECRBY', KEYS[1], quantity)
+        redis.call('HINCRBY', KEYS[2], ARGV[1], quantity)
+        redis.call('ZADD', KEYS[3], ARGV[4], ARGV[1])
+        redis.call('SADD', KEYS[4], ARGV[6])
+        redis.call('EXPIRE', KEYS[4], ARGV[5])
+        return 1
+    """
+    RELEASE = """
+        local held = tonumber(redis.call('HGET', KEYS[2], ARGV[1]))
+        if not held then return 0 end
+        local quantity = held
+        if ARGV[2] ~= '' then quantity = math.min(held, tonumber(ARGV[2])) end
+        if held > quantity then
+            redis.call('HINCRBY', KEYS[2], ARGV[1], -quantity)
+        else
+            redis.call('HDEL', KEYS[2], ARGV[1])
+            redis.call('ZREM', KEYS[3], ARGV[1])
+        end
+        if redis.call('EXISTS', KEYS[1]) == 1 then redis.call('INCRBY', KEYS[1], quantity) end
+        return quantity
+    """
+    # The inventory already went down by ARGV[2]; only the part that was
+    # not held still has to come off the counter.
+    COMMIT = """
+        local held = tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0')
+        redis.call('HDEL', KEYS[2], ARGV[1])
+        redis.call('ZREM', KEYS[3], ARGV[1])
+        if redis.call('EXISTS', KEYS[1]) == 1 then
+            redis.call('INCRBY', KEYS[1], held - tonumber(ARGV[2]))
+        end
+        return held
+    """
+    RECONCILE = EXPIRE_HOLDS + """
+        local held = 0
+        for _, quantity in ipairs(redis.call('HVALS', KEYS[2])) do
+            held = held + tonumber(quantity)
+        end
+        redis.call('SET', KEYS[1], tonumber(ARGV[7]) - held)
+        return #expired
+    """
+
+    def __init__(self, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(settings.STORE_RESERVATION_REDIS_URL)
+        self.client = client
+        self._reserve = client.register_script(self.RESERVE)
+        self._release = client.register_script(self.RELEASE)
+        self._commit = client.register_script(self.COMMIT)
+        self._reconcile = client.register_script(self.RECONCILE)
+
+    def product_keys(self, product_id):
+        key = f'{self.key_prefix}{product_id}'
+        return [key, f'{key}:holds', f'{key}:expiry']
+
+    def cart_key(self, cart_id):
+        return f'{self.cart_key_prefix}{cart_id}'
+
+    def args(self, cart_id, quantity='', product_id='', inventory=0):
+        ttl = int(self.ttl.total_seconds())
+        now = int(time())
+        return [str(cart_id), quantity, now, now + ttl, ttl, product_id, inventory]
+
+    def reserve(self, cart_id, product_id, quantity):
+        keys = self.product_keys(product_id) + [self.cart_key(cart_id)]
+        result = self._reserve(keys=keys, args=self.args(cart_id, quantity, product_id))
+        if result == -1:
+            # First reservation since the counter was lost or never loaded.
+            self.reconcile([product_id])
+            result = self._reserve(keys=keys, args=self.args(cart_id, quantity, product_id))
+        return result == 1
+
+    def release(self, cart_id, product_id, quantity=None):
+        self._release(
+            keys=self.product_keys(product_id),
+            args=self.args(cart_id, '' if quantity is None else quantity))
+
+    def release_cart(self, cart_id):
+        for product_id in self.client.smembers(self.cart_key(cart_id)):
+            self.release(cart_id, int(product_id))
+        self.client.delete(self.cart_key(cart_id))
+
+    def commit(self, cart_id, quantities):
+        for product_id, quantity in quantities.items():
+            self._commit(keys=self.product_keys(product_id), args=self.args(cart_id, quantity))
+        self.client.delete(self.cart_key(cart_id))
+
+    def available(self, product_id):
+        value = self.client.get(self.product_keys(product_id)[0])
+        return None if value is None else int(value)
+
+    def reconcile(self, product_ids=None, batch_size=500):
+        products = Product.objects.order_by('pk')
+        if product_ids is not None:
+            products = products.filter(pk__in=product_ids)
+
+        expired = 0
+        last_id = 0
+        while True:
+            # The product rows stay locked, in the same order checkout locks
+            # them, until their counters are set. A checkout cannot commit
+            # between reading the inventory and setting the counter, so the
+            # counter is never rebuilt from an inventory that is already
+            # out of date.
+            with transaction.atomic():
+                batch = list(products
+                             .select_for_update()
+                             .filter(pk__gt=last_id)
+                             .values_list('pk', 'inventory')[:batch_size])
+                if not batch:
+                    break
+                pipeline = self.client.pipeline(transaction=False)
+                for product_id, inventory in batch:
+                    self._reconcile(
+                        keys=self.product_keys(product_id),
+                        args=self.args('', inventory=inventory),
+                        client=pipeline)
+                expired += sum(pipeline.execute())
+            last_id = batch[-1][0]
+            if len(batch) < batch_size:
+                break
+        return expired
+
+
+class DatabaseReservationStore(ReservationStore):
+    """
+    Keeps holds in the Reservation table. Reserving locks the product row,
+    so reservations of one product are serialized by the database.
+    """
+
+    def held(self, product_id, exclude_cart_id=None):
+        reservations = Reservation.objects.filter(
+            product_id=product_id, expires_at__gt=timezone.now())
+        if exclude_cart_id is not None:
+            reservations = reservations.exclude(cart_id=exclude_cart_id)
+        return reservations.aggregate(held=Sum('quantity'))['held'] or 0
+
+    def reserve(self, cart_id, product_id, quantity):
+        now = timezone.now()
+        with transaction.atomic():
+            inventory = Product.objects \
+                .select_for_update() \
+                .filter(pk=product_id) \
+                .values_list('inventory', flat=True) \
+                .first()
+            if inventory is None:
+                return False
+
+            reservation = Reservation.objects \
+                .filter(cart_id=cart_id, product_id=product_id) \
+                .first()
+            current = reservation.quantity if reservation and reservation.expires_at > now else 0
+            if inventory - self.held(product_id, exclude_cart_id=cart_id) < current + quantity:
+                return False
+
+            Reservation.objects.update_or_create(
+                cart_id=cart_id,
+                product_id=product_id,
+                defaults={'quantity': current + quantity, 'expires_at': now + self.ttl})
+            return True
+
+    def release(self, cart_id, product_id, quantity=None):
+        reservations = Reservation.objects.filter(cart_id=cart_id, product_id=product_id)
+        if quantity is None:
+            reservations.delete()
+            return
+        with transaction.atomic():
+            reservation = reservations.select_for_update().first()
+            if reservation is None:
+                return
+            if reservation.quantity > quantity:
+                reservation.quantity -= quantity
+                reservation.save(update_fields=['quantity'])
+            else:
+                reservation.delete()
+
+    def release_cart(self, cart_id):
+        Reservation.objects.filter(cart_id=cart_id).delete()
+
+    def release_carts(self, cart_ids):
+        Reservation.objects.filter(cart_id__in=cart_ids).delete()
+
+    def commit(self, cart_id, quantities):
+        self.release_cart(cart_id)
+
+    def available(self, product_id):
+        inventory = Product.objects \
+            .filter(pk=product_id) \
+            .values_list('inventory', flat=True) \
+            .first()
+        if inventory is None:
+            return None
+        return inventory - self.held(product_id)
+
+    def reconcile(self, product_ids=None, batch_size=500):
+        # Available stock is always derived from Product.inventory here, so
+        # reconciling only has to clear out expired rows.
+        expired = Reservation.objects.filter(expires_at__lte=timezone.now())
+        if product_ids is not None:
+            expired = expired.filter(product_id__in=product_ids)
+        return raw_delete(expired)
+
+
+@lru_cache
+def load_reservation_store(path):
+    return import_string(path)()
+
+
+def get_reservation_store():
+    """
+    Return the store named by STORE_RESERVATION_BACKEND, or None when stock
+    is only checked at checkout.
+    """
+    path = getattr(settings, 'STORE_RESERVATION_BACKEND', None)
+    return load_reservation_store(path) if path else None
@@ -0,0 +1,197 @@
+from bisect import bisect_left
+from collections import defaultdict
+from threading import Lock
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, When
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall((text or '').lower())
+
+
+class BaseSearchBackend:
+    def search(self, queryset, terms):
+        """
+        Narrow `queryset` down to the products matching every term and
+        order them by relevance.
+        """
+        raise NotImplementedError
+
+    def index(self, product):
+        pass
+
+    def remove(self, product_id):
+        pass
+
+
+class MySQLFullTextSearchBackend(BaseSearchBackend):
+    """
+    Uses the FULLTEXT index on (title, description). Every term is required
+    and matched as a word prefix.
+
+    InnoDB does not index tokens shorter than innodb_ft_min_token_size or
+    stopwords, so such terms are matched with a substring search instead.
+    """
+    min_token_size = 3
+    # InnoDB's default stopword list (INFORMATION_SCHEMA.INNODB_FT_DEFAULT_STOPWORD).
+    stopwords = frozenset([
+        'a', 'about', 'an', 'are', 'as', 'at', 'be', 'by', 'com', 'de', 'en', 'for',
+        'from', 'how', 'i', 'in', 'is', 'it', 'la', 'of', 'on', 'or', 'that', 'the',
+        'this', 'to', 'was', 'what', 'when', 'where', 'who', 'will', 'with', 'und',
+        'www',
+    ])
+
+    def search(self, queryset, terms):
+        indexed = []
+        for term in terms:
+            if len(term) < self.min_token_size or term in self.stopwords:
+                queryset = queryset.filter(Q(title__icontains=term) | Q(description__icontains=term))
+            else:
+                indexed.append(term)
+        if not indexed:
+            return queryset
+
+        table = queryset.model._meta.db_table
+        query = ' '.join(f'+{term}*' for term in indexed)
+        relevance = RawSQL(
+            f'MATCH ({table}.title, {table}.description) AGAINST (%s IN BOOLEAN MODE)',
+            (query,))
+        return queryset \
+            .annotate(relevance=relevance) \
+            .filter(relevance__gt=0) \
+            .order_by('-relevance', 'id')
+
+
+class InMemorySearchBackend(BaseSearchBackend):
+    """
+    An inverted index kept in process memory, for databases without a
+    full-text index (SQLite, test runs). Loaded from the database on first
+    use and kept up to date by the Product signal handlers.
+    """
+    title_weight = 2
+    prefix_weight = 0.5
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._postings = defaultdict(dict)
+            self._documents = {}
+            self._vocabulary = []
+            self._loaded = False
+
+    def search(self, queryset, terms):
+        self._load(queryset.model)
+
+        with self._lock:
+            scores = None
+            for term in terms:
+                term_scores = self._score_term(term)
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {
+                        product_id: score + term_scores[product_id]
+                        for product_id, score in scores.items()
+                        if product_id in term_scores
+                    }
+
+        ranking = sorted(scores, key=lambda product_id: (-scores[product_id], product_id))
+        if not ranking:
+            return queryset.none()
+
+        relevance = Case(
+            *[When(pk=product_id, then=position) for position, product_id in enumerate(ranking)],
+            output_field=IntegerField())
+        return queryset \
+            .filter(pk__in=ranking) \
+            .annotate(relevance=relevance) \
+            .order_by('relevance')
+
+    def index(self, product):
+        with self._lock:
+            if not self._loaded:
+                return
+            self._remove(product.pk)
+            self._add(product.pk, product.title, product.description)
+
+    def remove(self, product_id):
+        with self._lock:
+            if self._loaded:
+                self._remove(product_id)
+
+    def _load(self, model):
+        with self._lock:
+            if self._loaded:
+                return
+            products = model.objects \
+                .values_list('id', 'title', 'description') \
+                .iterator(chunk_size=2000)
+            for product_id, title, description in products:
+                self._add(product_id, title, description)
+            self._loaded = True
+
+    def _add(self, product_id, title, description):
+        weights = defaultdict(float)
+        for token in tokenize(title):
+            weights[token] += self.title_weight
+        for token in tokenize(description):
+            weights[token] += 1
+
+        for token, weight in weights.items():
+            if not self._postings[token]:
+                self._vocabulary = []
+            self._postings[token][product_id] = weight
+        self._documents[product_id] = list(weights)
+
+    def _remove(self, product_id):
+        for token in self._documents.pop(product_id, []):
+            postings = self._postings[token]
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[token]
+                self._vocabulary = []
+
+    def _score_term(self, term):
+        if not self._vocabulary:
+            self._vocabulary = sorted(self._postings)
+
+        scores = defaultdict(float)
+        position = bisect_left(self._vocabulary, term)
+        while position < len(self._vocabulary) and self._vocabulary[position].startswith(term):
+            token = self._vocabulary[position]
+            weight = 1 if token == term else self.prefix_weight
+            for product_id, score in self._postings[token].items():
+                scores[product_id] += score * weight
+            position += 1
+        return scores
+
+
+_backend = None
+
+
+def get_search_backend():
+    """
+    Return the backend named by the STORE_SEARCH_BACKEND setting, or pick
+    one based on the database vendor.
+    """
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'STORE_SEARCH_BACKEND', None)
+        if path:
+            _backend = import_string(path)()
+        elif connection.vendor == 'mysql':
+            _backend = MySQLFullTextSearchBackend()
+        else:
+            _backend = InMemorySearchBackend()
+    return _backend
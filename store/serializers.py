@@ -1,8 +1,77 @@
+from datetime import timedelta
 from decimal import Decimal
-from django.db import transaction
+from operator import itemgetter
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Exists, F, IntegerField, OuterRef, Value, When
+from django.utils import timezone
 from rest_framework import serializers
-from .signals import order_created
-from .models import Cart, CartItem, Customer, Order, OrderItem, Product, Collection, ProductImage, Review
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import SAFE_METHODS
+from .cache import forget_cart_summaries, invalidate, product_exists
+from .carts import get_cart_store
+from .reservations import get_reservation_store
+from .outbox import publish
+from .models import ArchivedOrder, ArchivedOrderItem, Cart, CartItem, Customer, Order, OrderItem, Product, Collection, ProductImage, Review, raw_delete
+
+
+TAX_RATE = Decimal(1.1)
+
+
+def reserve_stock(cart_id, quantities):
+    """
+    Hold `quantities` ({product_id: quantity}) for the cart when a
+    reservation store is configured, or fail without holding any of them.
+    """
+    reservations = get_reservation_store()
+    if reservations is None:
+        return
+    sold_out = reservations.reserve_all(cart_id, quantities)
+    if sold_out:
+        raise serializers.ValidationError(
+            {'quantity': f'Not enough inventory for products {sold_out}.'})
+
+
+def release_stock(cart_id, quantities):
+    """Give back what `reserve_stock` held when the add fails afterwards."""
+    reservations = get_reservation_store()
+    if reservations is not None:
+        for product_id, quantity in quantities.items():
+            reservations.release(cart_id, product_id, quantity)
+
+
+def parse_field_names(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    Lets read requests pick fields with `?fields=a,b` or drop them with
+    `?omit=c`. Views can call `get_requested_fields` to shape their
+    querysets the same way.
+    """
+
+    @classmethod
+    def get_requested_fields(cls, request):
+        names = list(cls.Meta.fields)
+        if request is None or request.method not in SAFE_METHODS:
+            return names
+
+        fields = request.query_params.get('fields')
+        if fields:
+            fields = parse_field_names(fields)
+            names = [name for name in names if name in fields]
+        omit = request.query_params.get('omit')
+        if omit:
+            omit = parse_field_names(omit)
+            names = [name for name in names if name not in omit]
+        return names
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.get_requested_fields(self.context.get('request'))
+        for name in list(self.fields):
+            if name not in requested:
+                self.fields.pop(name)
 
 
 class CollectionSerializer(serializers.ModelSerializer):
@@ -27,7 +96,7 @@ class ProductImageSerializer(serializers.ModelSerializer):
         fields = ['id', 'image']
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     images = ProductImageSerializer(many=True, read_only=True)
 
     class Meta:
@@ -39,7 +108,7 @@ class ProductSerializer(serializers.ModelSerializer):
         method_name='calculate_tax')
 
     def calculate_tax(self, product: Product):
-        return product.unit_price * Decimal(1.1)
+        return product.unit_price * TAX_RATE
 
 
 class ReviewSerializer(serializers.ModelSerializer):
@@ -63,6 +132,10 @@ class CartItemSerializer(serializers.ModelSerializer):
     total_price = serializers.SerializerMethodField()
 
     def get_total_price(self, cart_item: CartItem):
+        # Querysets from CartItem.objects.with_total_price() carry the
+        # total computed by the database.
+        if hasattr(cart_item, 'total_price'):
+            return cart_item.total_price
         return cart_item.quantity * cart_item.product.unit_price
 
     class Meta:
@@ -76,6 +149,8 @@ class CartSerializer(serializers.ModelSerializer):
     total_price = serializers.SerializerMethodField()
 
     def get_total_price(self, cart):
+        if hasattr(cart, 'total_price'):
+            return cart.total_price
         return sum([item.quantity * item.product.unit_price for item in cart.items.all()])
 
     class Meta:
@@ -87,7 +162,7 @@ class AddCartItemSerializer(serializers.ModelSerializer):
     product_id = serializers.IntegerField()
 
     def validate_product_id(self, value):
-        if not Product.objects.filter(pk=value).exists():
+        if not product_exists(value):
             raise serializers.ValidationError(
                 'No product with the given ID was found.')
         return value
@@ -96,25 +171,139 @@ class AddCartItemSerializer(serializers.ModelSerializer):
         cart_id = self.context['cart_id']
         product_id = self.validated_data['product_id']
         quantity = self.validated_data['quantity']
-
+        reserve_stock(cart_id, {product_id: quantity})
         try:
-            cart_item = CartItem.objects.get(
-                cart_id=cart_id, product_id=product_id)
-            cart_item.quantity += quantity
-            cart_item.save()
-            self.instance = cart_item
-        except CartItem.DoesNotExist:
-            self.instance = CartItem.objects.create(
-                cart_id=cart_id, **self.validated_data)
-
+            self.instance = self.add(cart_id, product_id, quantity)
+        except Exception:
+            release_stock(cart_id, {product_id: quantity})
+            raise
         return self.instance
 
+    def add(self, cart_id, product_id, quantity):
+        # Increment in place first: a single UPDATE when the line exists.
+        # Otherwise insert it, and if a concurrent request inserted the same
+        # line in the meantime, fall back to incrementing that one.
+        if not self.increment(cart_id, product_id, quantity):
+            if not Cart.objects.filter(pk=cart_id).exists():
+                raise NotFound()
+            try:
+                with transaction.atomic():
+                    return CartItem.objects.create(
+                        cart_id=cart_id, product_id=product_id, quantity=quantity)
+            except IntegrityError:
+                if not self.increment(cart_id, product_id, quantity):
+                    # Either row the line points at may have been deleted.
+                    if not Cart.objects.filter(pk=cart_id).exists():
+                        raise NotFound()
+                    raise serializers.ValidationError(
+                        {'product_id': 'No product with the given ID was found.'})
+
+        return CartItem.objects.get(cart_id=cart_id, product_id=product_id)
+
+    def increment(self, cart_id, product_id, quantity):
+        updated = CartItem.objects \
+            .filter(cart_id=cart_id, product_id=product_id) \
+            .update(quantity=F('quantity') + quantity)
+        # The UPDATE skips the CartItem signals that drop the summary.
+        if updated:
+            forget_cart_summaries([cart_id])
+        return updated
+
     class Meta:
         model = CartItem
         fields = ['id', 'product_id', 'quantity']
 
 
+# The largest value CartItem.quantity (a PositiveSmallIntegerField) holds.
+MAX_CART_QUANTITY = 32767
+
+
+class BulkAddCartItemListSerializer(serializers.ListSerializer):
+    def validate(self, items):
+        quantities = {}
+        for item in items:
+            quantities[item['product_id']] = quantities.get(item['product_id'], 0) + item['quantity']
+        too_many = sorted(product_id for product_id, quantity in quantities.items()
+                          if quantity > MAX_CART_QUANTITY)
+        if too_many:
+            raise serializers.ValidationError(
+                {'quantity': f'At most {MAX_CART_QUANTITY} of each product, too many of {too_many}.'})
+
+        product_ids = set(quantities)
+        found = set(Product.objects
+                    .filter(pk__in=product_ids)
+                    .values_list('id', flat=True))
+        missing = sorted(product_ids - found)
+        if missing:
+            raise serializers.ValidationError(
+                {'product_id': f'No products with the given IDs were found: {missing}.'})
+        return items
+
+    @property
+    def quantities(self):
+        """The validated lines with repeated products merged."""
+        quantities = {}
+        for item in self.validated_data:
+            product_id = item['product_id']
+            quantities[product_id] = quantities.get(product_id, 0) + item['quantity']
+        return quantities
+
+    def save(self, **kwargs):
+        cart_id = self.context['cart_id']
+        quantities = self.quantities
+        reserve_stock(cart_id, quantities)
+
+        try:
+            try:
+                self.upsert(cart_id, quantities)
+            except IntegrityError:
+                # A concurrent add created one of the new lines first; the
+                # retry sees it and updates it instead.
+                self.upsert(cart_id, quantities)
+        except Exception:
+            release_stock(cart_id, quantities)
+            raise
+
+    def upsert(self, cart_id, quantities):
+        with transaction.atomic():
+            existing = CartItem.objects \
+                .select_for_update() \
+                .filter(cart_id=cart_id, product_id__in=quantities)
+            existing = {item.product_id: item for item in existing}
+            for product_id, item in existing.items():
+                item.quantity += quantities[product_id]
+            too_many = sorted(product_id for product_id, item in existing.items()
+                              if item.quantity > MAX_CART_QUANTITY)
+            if too_many:
+                raise serializers.ValidationError(
+                    {'quantity': f'At most {MAX_CART_QUANTITY} of each product, too many of {too_many}.'})
+            CartItem.objects.bulk_update(existing.values(), ['quantity'])
+            CartItem.objects.bulk_create([
+                CartItem(cart_id=cart_id, product_id=product_id, quantity=quantity)
+                for product_id, quantity in quantities.items()
+                if product_id not in existing
+            ])
+        forget_cart_summaries([cart_id])
+
+
+class BulkAddCartItemSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, max_value=MAX_CART_QUANTITY)
+
+    class Meta:
+        list_serializer_class = BulkAddCartItemListSerializer
+
+
 class UpdateCartItemSerializer(serializers.ModelSerializer):
+    def update(self, instance, validated_data):
+        reservations = get_reservation_store()
+        if reservations is not None and 'quantity' in validated_data:
+            if not reservations.adjust(instance.cart_id, instance.product_id,
+                                       instance.quantity, validated_data['quantity']):
+                raise serializers.ValidationError(
+                    {'quantity': 'Not enough inventory for this product.'})
+        return super().update(instance, validated_data)
+
     class Meta:
         model = CartItem
         fields = ['quantity']
@@ -125,7 +314,7 @@ class CustomerSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Customer
-        fields = ['id', 'user_id', 'phone', 'birth_date', 'membership']
+        fields = ['id', 'user_id', 'first_name', 'last_name', 'phone', 'birth_date', 'membership']
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -141,7 +330,33 @@ class OrderSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Order
-        fields = ['id', 'customer', 'placed_at', 'payment_status', 'items']
+        fields = ['id', 'customer', 'placed_at', 'payment_status', 'total', 'item_count', 'items']
+
+
+class ArchivedOrderItemSerializer(OrderItemSerializer):
+    class Meta(OrderItemSerializer.Meta):
+        model = ArchivedOrderItem
+
+
+class ArchivedOrderSerializer(OrderSerializer):
+    items = ArchivedOrderItemSerializer(many=True)
+
+    class Meta(OrderSerializer.Meta):
+        model = ArchivedOrder
+
+
+class SalesReportQuerySerializer(serializers.Serializer):
+    since = serializers.DateField(required=False)
+    until = serializers.DateField(required=False)
+    group_by = serializers.ChoiceField(choices=['day', 'product', 'collection'], default='day')
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=100)
+
+    def validate(self, data):
+        data.setdefault('until', timezone.localdate())
+        data.setdefault('since', data['until'] - timedelta(days=29))
+        if data['since'] > data['until']:
+            raise serializers.ValidationError({'since': 'Must not be after until.'})
+        return data
 
 
 class UpdateOrderSerializer(serializers.ModelSerializer):
@@ -154,36 +369,208 @@ class CreateOrderSerializer(serializers.Serializer):
     cart_id = serializers.UUIDField()
 
     def validate_cart_id(self, cart_id):
-        if not Cart.objects.filter(pk=cart_id).exists():
+        store = get_cart_store()
+        if store is not None:
+            store.flush(cart_id)
+
+        has_items = Cart.objects \
+            .filter(pk=cart_id) \
+            .annotate(has_items=Exists(CartItem.objects.filter(cart_id=OuterRef('pk')))) \
+            .values_list('has_items', flat=True) \
+            .first()
+        if has_items is None:
             raise serializers.ValidationError(
                 'No cart with the given ID was found.')
-        if CartItem.objects.filter(cart_id=cart_id).count() == 0:
+        if not has_items:
             raise serializers.ValidationError('The cart is empty.')
         return cart_id
 
     def save(self, **kwargs):
+        # Runs the same number of queries whatever the size of the cart:
+        # lock the lines, lock their products in primary key order, then one
+        # statement each to create the order, decrement the inventory,
+        # create the order items and delete the cart.
         with transaction.atomic():
             cart_id = self.validated_data['cart_id']
 
-            customer = Customer.objects.get(
-                user_id=self.context['user_id'])
-            order = Order.objects.create(customer=customer)
-
-            cart_items = CartItem.objects \
-                .select_related('product') \
-                .filter(cart_id=cart_id)
-            order_items = [
+            customer_id = self.context['customer_id']
+
+            quantities = dict(CartItem.objects
+                              .select_for_update()
+                              .filter(cart_id=cart_id)
+                              .values_list('product_id', 'quantity'))
+            if not quantities:
+                raise serializers.ValidationError({'cart_id': 'The cart is empty.'})
+
+            products = Product.objects \
+                .select_for_update() \
+                .filter(pk__in=quantities) \
+                .order_by('pk') \
+                .values_list('pk', 'unit_price', 'inventory')
+            unit_prices = {}
+            oversold = []
+            for product_id, unit_price, inventory in products:
+                unit_prices[product_id] = unit_price
+                if quantities[product_id] > inventory:
+                    oversold.append(product_id)
+            if oversold:
+                raise serializers.ValidationError(
+                    {'cart_id': f'Not enough inventory for products {oversold}.'})
+
+            order = Order.objects.create(
+                customer_id=customer_id,
+                total=sum(unit_prices[product_id] * quantity for product_id, quantity in quantities.items()),
+                item_count=sum(quantities.values()))
+
+            Product.objects \
+                .filter(pk__in=quantities) \
+                .update(
+                    inventory=F('inventory') - Case(
+                        *[When(pk=product_id, then=Value(quantity))
+                          for product_id, quantity in quantities.items()],
+                        output_field=IntegerField()),
+                    last_update=timezone.now())
+            for product_id in quantities:
+                invalidate('products', product_id)
+            invalidate('products')
+
+            OrderItem.objects.bulk_create([
                 OrderItem(
                     order=order,
-                    product=item.product,
-                    unit_price=item.product.unit_price,
-                    quantity=item.quantity
-                ) for item in cart_items
-            ]
-            OrderItem.objects.bulk_create(order_items)
+                    product_id=product_id,
+                    unit_price=unit_prices[product_id],
+                    quantity=quantity
+                ) for product_id, quantity in quantities.items()
+            ])
+
+            # The CartItem receivers forget the summary and release the
+            # holds; both are done below instead.
+            raw_delete(CartItem.objects.filter(cart_id=cart_id))
+            raw_delete(Cart.objects.filter(pk=cart_id))
+            forget_cart_summaries([cart_id])
+            store = get_cart_store()
+            if store is not None:
+                transaction.on_commit(lambda: store.delete(cart_id))
+            # Drop the holds while the product rows are still locked, so a
+            # reconcile cannot rebuild a counter from the new inventory
+            # while these holds are still counted against it.
+            reservations = get_reservation_store()
+            if reservations is not None:
+                reservations.commit(cart_id, quantities)
+
+            # Receivers run from the relay after commit, not in this
+            # transaction.
+            publish('order_created', {'order_id': order.pk})
 
-            Cart.objects.filter(pk=cart_id).delete()
+            return order
 
-            order_created.send_robust(self.__class__, order=order)
 
-            return order
+class CompiledSerializer:
+    """
+    Read-only fast path for a ModelSerializer's list output.
+
+    Rows are read with `values_list()` and turned into dicts through
+    accessors built once per serializer, so no model instances are created
+    and no per-field dispatch happens. The output matches what
+    `serializer_class` would render for the same rows.
+    """
+    serializer_class = None
+    # Maps each field of serializer_class to the column it is read from.
+    # Fields left out here must be supplied by `get_related_accessors`.
+    columns = {}
+
+    def __init__(self, fields=None, context=None):
+        self.context = context or {}
+        self.field_names = [
+            name for name in self.serializer_class.Meta.fields
+            if fields is None or name in fields
+        ]
+        self.column_names = list(dict.fromkeys(
+            ['id'] + [self.columns[name] for name in self.field_names if name in self.columns]))
+
+        converters = self.get_converters()
+        self.accessors = {}
+        for name in self.field_names:
+            if name not in self.columns:
+                continue
+            get = itemgetter(self.column_names.index(self.columns[name]))
+            convert = converters.get(name)
+            if convert is not None:
+                get = lambda row, get=get, convert=convert: convert(get(row))
+            self.accessors[name] = get
+
+    def get_converters(self):
+        return {}
+
+    def get_related_accessors(self, rows):
+        return {}
+
+    def get_queryset(self, queryset, extra_columns=()):
+        columns = dict.fromkeys(self.column_names + list(extra_columns))
+        return queryset.prefetch_related(None).values_list(*columns, named=True)
+
+    def to_representation(self, rows):
+        rows = list(rows)
+        accessors = {**self.accessors, **self.get_related_accessors(rows)}
+        accessors = [(name, accessors[name]) for name in self.field_names]
+        return [{name: get(row) for name, get in accessors} for row in rows]
+
+
+class CompiledCollectionSerializer(CompiledSerializer):
+    serializer_class = CollectionSerializer
+    columns = {
+        'id': 'id',
+        'title': 'title',
+        'products_count': 'products_count',
+    }
+
+
+class CompiledSimpleProductSerializer(CompiledSerializer):
+    serializer_class = SimpleProductSerializer
+    columns = {
+        'id': 'id',
+        'title': 'title',
+        'unit_price': 'unit_price',
+    }
+
+    def get_converters(self):
+        return {'unit_price': SimpleProductSerializer().fields['unit_price'].to_representation}
+
+
+class CompiledProductSerializer(CompiledSerializer):
+    serializer_class = ProductSerializer
+    columns = {
+        'id': 'id',
+        'title': 'title',
+        'description': 'description',
+        'slug': 'slug',
+        'inventory': 'inventory',
+        'unit_price': 'unit_price',
+        'price_with_tax': 'unit_price',
+        'collection': 'collection_id',
+    }
+
+    def get_converters(self):
+        return {
+            'unit_price': ProductSerializer().fields['unit_price'].to_representation,
+            'price_with_tax': lambda unit_price: unit_price * TAX_RATE,
+        }
+
+    def get_related_accessors(self, rows):
+        if 'images' not in self.field_names:
+            return {}
+
+        storage = ProductImage._meta.get_field('image').storage
+        request = self.context.get('request')
+        images = {row.id: [] for row in rows}
+        queryset = ProductImage.objects \
+            .filter(product_id__in=images) \
+            .order_by('id') \
+            .values_list('product_id', 'id', 'image')
+        for product_id, image_id, name in queryset:
+            url = storage.url(name) if name else None
+            if url and request is not None:
+                url = request.build_absolute_uri(url)
+            images[product_id].append({'id': image_id, 'image': url})
+
+        return {'images': lambda row: images[row.id]}
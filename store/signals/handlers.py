@@ -1,9 +1,144 @@
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
-from store.models import Customer
+from store.analytics import record_order
+from store.cache import forget_cart_summaries, forget_product, invalidate
+from store.counters import register_counter
+from store.customers import customers
+from store.models import CartItem, Collection, Customer, Order, OrderItem, Product, ProductImage, Review
+from store.outbox import first_delivery
+from store.reservations import get_reservation_store
+from store.search import get_search_backend
+from store.signals import order_created
+from store.tasks import reconcile_reservations
+
+register_counter(Collection, 'products_count', Product, 'collection')
+register_counter(Customer, 'orders_count', Order, 'customer')
+register_counter(Product, 'reviews_count', Review, 'product')
+
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_customer_for_new_user(sender, **kwargs):
+  user = kwargs['instance']
   if kwargs['created']:
-    Customer.objects.create(user=kwargs['instance'])
\ No newline at end of file
+    Customer.objects.create(user=user, **Customer.name_fields(user))
+    customers.forget(user.pk)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def copy_user_names_to_customer(sender, **kwargs):
+  update_fields = kwargs['update_fields']
+  if kwargs['created'] or (update_fields is not None and not {'first_name', 'last_name'} & update_fields):
+    return
+  user = kwargs['instance']
+  Customer.objects.filter(user_id=user.pk).update(**Customer.name_fields(user))
+
+
+@receiver(post_delete, sender=Customer)
+def forget_deleted_customer(sender, **kwargs):
+  customers.forget(kwargs['instance'].user_id)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, **kwargs):
+  get_search_backend().index(kwargs['instance'])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, **kwargs):
+  get_search_backend().remove(kwargs['instance'].pk)
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_state(sender, **kwargs):
+  product = kwargs['instance']
+  if product.pk is not None:
+    product._previous_collection_id, product._previous_unit_price, product._previous_inventory = Product.objects \
+      .filter(pk=product.pk) \
+      .values_list('collection_id', 'unit_price', 'inventory') \
+      .first() or (None, None, None)
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_cache(sender, **kwargs):
+  product = kwargs['instance']
+  forget_product(product.pk)
+  invalidate('products')
+  invalidate('products', product.pk)
+  # Collections render a products_count, so both the old and the new
+  # collection of a moved product are affected.
+  invalidate('collections')
+  for collection_id in {product.collection_id, getattr(product, '_previous_collection_id', None)}:
+    if collection_id is not None:
+      invalidate('collections', collection_id)
+
+
+@receiver([post_save, post_delete], sender=ProductImage)
+def invalidate_product_image_cache(sender, **kwargs):
+  product_id = kwargs['instance'].product_id
+  # Images are part of the product representation; bumping its version also
+  # moves the ETag and Last-Modified validators.
+  invalidate('products')
+  invalidate('products', product_id)
+
+
+@receiver([post_save, post_delete], sender=Collection)
+def invalidate_collection_cache(sender, **kwargs):
+  invalidate('collections')
+  invalidate('collections', kwargs['instance'].pk)
+
+
+@receiver([post_save, post_delete], sender=Order)
+def invalidate_customer_history(sender, **kwargs):
+  invalidate('history', kwargs['instance'].customer_id)
+
+
+@receiver([post_save, post_delete], sender=OrderItem)
+def invalidate_customer_history_for_item(sender, **kwargs):
+  customer_id = Order.objects \
+    .filter(pk=kwargs['instance'].order_id) \
+    .values_list('customer_id', flat=True) \
+    .first()
+  if customer_id is not None:
+    invalidate('history', customer_id)
+
+
+@receiver(post_save, sender=Product)
+def forget_cart_summaries_for_price_change(sender, **kwargs):
+  product = kwargs['instance']
+  previous_unit_price = getattr(product, '_previous_unit_price', None)
+  if previous_unit_price is not None and previous_unit_price != product.unit_price:
+    invalidate('prices')
+
+
+@receiver([post_save, post_delete], sender=CartItem)
+def forget_cart_summary(sender, **kwargs):
+  forget_cart_summaries([kwargs['instance'].cart_id])
+
+
+@receiver(post_save, sender=Product)
+def reconcile_reservations_for_restock(sender, **kwargs):
+  product = kwargs['instance']
+  previous_inventory = getattr(product, '_previous_inventory', None)
+  if get_reservation_store() is not None and previous_inventory not in (None, product.inventory):
+    transaction.on_commit(lambda: reconcile_reservations.delay([product.pk]))
+
+
+@receiver(post_delete, sender=CartItem)
+def release_reservation(sender, **kwargs):
+  reservations = get_reservation_store()
+  if reservations is not None:
+    item = kwargs['instance']
+    reservations.release(item.cart_id, item.product_id)
+
+
+@receiver(order_created)
+def update_sales_rollups(sender, **kwargs):
+  # The outbox delivers at least once, so redelivered events are skipped.
+  # The marker commits with the update, so a failed update is retried.
+  event_id = kwargs.get('event_id')
+  with transaction.atomic():
+    if event_id is not None and not first_delivery(event_id, 'sales_rollups'):
+      return
+    record_order(kwargs['order'])
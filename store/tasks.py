@@ -0,0 +1,46 @@
+from celery import shared_task
+from .archive import archive_orders
+from .carts import get_cart_store, reap_carts
+from . import outbox
+from .reservations import get_reservation_store
+
+
+@shared_task
+def flush_carts(batch_size=500):
+    store = get_cart_store()
+    if store is None:
+        return 0
+
+    flushed = 0
+    while True:
+        cart_ids = store.pop_dirty(batch_size)
+        for cart_id in cart_ids:
+            if store.flush(cart_id):
+                flushed += 1
+        if len(cart_ids) < batch_size:
+            return flushed
+
+
+@shared_task
+def reap_abandoned_carts(chunk_size=1000):
+    return reap_carts(chunk_size=chunk_size)
+
+
+@shared_task
+def reconcile_reservations(product_ids=None):
+    store = get_reservation_store()
+    if store is None:
+        return 0
+    return store.reconcile(product_ids)
+
+
+@shared_task
+def relay_outbox(batch_size=100):
+    delivered = outbox.relay(batch_size)
+    outbox.prune()
+    return delivered
+
+
+@shared_task
+def archive_old_orders(chunk_size=1000):
+    return archive_orders(chunk_size=chunk_size)
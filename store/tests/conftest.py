@@ -1,7 +1,11 @@
+from django.core.cache import cache
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 import pytest
 
+from store.customers import customers
+from storefront.celery import celery
+
 
 @pytest.fixture
 def api_client():
@@ -12,4 +16,19 @@ def api_client():
 def authenticated_client(api_client: APIClient):
     def perform_authentication(**kwargs): # Here you can pass user attributes like is_staff, is_active, etc.
         return api_client.force_authenticate(user=get_user_model()(**kwargs))
-    return perform_authentication
\ No newline at end of file
+    return perform_authentication
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # Cached responses outlive the per-test database rollback.
+    cache.clear()
+    customers.clear()
+
+
+@pytest.fixture(autouse=True)
+def eager_celery():
+    # Tasks queued from on_commit callbacks run inline instead of needing a
+    # broker.
+    celery.conf.task_always_eager = True
+    yield
+    celery.conf.task_always_eager = False
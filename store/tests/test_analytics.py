@@ -0,0 +1,158 @@
+from datetime import timedelta
+from decimal import Decimal
+from uuid import uuid4
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework import status
+import pytest
+
+from store.analytics import record_order
+from store.models import Cart, CartItem, Collection, CollectionSalesDay, Order, OrderItem, Product, ProductSalesDay, SalesDay
+from store.signals import handlers, order_created
+
+
+@pytest.fixture
+def collection():
+    return baker.make(Collection)
+
+
+@pytest.fixture
+def checkout(api_client, django_capture_on_commit_callbacks):
+    def perform_checkout(lines):
+        cart = baker.make(Cart)
+        for product, quantity in lines:
+            baker.make(CartItem, cart=cart, product=product, quantity=quantity)
+        api_client.force_authenticate(user=baker.make(get_user_model()))
+        with django_capture_on_commit_callbacks(execute=True):
+            return api_client.post(reverse('orders-list'), {'cart_id': cart.id}, format='json')
+    return perform_checkout
+
+
+@pytest.fixture
+def place_order():
+    def perform_place(lines, days_ago=0):
+        order = baker.make(Order, customer=baker.make(get_user_model()).customer)
+        Order.objects.filter(pk=order.pk).update(placed_at=timezone.now() - timedelta(days=days_ago))
+        for product, quantity in lines:
+            baker.make(OrderItem, order=order, product=product, quantity=quantity, unit_price=product.unit_price)
+        return Order.objects.get(pk=order.pk)
+    return perform_place
+
+
+def rollups():
+    return {
+        'days': list(SalesDay.objects.values_list('date', 'revenue', 'units', 'orders').order_by('date')),
+        'products': sorted(ProductSalesDay.objects.values_list('date', 'product_id', 'revenue', 'units', 'orders')),
+        'collections': sorted(CollectionSalesDay.objects.values_list('date', 'collection_id', 'revenue', 'units', 'orders')),
+    }
+
+
+@pytest.mark.django_db
+class TestSalesRollups:
+
+    def test_if_checkout_updates_the_rollups(self, checkout, collection):
+        first = baker.make(Product, collection=collection, inventory=10, unit_price=Decimal('2.50'))
+        second = baker.make(Product, collection=collection, inventory=10, unit_price=Decimal('10'))
+
+        checkout([(first, 2), (second, 1)])
+        checkout([(first, 1)])
+
+        today = timezone.localdate()
+        assert rollups() == {
+            'days': [(today, Decimal('17.50'), 4, 2)],
+            'products': sorted([
+                (today, first.id, Decimal('7.50'), 3, 2),
+                (today, second.id, Decimal('10.00'), 1, 1),
+            ]),
+            'collections': [(today, collection.id, Decimal('17.50'), 4, 2)],
+        }
+
+
+    def test_if_redelivered_event_is_counted_once(self, place_order, collection):
+        order = place_order([(baker.make(Product, collection=collection, unit_price=Decimal('5')), 1)])
+        event_id = uuid4()
+
+        order_created.send(Order, order=order, event_id=event_id)
+        order_created.send(Order, order=order, event_id=event_id)
+
+        assert SalesDay.objects.values_list('revenue', 'orders').get() == (Decimal('5.00'), 1)
+
+
+    def test_if_failed_update_is_rolled_back_and_redelivered(self, place_order, collection, monkeypatch):
+        order = place_order([(baker.make(Product, collection=collection, unit_price=Decimal('5')), 1)])
+        event_id = uuid4()
+
+        def record_and_fail(order):
+            record_order(order)
+            raise DatabaseError('Lock wait timeout exceeded.')
+
+        monkeypatch.setattr(handlers, 'record_order', record_and_fail)
+        with pytest.raises(DatabaseError):
+            order_created.send(Order, order=order, event_id=event_id)
+        monkeypatch.undo()
+        order_created.send(Order, order=order, event_id=event_id)
+
+        assert SalesDay.objects.values_list('revenue', 'orders').get() == (Decimal('5.00'), 1)
+
+
+    def test_if_rebuild_matches_the_orders_and_the_archive(self, place_order, collection):
+        products = baker.make(Product, collection=collection, unit_price=Decimal('3'), _quantity=2)
+        for order in [place_order([(products[0], 1), (products[1], 2)], days_ago=400),
+                      place_order([(products[0], 1)], days_ago=1),
+                      place_order([(products[1], 3)])]:
+            order_created.send(Order, order=order, event_id=uuid4())
+        call_command('archive_orders')
+        expected = rollups()
+        SalesDay.objects.update(revenue=0, units=0, orders=0)
+        ProductSalesDay.objects.all().delete()
+
+        call_command('rebuild_sales_rollups')
+
+        assert len(expected['days']) == 3
+        assert rollups() == expected
+
+
+@pytest.mark.django_db
+class TestSalesReport:
+
+    def test_if_user_is_not_admin_returns_403(self, api_client, authenticated_client):
+        authenticated_client()
+
+        response = api_client.get(reverse('analytics-list'))
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+    def test_if_since_is_after_until_returns_400(self, api_client, authenticated_client):
+        authenticated_client(is_staff=True)
+
+        response = api_client.get(reverse('analytics-list'), {'since': '2024-02-01', 'until': '2024-01-01'})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+    def test_if_report_is_read_from_the_rollups(self, api_client, authenticated_client, collection, django_assert_num_queries):
+        today = timezone.localdate()
+        products = baker.make(Product, collection=collection, _quantity=2)
+        baker.make(SalesDay, date=today - timedelta(days=40), revenue=100, units=1, orders=1)
+        baker.make(SalesDay, date=today, revenue=30, units=3, orders=2)
+        baker.make(ProductSalesDay, date=today, product=products[0], revenue=10, units=1, orders=1)
+        baker.make(ProductSalesDay, date=today - timedelta(days=1), product=products[1], revenue=15, units=1, orders=1)
+        baker.make(ProductSalesDay, date=today, product=products[1], revenue=5, units=1, orders=1)
+        authenticated_client(is_staff=True)
+
+        response = api_client.get(reverse('analytics-list'))
+        with django_assert_num_queries(2):
+            by_product = api_client.get(reverse('analytics-list'), {'group_by': 'product', 'limit': 1})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['totals'] == {'revenue': Decimal('30.00'), 'units': 3, 'orders': 2}
+        assert [row['date'] for row in response.data['results']] == [today]
+        assert by_product.data['results'] == [{
+            'id': products[1].id, 'title': products[1].title,
+            'revenue': Decimal('20.00'), 'units': 2, 'orders': 2,
+        }]
@@ -0,0 +1,187 @@
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+from django.db import connection
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework import status
+from rest_framework.test import APIClient
+import pytest
+
+from store.models import Cart, CartItem, Product
+
+
+@pytest.fixture
+def add_item(api_client):
+    def perform_add(cart_id, product_id, quantity=1, client=None):
+        return (client or api_client).post(
+            reverse('cart-items-list', kwargs={'cart_pk': cart_id}),
+            {'product_id': product_id, 'quantity': quantity},
+            format='json')
+    return perform_add
+
+
+@pytest.mark.django_db
+class TestAddCartItem:
+
+    def test_if_product_does_not_exist_returns_400(self, add_item):
+        cart = baker.make(Cart)
+
+        response = add_item(cart.id, 0)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['product_id'] is not None
+
+
+    def test_if_cart_does_not_exist_returns_404(self, add_item):
+        product = baker.make(Product)
+
+        response = add_item(uuid4(), product.id)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert not CartItem.objects.exists()
+
+
+    def test_if_missing_product_is_not_cached(self, add_item, django_assert_num_queries):
+        cart = baker.make(Cart)
+        add_item(cart.id, 0)
+
+        with django_assert_num_queries(1):
+            response = add_item(cart.id, 0)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+    def test_if_new_line_is_created(self, add_item):
+        cart = baker.make(Cart)
+        product = baker.make(Product)
+
+        response = add_item(cart.id, product.id, 2)
+
+        assert response.status_code == status.HTTP_201_CREATED
+        item = CartItem.objects.get(cart=cart)
+        assert response.data == {'id': item.id, 'product_id': product.id, 'quantity': 2}
+
+
+    def test_if_existing_line_is_incremented_with_two_queries(self, add_item, django_assert_num_queries):
+        cart = baker.make(Cart)
+        product = baker.make(Product)
+        add_item(cart.id, product.id, 2)
+
+        # The product check is cached: one UPDATE and one SELECT for the response.
+        with django_assert_num_queries(2):
+            response = add_item(cart.id, product.id, 3)
+
+        assert response.data['quantity'] == 5
+        assert CartItem.objects.get(cart=cart).quantity == 5
+
+
+@pytest.fixture
+def bulk_add_items(api_client):
+    def perform_bulk_add(cart_id, items):
+        return api_client.post(
+            reverse('cart-items-bulk', kwargs={'cart_pk': cart_id}),
+            items,
+            format='json')
+    return perform_bulk_add
+
+
+@pytest.mark.django_db
+class TestBulkAddCartItems:
+
+    def test_if_cart_does_not_exist_returns_404(self, bulk_add_items):
+        product = baker.make(Product)
+
+        response = bulk_add_items(uuid4(), [{'product_id': product.id, 'quantity': 1}])
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+    def test_if_list_is_empty_returns_400(self, bulk_add_items):
+        cart = baker.make(Cart)
+
+        response = bulk_add_items(cart.id, [])
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+    def test_if_any_product_does_not_exist_returns_400_and_adds_nothing(self, bulk_add_items):
+        cart = baker.make(Cart)
+        product = baker.make(Product)
+
+        response = bulk_add_items(cart.id, [
+            {'product_id': product.id, 'quantity': 1},
+            {'product_id': 0, 'quantity': 1},
+        ])
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['product_id'] is not None
+        assert not CartItem.objects.filter(cart=cart).exists()
+
+
+    def test_if_merged_quantity_is_too_large_returns_400_and_adds_nothing(self, bulk_add_items):
+        cart = baker.make(Cart)
+        existing, new = baker.make(Product, _quantity=2)
+        baker.make(CartItem, cart=cart, product=existing, quantity=30000)
+
+        merged = bulk_add_items(cart.id, [
+            {'product_id': new.id, 'quantity': 20000},
+            {'product_id': new.id, 'quantity': 20000},
+        ])
+        incremented = bulk_add_items(cart.id, [{'product_id': existing.id, 'quantity': 5000}])
+
+        assert merged.status_code == status.HTTP_400_BAD_REQUEST
+        assert incremented.status_code == status.HTTP_400_BAD_REQUEST
+        assert incremented.data['quantity'] is not None
+        assert dict(CartItem.objects.filter(cart=cart).values_list('product_id', 'quantity')) == {existing.id: 30000}
+
+
+    def test_if_lines_are_created_and_incremented(self, bulk_add_items):
+        cart = baker.make(Cart)
+        existing, new = baker.make(Product, _quantity=2)
+        baker.make(CartItem, cart=cart, product=existing, quantity=2)
+
+        response = bulk_add_items(cart.id, [
+            {'product_id': existing.id, 'quantity': 3},
+            {'product_id': new.id, 'quantity': 1},
+            {'product_id': new.id, 'quantity': 4},
+        ])
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['id'] == str(cart.id)
+        quantities = {item['product']['id']: item['quantity'] for item in response.data['items']}
+        assert quantities == {existing.id: 5, new.id: 5}
+        assert dict(CartItem.objects.filter(cart=cart).values_list('product_id', 'quantity')) == quantities
+
+
+    def test_query_count_does_not_grow_with_lines(self, bulk_add_items, django_assert_max_num_queries):
+        cart = baker.make(Cart)
+        products = baker.make(Product, _quantity=20)
+        baker.make(CartItem, cart=cart, product=products[0], quantity=1)
+
+        with django_assert_max_num_queries(12):
+            response = bulk_add_items(cart.id, [
+                {'product_id': product.id, 'quantity': 1} for product in products
+            ])
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['items']) == 20
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.skipif(connection.vendor == 'sqlite', reason='SQLite table locks make concurrent writers fail.')
+def test_concurrent_adds_to_the_same_line(add_item):
+    cart = baker.make(Cart)
+    product = baker.make(Product)
+    requests = 20
+
+    def perform_add(_):
+        try:
+            return add_item(cart.id, product.id, client=APIClient()).status_code
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        statuses = list(executor.map(perform_add, range(requests)))
+
+    assert statuses == [status.HTTP_201_CREATED] * requests
+    assert CartItem.objects.get(cart=cart, product=product).quantity == requests
@@ -0,0 +1,167 @@
+from decimal import Decimal
+from uuid import UUID
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework import status
+import pytest
+
+from store.carts import get_cart_store, load_cart_store
+from store.models import Cart, CartItem, Order, Product
+from store.tasks import flush_carts
+
+
+@pytest.fixture(autouse=True)
+def cart_store(settings):
+    settings.STORE_CART_BACKEND = 'store.carts.InMemoryCartStore'
+    load_cart_store.cache_clear()
+    yield get_cart_store()
+    load_cart_store.cache_clear()
+
+
+@pytest.fixture
+def create_cart(api_client):
+    def perform_create():
+        return api_client.post(reverse('cart-list')).data['id']
+    return perform_create
+
+
+@pytest.fixture
+def add_item(api_client):
+    def perform_add(cart_id, product_id, quantity=1):
+        return api_client.post(
+            reverse('cart-items-list', kwargs={'cart_pk': cart_id}),
+            {'product_id': product_id, 'quantity': quantity},
+            format='json')
+    return perform_add
+
+
+@pytest.mark.django_db
+class TestStoredCarts:
+
+    def test_if_cart_is_created_outside_the_database(self, api_client):
+        response = api_client.post(reverse('cart-list'))
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['items'] == []
+        assert response.data['total_price'] == 0
+        assert not Cart.objects.exists()
+
+
+    def test_if_cart_has_the_database_shape(self, api_client, create_cart, add_item):
+        product = baker.make(Product, unit_price=Decimal('2.50'))
+        cart_id = create_cart()
+
+        add_item(cart_id, product.id, 2)
+        add_item(cart_id, product.id, 1)
+        response = api_client.get(reverse('cart-detail', kwargs={'pk': cart_id}))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {
+            'id': cart_id,
+            'items': [{
+                'id': product.id,
+                'product': {'id': product.id, 'title': product.title, 'unit_price': Decimal('2.50')},
+                'quantity': 3,
+                'total_price': Decimal('7.50'),
+            }],
+            'total_price': Decimal('7.50'),
+        }
+        assert not CartItem.objects.exists()
+
+
+    def test_if_product_does_not_exist_returns_400(self, create_cart, add_item):
+        response = add_item(create_cart(), 0)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['product_id'] is not None
+
+
+    def test_if_summary_is_read_from_the_store(self, api_client, create_cart, add_item):
+        product = baker.make(Product, unit_price=Decimal('2.50'))
+        cart_id = create_cart()
+        add_item(cart_id, product.id, 3)
+
+        response = api_client.get(reverse('cart-summary', kwargs={'pk': cart_id}))
+
+        assert response.data == {'items_count': 3, 'total_price': Decimal('7.50')}
+
+
+    def test_if_bulk_add_updates_the_stored_cart(self, api_client, create_cart, add_item):
+        first, second = baker.make(Product, _quantity=2)
+        cart_id = create_cart()
+        add_item(cart_id, first.id, 1)
+
+        response = api_client.post(
+            reverse('cart-items-bulk', kwargs={'cart_pk': cart_id}),
+            [{'product_id': first.id, 'quantity': 2}, {'product_id': second.id, 'quantity': 1}],
+            format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert {item['id']: item['quantity'] for item in response.data['items']} == {first.id: 3, second.id: 1}
+        assert not CartItem.objects.exists()
+
+
+    def test_if_cart_does_not_exist_returns_404(self, api_client, add_item):
+        product = baker.make(Product)
+
+        assert add_item('6f1c2b52-0f4a-4c1e-9d55-0d8d8a7a1e11', product.id).status_code == status.HTTP_404_NOT_FOUND
+        assert api_client.get(reverse('cart-detail', kwargs={'pk': 'invalid'})).status_code == status.HTTP_404_NOT_FOUND
+
+
+    def test_if_item_can_be_updated_and_deleted(self, api_client, create_cart, add_item):
+        product = baker.make(Product)
+        cart_id = create_cart()
+        add_item(cart_id, product.id)
+        url = reverse('cart-items-detail', kwargs={'cart_pk': cart_id, 'pk': product.id})
+
+        update = api_client.patch(url, {'quantity': 5}, format='json')
+        item = api_client.get(url)
+        delete = api_client.delete(url)
+        items = api_client.get(reverse('cart-items-list', kwargs={'cart_pk': cart_id}))
+
+        assert update.data == {'quantity': 5}
+        assert item.data['quantity'] == 5
+        assert delete.status_code == status.HTTP_204_NO_CONTENT
+        assert items.data == []
+
+
+    def test_if_deleted_cart_returns_404(self, api_client, create_cart):
+        cart_id = create_cart()
+
+        response = api_client.delete(reverse('cart-detail', kwargs={'pk': cart_id}))
+
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert api_client.get(reverse('cart-detail', kwargs={'pk': cart_id})).status_code == status.HTTP_404_NOT_FOUND
+
+
+    def test_if_flush_task_writes_dirty_carts(self, cart_store, create_cart, add_item):
+        first, second = baker.make(Product, _quantity=2)
+        cart_id = create_cart()
+        add_item(cart_id, first.id, 2)
+        add_item(cart_id, second.id, 1)
+
+        assert flush_carts() == 1
+        cart_store.remove_item(UUID(cart_id), second.id)
+        assert flush_carts() == 1
+
+        items = CartItem.objects.filter(cart_id=cart_id).values_list('product_id', 'quantity')
+        assert list(items) == [(first.id, 2)]
+        assert flush_carts() == 0
+
+
+    def test_if_checkout_reads_the_stored_cart(self, api_client, create_cart, add_item, django_capture_on_commit_callbacks):
+        user = baker.make(get_user_model())
+        product = baker.make(Product, unit_price=Decimal('3.00'), inventory=10)
+        cart_id = create_cart()
+        add_item(cart_id, product.id, 2)
+
+        api_client.force_authenticate(user=user)
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(reverse('orders-list'), {'cart_id': cart_id}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        order = Order.objects.get(pk=response.data['id'])
+        assert list(order.items.values_list('product_id', 'quantity')) == [(product.id, 2)]
+        assert not Cart.objects.exists()
+        assert api_client.get(reverse('cart-detail', kwargs={'pk': cart_id})).status_code == status.HTTP_404_NOT_FOUND
@@ -0,0 +1,148 @@
+from datetime import timedelta
+from decimal import Decimal
+from uuid import uuid4
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework import status
+import pytest
+
+from store.carts import reap_carts
+from store.models import Cart, CartItem, Product
+from store.tasks import reap_abandoned_carts
+
+
+@pytest.fixture
+def cart_with_items():
+    cart = baker.make(Cart)
+    first = baker.make(Product, unit_price=Decimal('2.50'))
+    second = baker.make(Product, unit_price=Decimal('10'))
+    baker.make(CartItem, cart=cart, product=first, quantity=3)
+    baker.make(CartItem, cart=cart, product=second, quantity=1)
+    return cart
+
+
+@pytest.fixture
+def get_summary(api_client):
+    def perform_get(cart_id):
+        return api_client.get(reverse('cart-summary', kwargs={'pk': cart_id}))
+    return perform_get
+
+
+@pytest.mark.django_db
+class TestRetrieveCart:
+
+    def test_if_totals_are_computed_by_the_database(self, api_client, cart_with_items, django_assert_num_queries):
+        # One query for the cart and its total, one for the lines.
+        with django_assert_num_queries(2):
+            response = api_client.get(reverse('cart-detail', kwargs={'pk': cart_with_items.id}))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['total_price'] == Decimal('17.50')
+        assert sorted(item['total_price'] for item in response.data['items']) == [Decimal('7.50'), Decimal('10.00')]
+
+
+    def test_if_empty_cart_total_is_0(self, api_client):
+        cart = baker.make(Cart)
+
+        response = api_client.get(reverse('cart-detail', kwargs={'pk': cart.id}))
+
+        assert response.data['items'] == []
+        assert response.data['total_price'] == 0
+
+
+@pytest.mark.django_db
+class TestCartSummary:
+
+    def test_if_cart_does_not_exist_returns_404(self, get_summary):
+        response = get_summary(uuid4())
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+    def test_if_summary_is_returned_and_cached(self, get_summary, cart_with_items, django_assert_num_queries):
+        response = get_summary(cart_with_items.id)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {'items_count': 4, 'total_price': Decimal('17.50')}
+        with django_assert_num_queries(0):
+            assert get_summary(cart_with_items.id).data == response.data
+
+
+    def test_if_adding_an_item_refreshes_the_summary(self, api_client, get_summary, cart_with_items):
+        product = CartItem.objects.filter(cart=cart_with_items).first().product
+        get_summary(cart_with_items.id)
+
+        api_client.post(
+            reverse('cart-items-list', kwargs={'cart_pk': cart_with_items.id}),
+            {'product_id': product.id, 'quantity': 2},
+            format='json')
+
+        assert get_summary(cart_with_items.id).data['items_count'] == 6
+
+
+    def test_if_removing_an_item_refreshes_the_summary(self, get_summary, cart_with_items):
+        get_summary(cart_with_items.id)
+
+        CartItem.objects.filter(cart=cart_with_items, quantity=1).get().delete()
+
+        assert get_summary(cart_with_items.id).data == {'items_count': 3, 'total_price': Decimal('7.50')}
+
+
+    def test_if_price_change_refreshes_the_summary(self, get_summary, cart_with_items):
+        get_summary(cart_with_items.id)
+        product = Product.objects.get(cartitem__cart=cart_with_items, cartitem__quantity=1)
+
+        product.unit_price = Decimal('20')
+        product.save()
+
+        assert get_summary(cart_with_items.id).data['total_price'] == Decimal('27.50')
+
+
+@pytest.fixture
+def make_cart():
+    def perform_make(age, items=1):
+        cart = baker.make(Cart)
+        Cart.objects.filter(pk=cart.pk).update(created_at=timezone.now() - age)
+        baker.make(CartItem, cart=cart, _quantity=items)
+        return cart
+    return perform_make
+
+
+@pytest.mark.django_db
+class TestReapCarts:
+
+    def test_if_only_carts_older_than_ttl_are_deleted(self, make_cart, settings):
+        settings.STORE_CART_TTL = timedelta(days=30)
+        old = make_cart(timedelta(days=31), items=2)
+        recent = make_cart(timedelta(days=1))
+
+        stats = reap_abandoned_carts()
+
+        assert stats['carts'] == 1
+        assert stats['items'] == 2
+        assert not Cart.objects.filter(pk=old.pk).exists()
+        assert not CartItem.objects.filter(cart_id=old.pk).exists()
+        assert CartItem.objects.filter(cart=recent).count() == 1
+
+
+    def test_if_carts_are_deleted_in_chunks(self, make_cart):
+        for _ in range(5):
+            make_cart(timedelta(days=2))
+
+        stats = reap_carts(timedelta(days=1), chunk_size=2)
+
+        assert stats['carts'] == 5
+        assert stats['chunks'] == 3
+        assert not Cart.objects.exists()
+
+
+    def test_if_command_accepts_days(self, make_cart, capsys):
+        make_cart(timedelta(days=3))
+        make_cart(timedelta(hours=1))
+
+        call_command('reap_carts', days=2)
+
+        assert Cart.objects.count() == 1
+        assert 'Deleted 1 carts and 1 items' in capsys.readouterr().out
@@ -0,0 +1,59 @@
+from decimal import Decimal
+from model_bakery import baker
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+from rest_framework.request import Request
+import pytest
+
+from store.models import Collection, Product, ProductImage
+from store.serializers import CollectionSerializer, CompiledCollectionSerializer, CompiledProductSerializer, CompiledSimpleProductSerializer, ProductSerializer, SimpleProductSerializer
+
+
+def render(data):
+    return JSONRenderer().render(data)
+
+
+@pytest.fixture
+def products():
+    products = baker.make(Product, unit_price=Decimal('19.99'), _quantity=3) \
+        + baker.make(Product, description=None, unit_price=Decimal('1.05'), _quantity=2)
+    baker.make(ProductImage, product=products[0], image='store/images/a.jpg', _quantity=2)
+    return products
+
+
+@pytest.mark.django_db
+class TestCompiledSerializers:
+
+    @pytest.mark.parametrize("query", ['', '?fields=id,title,price_with_tax', '?omit=images,description'])
+    def test_product_output_is_identical(self, products, query):
+        request = Request(APIRequestFactory().get('/store/products/' + query))
+        context = {'request': request}
+        fields = ProductSerializer.get_requested_fields(request)
+        queryset = Product.objects.prefetch_related('images').order_by('id')
+
+        expected = ProductSerializer(queryset, many=True, context=context).data
+        compiled = CompiledProductSerializer(fields, context=context)
+        actual = compiled.to_representation(compiled.get_queryset(queryset))
+
+        assert render(actual) == render(expected)
+
+
+    def test_simple_product_output_is_identical(self, products):
+        queryset = Product.objects.order_by('id')
+
+        expected = SimpleProductSerializer(queryset, many=True).data
+        compiled = CompiledSimpleProductSerializer()
+        actual = compiled.to_representation(compiled.get_queryset(queryset))
+
+        assert render(actual) == render(expected)
+
+
+    def test_collection_output_is_identical(self, products):
+        baker.make(Collection)
+        queryset = Collection.objects.all()
+
+        expected = CollectionSerializer(queryset, many=True).data
+        compiled = CompiledCollectionSerializer()
+        actual = compiled.to_representation(compiled.get_queryset(queryset))
+
+        assert render(actual) == render(expected)
@@ -0,0 +1,89 @@
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework import status
+import pytest
+
+from store.models import Product, ProductImage
+
+
+@pytest.mark.django_db
+class TestProductConditionalGet:
+
+    def test_if_retrieve_sets_validators(self, api_client):
+        product = baker.make(Product)
+
+        response = api_client.get(reverse('products-detail', kwargs={'pk': product.id}))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag']
+        assert response['Last-Modified']
+
+
+    def test_if_etag_matches_returns_304_without_serializing(self, api_client, django_assert_num_queries):
+        product = baker.make(Product)
+        url = reverse('products-detail', kwargs={'pk': product.id})
+        etag = api_client.get(url)['ETag']
+
+        with django_assert_num_queries(0):
+            response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response['ETag'] == etag
+
+
+    def test_if_not_modified_since_returns_304(self, api_client):
+        product = baker.make(Product)
+        url = reverse('products-detail', kwargs={'pk': product.id})
+        last_modified = api_client.get(url)['Last-Modified']
+
+        response = api_client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+    def test_if_product_changed_returns_200(self, api_client):
+        product = baker.make(Product)
+        url = reverse('products-detail', kwargs={'pk': product.id})
+        etag = api_client.get(url)['ETag']
+
+        baker.make(ProductImage, product=product, image='store/images/a.jpg')
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'] != etag
+        assert len(response.data['images']) == 1
+        # The version bump is enough; the product row is not written.
+        assert Product.objects.get(pk=product.pk).last_update == product.last_update
+
+
+    def test_if_list_etag_matches_returns_304(self, api_client, django_assert_num_queries):
+        baker.make(Product, _quantity=3)
+        url = reverse('products-list')
+        etag = api_client.get(url, {'ordering': 'unit_price'})['ETag']
+
+        with django_assert_num_queries(0):
+            response = api_client.get(url, {'ordering': 'unit_price'}, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+    def test_if_list_changes_when_a_product_is_deleted(self, api_client):
+        products = baker.make(Product, _quantity=3)
+        url = reverse('products-list')
+        etag = api_client.get(url)['ETag']
+
+        products[0].delete()
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'] != etag
+
+
+    def test_if_query_changes_the_etag(self, api_client):
+        baker.make(Product, _quantity=3)
+        url = reverse('products-list')
+
+        etag = api_client.get(url)['ETag']
+        other = api_client.get(url, {'fields': 'id'})['ETag']
+
+        assert etag != other
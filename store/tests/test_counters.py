@@ -0,0 +1,95 @@
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from model_bakery import baker
+import pytest
+
+from store.models import Collection, Order, Product, Review
+
+
+@pytest.mark.django_db
+class TestCounters:
+
+    def test_if_product_insert_and_delete_update_products_count(self):
+        collection = baker.make(Collection)
+
+        products = baker.make(Product, collection=collection, _quantity=3)
+        products[0].delete()
+
+        collection.refresh_from_db()
+        assert collection.products_count == 2
+
+
+    def test_if_reparenting_moves_the_count(self):
+        old, new = baker.make(Collection, _quantity=2)
+        product = baker.make(Product, collection=old)
+
+        product = Product.objects.get(pk=product.pk)
+        product.collection = new
+        product.save()
+        product.save()
+
+        old.refresh_from_db()
+        new.refresh_from_db()
+        assert old.products_count == 0
+        assert new.products_count == 1
+
+
+    def test_if_saving_with_a_deferred_foreign_key_keeps_the_count(self):
+        old, new = baker.make(Collection, _quantity=2)
+        product = baker.make(Product, collection=old)
+
+        Product.objects.only('id', 'title').get(pk=product.pk).save()
+        moved = Product.objects.only('id', 'title').get(pk=product.pk)
+        moved.collection_id = new.id
+        moved.save()
+
+        old.refresh_from_db()
+        new.refresh_from_db()
+        assert old.products_count == 0
+        assert new.products_count == 1
+
+
+    def test_if_orders_update_orders_count(self):
+        customer = baker.make(get_user_model()).customer
+
+        baker.make(Order, customer=customer, _quantity=2)
+
+        customer.refresh_from_db()
+        assert customer.orders_count == 2
+
+
+    def test_if_reviews_update_reviews_count(self):
+        product = baker.make(Product)
+
+        review = baker.make(Review, product=product)
+        baker.make(Review, product=product)
+        review.delete()
+
+        product.refresh_from_db()
+        assert product.reviews_count == 1
+
+
+    def test_if_recount_repairs_drift(self):
+        collection = baker.make(Collection)
+        baker.make(Product, collection=collection, _quantity=2)
+        Collection.objects.filter(pk=collection.pk).update(products_count=10)
+
+        call_command('recount')
+
+        collection.refresh_from_db()
+        assert collection.products_count == 2
+
+
+    def test_if_repair_does_not_select_from_the_updated_table(self):
+        baker.make(Collection, _quantity=3)
+        Collection.objects.update(products_count=10)
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command('recount', chunk_size=2)
+
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "store_collection"')]
+        assert len(updates) == 2
+        assert all('FROM "store_collection"' not in sql.split('WHERE')[1] for sql in updates)
+        assert set(Collection.objects.values_list('products_count', flat=True)) == {0}
@@ -0,0 +1,226 @@
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+import pytest
+
+from store.cache import modified_key, version_key
+from store.customers import CUSTOMER_ID_CLAIM, customers
+from store.models import Customer, Order, OrderItem, Product
+
+
+@pytest.mark.django_db
+class TestCustomerResolver:
+
+    def test_if_me_resolves_the_customer_once(self, api_client, django_assert_num_queries):
+        user = baker.make(get_user_model())
+        api_client.force_authenticate(user=user)
+        api_client.get(reverse('customer-me'))
+
+        # Only the customer row itself; the user -> customer mapping is cached.
+        with django_assert_num_queries(1):
+            response = api_client.get(reverse('customer-me'))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['id'] == user.customer.id
+
+
+    def test_if_mapping_is_shared_through_the_cache(self, django_assert_num_queries):
+        user = baker.make(get_user_model())
+        customers.get(user.id)
+        customers.clear()
+
+        with django_assert_num_queries(0):
+            assert customers.get(user.id) == user.customer.id
+
+
+    def test_if_deleting_the_customer_forgets_the_mapping(self):
+        user = baker.make(get_user_model())
+        customers.get(user.id)
+
+        Customer.objects.filter(pk=user.customer.pk).delete()
+
+        with pytest.raises(Customer.DoesNotExist):
+            customers.get(user.id)
+
+
+    def test_if_access_token_carries_the_customer_id(self, api_client):
+        user = get_user_model().objects.create_user(username='shopper', password='s3cret-pass')
+
+        response = api_client.post('/auth/jwt/create/', {'username': 'shopper', 'password': 's3cret-pass'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert AccessToken(response.data['access'])[CUSTOMER_ID_CLAIM] == user.customer.id
+
+
+    def test_if_token_claim_skips_the_lookup(self, api_client):
+        user = baker.make(get_user_model())
+        token = AccessToken.for_user(user)
+        token[CUSTOMER_ID_CLAIM] = user.customer.id
+        api_client.credentials(HTTP_AUTHORIZATION=f'JWT {token}')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get(reverse('orders-list'))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert not [query for query in queries if 'store_customer' in query['sql']]
+
+
+@pytest.fixture
+def history(api_client, authenticated_client):
+    def perform_get(customer_id, **params):
+        authenticated_client(is_staff=True, is_superuser=True)
+        return api_client.get(reverse('customer-history', kwargs={'pk': customer_id}), params)
+    return perform_get
+
+
+@pytest.fixture
+def order_history():
+    def perform_seed(customer, orders, days_ago=0):
+        product = baker.make(Product)
+        created = baker.make(Order, customer=customer, _quantity=orders)
+        Order.objects \
+            .filter(pk__in=[order.pk for order in created]) \
+            .update(placed_at=timezone.now() - timedelta(days=days_ago))
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, unit_price=product.unit_price, quantity=1)
+            for order in created
+        ])
+        return created
+    return perform_seed
+
+
+@pytest.mark.django_db
+class TestCustomerHistory:
+
+    def test_if_user_lacks_permission_returns_403(self, api_client):
+        api_client.force_authenticate(user=baker.make(get_user_model(), is_staff=True))
+
+        response = api_client.get(reverse('customer-history', kwargs={'pk': 1}))
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+    def test_if_customer_does_not_exist_returns_404(self, history):
+        response = history(0)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+    def test_if_missing_customer_leaves_no_version_keys(self, history):
+        response = history(0)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert cache.get(version_key('history', 0)) is None
+        assert cache.get(modified_key('history', 0)) is None
+
+
+    def test_if_customer_id_is_not_a_number_returns_404(self, history):
+        response = history('abc')
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+    def test_if_unrelated_parameters_share_the_cached_page(self, history, order_history, django_assert_num_queries):
+        customer = baker.make(get_user_model()).customer
+        order_history(customer, orders=3)
+        first = history(customer.id, page_size=2)
+
+        with django_assert_num_queries(0):
+            response = history(customer.id, page_size=2, ordering='id', nonce='1')
+
+        assert response.data == first.data
+        assert 'nonce' not in response.data['next']
+
+
+    def test_if_feed_walks_live_then_archived_orders(self, api_client, history, order_history):
+        customer = baker.make(get_user_model()).customer
+        archived = order_history(customer, orders=4, days_ago=400)
+        live = order_history(customer, orders=3)
+        order_history(baker.make(get_user_model()).customer, orders=2)
+        call_command('archive_orders')
+
+        ids = []
+        response = history(customer.id, page_size=2)
+        while True:
+            assert response.status_code == status.HTTP_200_OK
+            ids += [order['id'] for order in response.data['results']]
+            if not response.data['next']:
+                break
+            response = api_client.get(response.data['next'])
+
+        assert ids == [order.id for order in reversed(live)] + [order.id for order in reversed(archived)]
+        assert set(response.data['results'][0]['items'][0]['product']) == {'id', 'title', 'unit_price'}
+
+
+    def test_query_count_does_not_grow_with_history(self, api_client, history, order_history, django_assert_num_queries):
+        customer = baker.make(get_user_model()).customer
+        order_history(customer, orders=300)
+
+        # The customer, the page of orders and their items.
+        with django_assert_num_queries(3):
+            first = history(customer.id, page_size=50)
+        with django_assert_num_queries(3):
+            api_client.get(first.data['next'])
+
+        assert len(first.data['results']) == 50
+
+
+    def test_if_new_order_invalidates_the_cached_pages(self, history, order_history, django_assert_num_queries):
+        customer = baker.make(get_user_model()).customer
+        order_history(customer, orders=2)
+        history(customer.id)
+
+        with django_assert_num_queries(0):
+            cached = history(customer.id)
+        new, = order_history(customer, orders=1)
+        response = history(customer.id)
+
+        assert len(cached.data['results']) == 2
+        assert response.data['results'][0]['id'] == new.id
+
+
+@pytest.mark.django_db
+class TestCustomerNames:
+
+    def test_if_new_customer_copies_the_user_names(self):
+        user = baker.make(get_user_model(), first_name='Ada', last_name='Lovelace')
+
+        customer = Customer.objects.get(user=user)
+
+        assert (customer.first_name, customer.last_name, customer.sort_key) == ('Ada', 'Lovelace', 'ada lovelace')
+        assert str(customer) == 'Ada Lovelace'
+
+
+    def test_if_renaming_the_user_updates_the_customer(self, django_assert_num_queries):
+        user = baker.make(get_user_model(), first_name='Ada', last_name='Byron')
+
+        user.last_name = 'Lovelace'
+        user.save()
+        # Saves that do not touch the names leave the customer alone.
+        with django_assert_num_queries(1):
+            user.save(update_fields=['last_login'])
+
+        assert Customer.objects.values_list('last_name', 'sort_key').get(user=user) == ('Lovelace', 'ada lovelace')
+
+
+    def test_if_list_is_sorted_and_searched_without_the_user_table(self, api_client, authenticated_client):
+        for first_name, last_name in [('Grace', 'Hopper'), ('ada', 'Lovelace'), ('Alan', 'Turing'), ('Ada', 'Yonath')]:
+            baker.make(get_user_model(), first_name=first_name, last_name=last_name)
+        authenticated_client(is_staff=True)
+
+        with CaptureQueriesContext(connection) as queries:
+            listed = api_client.get(reverse('customer-list'), {'page_size': 3})
+            searched = api_client.get(reverse('customer-list'), {'search': 'ADA lov'})
+
+        assert [customer['last_name'] for customer in listed.data['results']] == ['Lovelace', 'Yonath', 'Turing']
+        assert listed.data['next'] is not None
+        assert [customer['last_name'] for customer in searched.data['results']] == ['Lovelace']
+        assert not any('core_user' in query['sql'] for query in queries.captured_queries)
@@ -0,0 +1,58 @@
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from model_bakery import baker
+import pytest
+
+from store.models import Customer
+from store.onboarding import import_customers, read_csv
+
+
+CSV = """username,email,first_name,last_name,password,phone,birth_date,membership
+ada,ada@example.com,Ada,Lovelace,s3cret!,555-0100,1815-12-10,G
+alan,alan@example.com,Alan,Turing,,555-0101,,
+taken,new@example.com,Ta,Ken,,,,
+bad,not-an-email,Bad,Row,,,,X
+ada2,ada@example.com,Ada,Again,,,,
+"""
+
+
+@pytest.mark.django_db
+class TestImportCustomers:
+
+    def test_if_users_and_customers_are_created_in_batches(self, django_assert_max_num_queries):
+        baker.make(get_user_model(), username='taken', email='taken@example.com')
+
+        # Per batch of two: the taken check, then the users and the customers
+        # inside a savepoint; no query per user.
+        with django_assert_max_num_queries(3 * 5):
+            stats = import_customers(read_csv(StringIO(CSV)), batch_size=2, workers=0)
+
+        assert (stats['created'], stats['skipped'], stats['invalid']) == (2, 2, 1)
+        assert stats['errors'] == [(5, 'email: Enter a valid email address.')]
+        ada = Customer.objects.select_related('user').get(user__username='ada')
+        assert (ada.user.first_name, ada.phone, str(ada.birth_date), ada.membership) == \
+            ('Ada', '555-0100', '1815-12-10', Customer.MEMBERSHIP_GOLD)
+        assert ada.user.check_password('s3cret!')
+        alan = get_user_model().objects.get(username='alan')
+        assert not alan.has_usable_password()
+        assert alan.customer.membership == Customer.MEMBERSHIP_BRONZE
+
+
+    def test_if_passwords_are_hashed_in_worker_processes(self):
+        rows = [(i + 2, {'username': f'user{i}', 'email': f'user{i}@example.com', 'password': f'pass{i}'})
+                for i in range(4)]
+
+        stats = import_customers(iter(rows), workers=2)
+
+        assert stats['created'] == 4
+        assert get_user_model().objects.get(username='user3').check_password('pass3')
+
+
+    def test_if_command_reads_the_csv(self, tmp_path):
+        path = tmp_path / 'customers.csv'
+        path.write_text(CSV)
+
+        call_command('import_customers', str(path), workers=0)
+
+        assert Customer.objects.filter(user__username__in=['ada', 'alan', 'taken']).count() == 3
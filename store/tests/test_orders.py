@@ -0,0 +1,371 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+import json
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework import status
+from rest_framework.test import APIClient
+import pytest
+
+from store.customers import customers
+from store.exports import order_rows
+from store.models import ArchivedOrder, ArchivedOrderItem, Cart, CartItem, Customer, Order, OrderItem, Product
+
+
+@pytest.fixture
+def checkout(api_client):
+    def perform_checkout(cart_id, user=None, client=None):
+        client = client or api_client
+        client.force_authenticate(user=user or baker.make(get_user_model()))
+        return client.post(reverse('orders-list'), {'cart_id': cart_id}, format='json')
+    return perform_checkout
+
+
+@pytest.fixture
+def make_cart():
+    def perform_make(products, quantity=1):
+        cart = baker.make(Cart)
+        for product in products:
+            baker.make(CartItem, cart=cart, product=product, quantity=quantity)
+        return cart
+    return perform_make
+
+
+@pytest.mark.django_db
+class TestCreateOrder:
+
+    def test_if_cart_does_not_exist_returns_400(self, checkout):
+        response = checkout('00000000-0000-0000-0000-000000000000')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['cart_id'] is not None
+
+
+    def test_if_cart_is_empty_returns_400(self, checkout):
+        response = checkout(baker.make(Cart).id)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['cart_id'] is not None
+
+
+    def test_if_order_is_created_and_inventory_decremented(self, checkout, make_cart):
+        products = baker.make(Product, inventory=5, _quantity=2)
+        cart = make_cart(products, quantity=2)
+
+        response = checkout(cart.id)
+
+        assert response.status_code == status.HTTP_200_OK
+        order = Order.objects.get(pk=response.data['id'])
+        assert sorted(order.items.values_list('product_id', 'quantity', 'unit_price')) == \
+            sorted((product.id, 2, product.unit_price) for product in products)
+        assert list(Product.objects.values_list('inventory', flat=True)) == [3, 3]
+        assert not Cart.objects.filter(pk=cart.id).exists()
+        assert not CartItem.objects.filter(cart_id=cart.id).exists()
+
+
+    def test_if_oversold_line_rejects_the_whole_order(self, checkout, make_cart):
+        enough = baker.make(Product, inventory=5)
+        short = baker.make(Product, inventory=1)
+        cart = make_cart([enough, short], quantity=2)
+
+        response = checkout(cart.id)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert str(short.id) in str(response.data['cart_id'])
+        assert not Order.objects.exists()
+        assert Product.objects.get(pk=enough.pk).inventory == 5
+        assert CartItem.objects.filter(cart=cart).count() == 2
+
+
+    def test_if_totals_are_stored_on_the_order(self, checkout, make_cart):
+        first = baker.make(Product, inventory=5, unit_price=Decimal('2.50'))
+        second = baker.make(Product, inventory=5, unit_price=Decimal('10'))
+        cart = make_cart([first, second], quantity=2)
+
+        response = checkout(cart.id)
+
+        assert response.data['total'] == Decimal('25.00')
+        assert response.data['item_count'] == 4
+        assert Order.objects.values_list('total', 'item_count').get() == (Decimal('25.00'), 4)
+
+
+    def test_query_count_does_not_grow_with_cart_size(self, checkout, make_cart, django_assert_num_queries):
+        user = baker.make(get_user_model())
+        small = make_cart(baker.make(Product, inventory=5, _quantity=1))
+        large = make_cart(baker.make(Product, inventory=5, _quantity=20))
+        customers.get(user.id)
+
+        # Validation, lines, products, order, orders_count, inventory, order
+        # items, two deletes, the outbox event, the response's prefetch and
+        # the savepoint around the pipeline.
+        with django_assert_num_queries(14) as small_queries:
+            checkout(small.id, user)
+        with django_assert_num_queries(len(small_queries)):
+            response = checkout(large.id, user)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert OrderItem.objects.filter(order_id=response.data['id']).count() == 20
+
+
+@pytest.fixture
+def order_history():
+    def perform_seed(customer, orders=100, items=10):
+        products = baker.make(Product, _quantity=items)
+        created = baker.make(Order, customer=customer, _quantity=orders)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, unit_price=product.unit_price, quantity=1)
+            for order in created
+            for product in products
+        ])
+        return created
+    return perform_seed
+
+
+@pytest.mark.django_db
+class TestListOrders:
+
+    def test_if_anonymous_returns_401(self, api_client):
+        response = api_client.get(reverse('orders-list'))
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+    def test_if_list_is_three_queries_for_100_orders(self, api_client, order_history, django_assert_num_queries):
+        user = baker.make(get_user_model())
+        order_history(user.customer)
+        order_history(baker.make(get_user_model()).customer, orders=1)
+        api_client.force_authenticate(user=user)
+
+        # The customer, the page of orders and their items with products.
+        with django_assert_num_queries(3):
+            response = api_client.get(reverse('orders-list'), {'page_size': 100})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['results']) == 100
+        assert all(len(order['items']) == 10 for order in response.data['results'])
+        assert set(response.data['results'][0]['items'][0]['product']) == {'id', 'title', 'unit_price'}
+
+
+    def test_if_backfill_recomputes_totals(self, order_history):
+        orders = order_history(baker.make(get_user_model()).customer, orders=3, items=2)
+        Order.objects.update(total=0, item_count=0)
+
+        call_command('backfill_order_totals', batch_size=2)
+
+        expected = sum(item.unit_price for item in orders[0].items.all())
+        assert set(Order.objects.values_list('total', 'item_count')) == {(expected, 2)}
+
+
+    def test_if_cursor_walks_all_orders_newest_first(self, api_client, order_history):
+        user = baker.make(get_user_model())
+        orders = order_history(user.customer, orders=25, items=1)
+        api_client.force_authenticate(user=user)
+
+        ids = []
+        url = reverse('orders-list')
+        while url:
+            response = api_client.get(url)
+            ids += [order['id'] for order in response.data['results']]
+            url = response.data['next']
+
+        assert ids == sorted((order.id for order in orders), reverse=True)
+
+
+@pytest.fixture
+def old_orders(order_history):
+    def perform_seed(customer, orders=3, items=2, days=400):
+        created = order_history(customer, orders=orders, items=items)
+        Order.objects \
+            .filter(pk__in=[order.pk for order in created]) \
+            .update(placed_at=timezone.now() - timedelta(days=days))
+        return created
+    return perform_seed
+
+
+@pytest.mark.django_db
+class TestArchiveOrders:
+
+    def test_if_old_orders_are_moved_with_their_items(self, old_orders, order_history):
+        customer = baker.make(get_user_model()).customer
+        old = old_orders(customer, orders=3, items=2)
+        recent, = order_history(customer, orders=1, items=2)
+
+        call_command('archive_orders', chunk_size=2)
+
+        assert list(Order.objects.values_list('pk', flat=True)) == [recent.pk]
+        assert sorted(ArchivedOrder.objects.values_list('pk', flat=True)) == [order.pk for order in old]
+        assert ArchivedOrderItem.objects.count() == 6
+        assert not OrderItem.objects.filter(order_id__in=[order.pk for order in old]).exists()
+        assert Customer.objects.get(pk=customer.pk).orders_count == 1
+
+
+    def test_if_archived_order_is_retrieved_by_its_id(self, api_client, old_orders):
+        user = baker.make(get_user_model())
+        order, = old_orders(user.customer, orders=1, items=2)
+        Order.objects.update_totals()
+        call_command('archive_orders')
+        api_client.force_authenticate(user=user)
+
+        response = api_client.get(reverse('orders-detail', kwargs={'pk': order.pk}))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['id'] == order.pk
+        assert response.data['item_count'] == 2
+        assert len(response.data['items']) == 2
+
+
+    def test_if_other_customers_archived_order_returns_404(self, api_client, old_orders):
+        order, = old_orders(baker.make(get_user_model()).customer, orders=1)
+        call_command('archive_orders')
+        api_client.force_authenticate(user=baker.make(get_user_model()))
+
+        response = api_client.get(reverse('orders-detail', kwargs={'pk': order.pk}))
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+    def test_if_product_in_archived_order_cannot_be_deleted(self, api_client, old_orders):
+        order, = old_orders(baker.make(get_user_model()).customer, orders=1, items=1)
+        call_command('archive_orders')
+        api_client.force_authenticate(user=get_user_model()(is_staff=True))
+
+        product_id = ArchivedOrderItem.objects.get().product_id
+        response = api_client.delete(reverse('products-detail', kwargs={'pk': product_id}))
+
+        assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+        assert Product.objects.filter(pk=product_id).exists()
+
+
+@pytest.fixture
+def export(api_client):
+    def perform_export(**params):
+        api_client.force_authenticate(user=get_user_model()(is_staff=True))
+        response = api_client.get(reverse('orders-export'), params)
+        content = b''.join(response.streaming_content).decode() if response.streaming else None
+        return response, content
+    return perform_export
+
+
+@pytest.mark.django_db
+class TestExportOrders:
+
+    def test_if_user_is_not_admin_returns_403(self, api_client, authenticated_client):
+        authenticated_client()
+
+        response = api_client.get(reverse('orders-export'))
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+    def test_if_csv_has_a_row_per_item(self, export, order_history):
+        orders = order_history(baker.make(get_user_model()).customer, orders=2, items=3)
+
+        response, content = export()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'] == 'text/csv'
+        lines = content.splitlines()
+        assert lines[0] == 'order_id,placed_at,payment_status,customer_id,total,item_count,item_id,product_id,product_title,quantity,unit_price'
+        assert len(lines) == 1 + 6
+        assert [int(line.split(',')[0]) for line in lines[1:]] == [orders[0].id] * 3 + [orders[1].id] * 3
+
+
+    def test_if_ndjson_has_a_document_per_order(self, export, order_history):
+        order, = order_history(baker.make(get_user_model()).customer, orders=1, items=2)
+
+        response, content = export(export_format='ndjson')
+
+        assert response['Content-Type'] == 'application/x-ndjson'
+        document, = [json.loads(line) for line in content.splitlines()]
+        assert document['order_id'] == order.id
+        assert document['payment_status'] == Order.PAYMENT_STATUS_PENDING
+        assert len(document['items']) == 2
+        assert set(document['items'][0]) == {'item_id', 'product_id', 'product_title', 'quantity', 'unit_price'}
+
+
+    def test_if_orders_are_filtered(self, export, order_history):
+        customer = baker.make(get_user_model()).customer
+        old, paid, pending = order_history(customer, orders=3, items=1)
+        Order.objects.filter(pk=old.pk).update(placed_at=timezone.now() - timedelta(days=10))
+        Order.objects.filter(pk=paid.pk).update(payment_status=Order.PAYMENT_STATUS_COMPLETE)
+
+        _, content = export(
+            export_format='ndjson',
+            placed_at__gte=(timezone.now() - timedelta(days=1)).isoformat(),
+            payment_status=Order.PAYMENT_STATUS_PENDING)
+
+        assert [json.loads(line)['order_id'] for line in content.splitlines()] == [pending.id]
+
+
+    def test_if_archived_orders_are_exported_and_filtered(self, export, order_history, old_orders):
+        customer = baker.make(get_user_model()).customer
+        recent, = order_history(customer, orders=1, items=1)
+        old = old_orders(customer, orders=2, items=2)
+        call_command('archive_orders')
+
+        _, content = export(export_format='ndjson')
+        _, filtered = export(export_format='ndjson', placed_at__lt=(timezone.now() - timedelta(days=1)).isoformat())
+
+        documents = [json.loads(line) for line in content.splitlines()]
+        assert [document['order_id'] for document in documents] == [recent.id] + [order.id for order in old]
+        assert [len(document['items']) for document in documents] == [1, 2, 2]
+        assert [json.loads(line)['order_id'] for line in filtered.splitlines()] == [order.id for order in old]
+
+
+    def test_if_invalid_filter_returns_400(self, export):
+        response, _ = export(payment_status='X')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+    def test_if_rows_are_read_in_keyset_chunks(self, order_history, django_assert_num_queries):
+        order_history(baker.make(get_user_model()).customer, orders=5, items=2)
+
+        # Two queries for each of the three chunks of at most 2 orders.
+        with django_assert_num_queries(6):
+            rows = list(order_rows(Order.objects.all(), chunk_size=2))
+
+        assert len(rows) == 10
+
+
+    def test_if_command_writes_the_export(self, order_history, tmp_path):
+        order_history(baker.make(get_user_model()).customer, orders=3, items=1)
+        output = tmp_path / 'orders.ndjson'
+
+        call_command('export_orders', format='ndjson', output=str(output))
+
+        assert len(output.read_text().splitlines()) == 3
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.skipif(connection.vendor == 'sqlite', reason='SQLite has no row locks.')
+def test_concurrent_checkouts_do_not_oversell(checkout, make_cart):
+    inventory = 10
+    buyers = 30
+    product = baker.make(Product, inventory=inventory)
+    other = baker.make(Product, inventory=buyers)
+    # Half the carts list the products in the opposite order, which would
+    # deadlock without a fixed locking order.
+    carts = [make_cart([product, other] if i % 2 else [other, product]) for i in range(buyers)]
+    users = baker.make(get_user_model(), _quantity=buyers)
+
+    def perform_checkout(args):
+        cart, user = args
+        try:
+            return checkout(cart.id, user, client=APIClient()).status_code
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        statuses = list(executor.map(perform_checkout, zip(carts, users)))
+
+    assert statuses.count(status.HTTP_200_OK) == inventory
+    assert statuses.count(status.HTTP_400_BAD_REQUEST) == buyers - inventory
+    assert Product.objects.get(pk=product.pk).inventory == 0
+    assert Product.objects.get(pk=other.pk).inventory == buyers - inventory
+    assert OrderItem.objects.filter(product=product).count() == inventory
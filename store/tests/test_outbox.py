@@ -0,0 +1,148 @@
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, transaction
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+import pytest
+
+from store.models import Cart, CartItem, Order, OutboxEvent, Product
+from store.outbox import first_delivery, prune, relay
+from store.signals import order_created
+
+
+@pytest.fixture
+def received():
+    calls = []
+
+    def receiver(sender, **kwargs):
+        calls.append(kwargs)
+
+    order_created.connect(receiver, dispatch_uid='test_outbox')
+    yield calls
+    order_created.disconnect(dispatch_uid='test_outbox')
+
+
+@pytest.fixture
+def failing_receiver():
+    def receiver(sender, **kwargs):
+        raise RuntimeError('Subscriber is down.')
+
+    order_created.connect(receiver, dispatch_uid='test_outbox_failing')
+    yield
+    order_created.disconnect(dispatch_uid='test_outbox_failing')
+
+
+@pytest.fixture
+def broken_transaction_receiver():
+    def receiver(sender, **kwargs):
+        # Fails the way a receiver's failed query does: the enclosing
+        # transaction has to be rolled back.
+        with transaction.atomic(savepoint=False):
+            Product.objects.update(inventory=0)
+            raise DatabaseError('Deadlock found.')
+
+    order_created.connect(receiver, dispatch_uid='test_outbox_broken_transaction')
+    yield
+    order_created.disconnect(dispatch_uid='test_outbox_broken_transaction')
+
+
+@pytest.fixture
+def customer():
+    return baker.make(get_user_model()).customer
+
+
+@pytest.fixture
+def checkout(api_client):
+    def perform_checkout():
+        cart = baker.make(Cart)
+        baker.make(CartItem, cart=cart, product=baker.make(Product, inventory=5), quantity=1)
+        api_client.force_authenticate(user=baker.make(get_user_model()))
+        return api_client.post(reverse('orders-list'), {'cart_id': cart.id}, format='json')
+    return perform_checkout
+
+
+@pytest.mark.django_db
+class TestOutbox:
+
+    def test_if_checkout_delivers_order_created_after_commit(self, checkout, received, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks() as callbacks:
+            response = checkout()
+
+            # Nothing is delivered while the checkout transaction is open.
+            assert received == []
+            event = OutboxEvent.objects.get()
+            assert event.payload == {'order_id': response.data['id']}
+
+        for callback in callbacks:
+            callback()
+
+        assert len(received) == 1
+        assert received[0]['order'] == Order.objects.get(pk=response.data['id'])
+        assert received[0]['event_id'] == event.event_id
+        assert OutboxEvent.objects.get().dispatched_at is not None
+
+
+    def test_if_relay_drains_pending_events_in_batches(self, received, customer):
+        orders = baker.make(Order, customer=customer, _quantity=5)
+        for order in orders:
+            baker.make(OutboxEvent, topic='order_created', payload={'order_id': order.id})
+
+        assert relay(batch_size=2) == 5
+        assert relay(batch_size=2) == 0
+        assert [call['order'] for call in received] == orders
+
+
+    def test_if_failed_events_are_retried(self, received, failing_receiver, customer):
+        order = baker.make(Order, customer=customer)
+        baker.make(OutboxEvent, topic='order_created', payload={'order_id': order.id})
+
+        assert relay() == 0
+        event = OutboxEvent.objects.get()
+        assert event.dispatched_at is None
+        assert event.attempts == 1
+        assert 'Subscriber is down.' in event.last_error
+        # The other receiver saw the event and will see it again: delivery
+        # is at-least-once.
+        assert len(received) == 1
+
+
+    def test_if_database_error_in_a_receiver_only_fails_its_event(self, broken_transaction_receiver, customer):
+        product = baker.make(Product, inventory=5)
+        orders = baker.make(Order, customer=customer, _quantity=2)
+        for order in orders:
+            baker.make(OutboxEvent, topic='order_created', payload={'order_id': order.id})
+
+        assert relay() == 0
+        assert list(OutboxEvent.objects.values_list('attempts', flat=True)) == [1, 1]
+        assert all('Deadlock found.' in event.last_error for event in OutboxEvent.objects.all())
+        product.refresh_from_db()
+        assert product.inventory == 5
+
+
+    def test_if_first_delivery_detects_redelivery(self):
+        event = baker.make(OutboxEvent, topic='order_created', payload={})
+
+        assert first_delivery(event.event_id, 'mailer')
+        assert not first_delivery(event.event_id, 'mailer')
+        assert first_delivery(event.event_id, 'analytics')
+
+
+    def test_if_rolled_back_delivery_is_not_remembered(self):
+        event = baker.make(OutboxEvent, topic='order_created', payload={})
+
+        with pytest.raises(DatabaseError), transaction.atomic():
+            assert first_delivery(event.event_id, 'mailer')
+            raise DatabaseError('Lock wait timeout exceeded.')
+
+        assert first_delivery(event.event_id, 'mailer')
+
+
+    def test_if_prune_deletes_old_delivered_events(self):
+        old = baker.make(OutboxEvent, topic='order_created', payload={},
+                         dispatched_at=timezone.now() - timedelta(days=8))
+        pending = baker.make(OutboxEvent, topic='order_created', payload={})
+
+        assert prune(timedelta(days=7)) == 1
+        assert list(OutboxEvent.objects.all()) == [pending]
+        assert not OutboxEvent.objects.filter(pk=old.pk).exists()
@@ -1,10 +1,12 @@
+from decimal import Decimal
 from operator import attrgetter, itemgetter
 from django.urls import reverse
 from rest_framework import status
 from model_bakery import baker
 import pytest
 
-from store.models import Collection, Product
+from store import search
+from store.models import Collection, Product, ProductImage
 
 
 @pytest.fixture
@@ -243,3 +245,191 @@ class TestDeleteProduct:
         response = delete_product(product_id=product.id)
 
         assert response.status_code == status.HTTP_204_NO_CONTENT
+
+
+@pytest.mark.django_db
+class TestCursorPagination:
+
+    def walk(self, api_client, url, params=None):
+        pages = []
+        response = api_client.get(url, params)
+        while True:
+            assert response.status_code == status.HTTP_200_OK
+            pages.append(response.data)
+            if response.data['next'] is None:
+                return pages
+            response = api_client.get(response.data['next'])
+
+
+    def test_if_cursor_mode_returns_all_products_in_order(self, api_client):
+        collection = baker.make(Collection)
+        products = baker.make(Product, collection=collection, unit_price=Decimal('10.00'), _quantity=15) \
+            + baker.make(Product, collection=collection, unit_price=Decimal('5.00'), _quantity=10)
+
+        pages = self.walk(api_client, reverse('products-list'), {'pagination': 'cursor', 'ordering': 'unit_price'})
+
+        returned_ids = [item['id'] for page in pages for item in page['results']]
+        expected_ids = [product.id for product in sorted(products, key=attrgetter('unit_price', 'id'))]
+        assert len(pages) == 3
+        assert returned_ids == expected_ids
+
+
+    def test_if_descending_ordering_is_respected(self, api_client):
+        collection = baker.make(Collection)
+        products = baker.make(Product, collection=collection, unit_price=Decimal('10.00'), _quantity=12)
+
+        pages = self.walk(api_client, reverse('products-list'), {'pagination': 'cursor', 'ordering': '-unit_price'})
+
+        returned_ids = [item['id'] for page in pages for item in page['results']]
+        assert returned_ids == sorted([product.id for product in products], reverse=True)
+
+
+    def test_if_previous_link_returns_previous_page(self, api_client):
+        baker.make(Product, _quantity=25)
+
+        first_page = api_client.get(reverse('products-list'), {'pagination': 'cursor'}).data
+        second_page = api_client.get(first_page['next']).data
+        previous_page = api_client.get(second_page['previous']).data
+
+        assert first_page['previous'] is None
+        assert previous_page['results'] == first_page['results']
+
+
+    def test_if_cursor_mode_skips_count_query(self, api_client, django_assert_num_queries):
+        baker.make(Product, _quantity=15)
+
+        # One query for the page and one for the prefetched images.
+        with django_assert_num_queries(2):
+            response = api_client.get(reverse('products-list'), {'pagination': 'cursor'})
+
+        assert 'count' not in response.data
+        assert len(response.data['results']) == 10
+
+
+    def test_if_cursor_is_invalid_returns_404(self, api_client):
+        response = api_client.get(reverse('products-list'), {'pagination': 'cursor', 'cursor': 'invalid'})
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.fixture
+def search_backend(settings):
+    # The index is module state, so it would otherwise outlive the per-test
+    # database rollback. FULLTEXT indexes only see committed rows, so tests
+    # always use the in-memory index.
+    settings.STORE_SEARCH_BACKEND = 'store.search.InMemorySearchBackend'
+    search._backend = None
+    yield
+    search._backend = None
+
+
+@pytest.mark.django_db
+@pytest.mark.usefixtures('search_backend')
+class TestSearchProducts:
+
+    def search(self, api_client, query):
+        response = api_client.get(reverse('products-list'), {'search': query})
+        assert response.status_code == status.HTTP_200_OK
+        return [item['id'] for item in response.data['results']]
+
+
+    def test_if_results_are_ranked_by_relevance(self, api_client):
+        in_description = baker.make(Product, title='Mug', description='A coffee mug')
+        in_title = baker.make(Product, title='Coffee beans', description='Whole beans')
+        baker.make(Product, title='Tea', description='Green tea')
+
+        assert self.search(api_client, 'coffee') == [in_title.id, in_description.id]
+
+
+    def test_if_all_terms_must_match(self, api_client):
+        product = baker.make(Product, title='Dark coffee beans', description='')
+        baker.make(Product, title='Dark chocolate', description='')
+
+        assert self.search(api_client, 'dark coff') == [product.id]
+
+
+    def test_if_updated_product_is_reindexed(self, api_client):
+        product = baker.make(Product, title='Coffee', description='')
+        self.search(api_client, 'coffee')
+
+        product.title = 'Espresso'
+        product.save()
+
+        assert self.search(api_client, 'coffee') == []
+        assert self.search(api_client, 'espresso') == [product.id]
+
+
+    def test_if_deleted_product_is_not_returned(self, api_client):
+        product = baker.make(Product, title='Coffee', description='')
+        self.search(api_client, 'coffee')
+
+        product.delete()
+
+        assert self.search(api_client, 'coffee') == []
+
+
+    def test_if_terms_below_the_fulltext_token_size_fall_back_to_substrings(self):
+        tv = baker.make(Product, title='Smart TV', description='')
+        baker.make(Product, title='Radio', description='')
+
+        results = search.MySQLFullTextSearchBackend().search(Product.objects.all(), ['tv', 'the'])
+
+        assert 'MATCH' not in str(results.query)
+        assert list(results) == []
+        assert list(search.MySQLFullTextSearchBackend().search(Product.objects.all(), ['tv'])) == [tv]
+
+
+@pytest.mark.django_db
+class TestSparseFieldsets:
+
+    @pytest.mark.parametrize(
+        "params, expected_fields, expected_queries",
+        [
+            ({}, ['id', 'title', 'description', 'slug', 'inventory', 'unit_price', 'price_with_tax', 'collection', 'images'], 3),
+            ({'omit': 'images'}, ['id', 'title', 'description', 'slug', 'inventory', 'unit_price', 'price_with_tax', 'collection'], 2),
+            ({'fields': 'id,title,unit_price'}, ['id', 'title', 'unit_price'], 2),
+            ({'fields': 'id,images', 'omit': 'id'}, ['images'], 3),
+        ]
+    )
+    def test_list_shape_and_query_count(self, api_client, django_assert_num_queries, params, expected_fields, expected_queries):
+        products = baker.make(Product, _quantity=3)
+        for product in products:
+            baker.make(ProductImage, product=product, image='store/images/a.jpg')
+
+        with django_assert_num_queries(expected_queries):
+            response = api_client.get(reverse('products-list'), params)
+
+        assert response.status_code == status.HTTP_200_OK
+        for item in response.data['results']:
+            assert list(item) == expected_fields
+
+
+    @pytest.mark.parametrize(
+        "params, expected_queries",
+        [
+            ({}, 2),
+            ({'omit': 'images'}, 1),
+            ({'fields': 'title,unit_price'}, 1),
+        ]
+    )
+    def test_retrieve_query_count(self, api_client, django_assert_num_queries, params, expected_queries):
+        product = baker.make(Product)
+
+        with django_assert_num_queries(expected_queries):
+            response = api_client.get(reverse('products-detail', kwargs={'pk': product.id}), params)
+
+        assert response.status_code == status.HTTP_200_OK
+
+
+    def test_if_write_requests_ignore_field_selection(self, authenticated_client, api_client):
+        authenticated_client(is_staff=True)
+        product = baker.make(Product)
+
+        response = api_client.patch(
+            reverse('products-detail', kwargs={'pk': product.id}) + '?fields=id',
+            {'title': 'a'},
+            format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['title'] == 'a'
+        assert 'images' in response.data
@@ -0,0 +1,211 @@
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework import status
+import pytest
+
+from store.filters import sort_key_prefix
+from store.models import Cart, CartItem, Collection, Customer, Order, OrderItem, Product, ProductImage, Review
+from tags.models import Tag, TaggedItem
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith('SELECT'):
+            self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+def explain(sql, params):
+    """
+    Return `(table, is_full_scan, detail)` for every table access in the
+    plan of `sql`.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute('EXPLAIN ' + sql, params)
+            columns = [column[0] for column in cursor.description]
+            plan = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            return [
+                (row['table'], row['type'] == 'ALL', f"type={row['type']} key={row['key']}")
+                for row in plan if row['table']
+            ]
+
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        steps = []
+        for *_, detail in cursor.fetchall():
+            words = detail.split()
+            if words[0] in ('SCAN', 'SEARCH'):
+                steps.append((words[1], words[0] == 'SCAN' and 'INDEX' not in detail, detail))
+        return steps
+
+
+@pytest.fixture
+def capture_plans():
+    def perform_capture(request, tables):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = request()
+
+        full_scans = [
+            (table, detail, sql)
+            for sql, params in recorder.queries
+            for table, is_full_scan, detail in explain(sql, params)
+            if is_full_scan and table in tables
+        ]
+        assert recorder.queries
+        assert full_scans == []
+        return response
+    return perform_capture
+
+
+@pytest.fixture
+def seeded():
+    collections = baker.make(Collection, _quantity=5)
+    Product.objects.bulk_create([
+        Product(
+            title=f'Product {i}',
+            slug=f'product-{i}',
+            description='Seeded product',
+            unit_price=Decimal(i % 100) + 1,
+            inventory=i % 50,
+            collection=collections[i % len(collections)])
+        for i in range(500)
+    ])
+    products = list(Product.objects.order_by('id')[:20])
+    for product in products:
+        baker.make(ProductImage, product=product, image='store/images/a.jpg')
+        baker.make(Review, product=product, _quantity=2)
+
+    cart = baker.make(Cart)
+    for product in products[:5]:
+        baker.make(CartItem, cart=cart, product=product, quantity=1)
+
+    tag = baker.make(Tag)
+    content_type = ContentType.objects.get_for_model(Product)
+    for product in products:
+        baker.make(TaggedItem, tag=tag, content_type=content_type, object_id=product.id)
+
+    return {'collection': collections[0], 'product': products[0], 'cart': cart}
+
+
+@pytest.mark.django_db
+class TestQueryPlans:
+
+    def test_product_list_filtered_by_collection_and_price(self, api_client, capture_plans, seeded):
+        params = {
+            'collection_id': seeded['collection'].id,
+            'unit_price__gt': 10,
+            'unit_price__lt': 50,
+            'ordering': 'unit_price',
+        }
+
+        response = capture_plans(
+            lambda: api_client.get(reverse('products-list'), params),
+            tables=['store_product', 'store_productimage'])
+
+        assert response.status_code == status.HTTP_200_OK
+
+
+    def test_product_list_default_ordering(self, api_client, capture_plans, seeded):
+        response = capture_plans(
+            lambda: api_client.get(reverse('products-list'), {'page': 3}),
+            tables=['store_product', 'store_productimage'])
+
+        assert response.status_code == status.HTTP_200_OK
+
+
+    @pytest.mark.parametrize("ordering", ['unit_price', '-unit_price', 'last_update', '-last_update'])
+    def test_product_list_cursor_pages(self, api_client, capture_plans, seeded, ordering):
+        first_page = api_client.get(reverse('products-list'), {'pagination': 'cursor', 'ordering': ordering})
+
+        response = capture_plans(
+            lambda: api_client.get(first_page.data['next']),
+            tables=['store_product', 'store_productimage'])
+
+        assert response.status_code == status.HTTP_200_OK
+
+
+    def test_product_detail(self, api_client, capture_plans, seeded):
+        response = capture_plans(
+            lambda: api_client.get(reverse('products-detail', kwargs={'pk': seeded['product'].id})),
+            tables=['store_product', 'store_productimage'])
+
+        assert response.status_code == status.HTTP_200_OK
+
+
+    def test_product_reviews(self, api_client, capture_plans, seeded):
+        response = capture_plans(
+            lambda: api_client.get(reverse('product-reviews-list', kwargs={'product_pk': seeded['product'].id})),
+            tables=['store_review'])
+
+        assert response.status_code == status.HTTP_200_OK
+
+
+    def test_cart_detail(self, api_client, capture_plans, seeded):
+        response = capture_plans(
+            lambda: api_client.get(reverse('cart-detail', kwargs={'pk': seeded['cart'].id})),
+            tables=['store_cart', 'store_cartitem', 'store_product'])
+
+        assert response.status_code == status.HTTP_200_OK
+
+
+    def test_cart_items(self, api_client, capture_plans, seeded):
+        response = capture_plans(
+            lambda: api_client.get(reverse('cart-items-list', kwargs={'cart_pk': seeded['cart'].id})),
+            tables=['store_cartitem', 'store_product'])
+
+        assert response.status_code == status.HTTP_200_OK
+
+
+    def test_customer_history(self, api_client, capture_plans, seeded):
+        customer = baker.make(get_user_model()).customer
+        for order in baker.make(Order, customer=customer, _quantity=20):
+            baker.make(OrderItem, order=order, product=seeded['product'], quantity=1)
+        baker.make(Order, customer=baker.make(get_user_model()).customer, _quantity=20)
+        api_client.force_authenticate(user=get_user_model()(is_staff=True, is_superuser=True))
+
+        response = capture_plans(
+            lambda: api_client.get(reverse('customer-history', kwargs={'pk': customer.id})),
+            tables=['store_order', 'store_orderitem', 'store_archivedorder', 'store_archivedorderitem'])
+
+        assert response.status_code == status.HTTP_200_OK
+
+
+    @pytest.mark.parametrize('ordering', ['sort_key', '-sort_key'])
+    def test_customer_list_cursor_pages(self, api_client, capture_plans, ordering):
+        for i in range(50):
+            baker.make(get_user_model(), first_name=f'First {i}', last_name=f'Last {i}')
+        api_client.force_authenticate(user=get_user_model()(is_staff=True))
+        first = api_client.get(reverse('customer-list'), {'ordering': ordering})
+
+        response = capture_plans(
+            lambda: api_client.get(first.data['next']),
+            tables=['store_customer', 'core_user'])
+
+        assert response.status_code == status.HTTP_200_OK
+
+
+    def test_customer_sort_key_prefix(self, capture_plans):
+        for i in range(50):
+            baker.make(get_user_model(), first_name=f'First {i}', last_name=f'Last {i}')
+
+        customers = capture_plans(
+            lambda: list(Customer.objects.filter(sort_key_prefix('FIRST 1')).order_by('sort_key', 'id')[:10]),
+            tables=['store_customer'])
+
+        assert [customer.sort_key for customer in customers] == ['first 1 last 1'] + [f'first 1{i} last 1{i}' for i in range(9)]
+
+
+    def test_tags_for_product(self, capture_plans, seeded):
+        tags = capture_plans(
+            lambda: list(TaggedItem.objects.get_tags_for(Product, seeded['product'].id)),
+            tables=['tags_taggeditem', 'tags_tag'])
+
+        assert len(tags) == 1
@@ -0,0 +1,150 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from uuid import uuid4
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+from model_bakery import baker
+from rest_framework import status
+import pytest
+
+from store.carts import reap_carts
+from store.models import Cart, CartItem, Product, Reservation
+from store.reservations import get_reservation_store, load_reservation_store
+from store.tasks import reconcile_reservations
+
+
+@pytest.fixture(autouse=True)
+def reservations(settings):
+    settings.STORE_RESERVATION_BACKEND = 'store.reservations.DatabaseReservationStore'
+    load_reservation_store.cache_clear()
+    yield get_reservation_store()
+    load_reservation_store.cache_clear()
+
+
+@pytest.fixture
+def add_item(api_client):
+    def perform_add(cart_id, product_id, quantity=1):
+        return api_client.post(
+            reverse('cart-items-list', kwargs={'cart_pk': cart_id}),
+            {'product_id': product_id, 'quantity': quantity},
+            format='json')
+    return perform_add
+
+
+@pytest.mark.django_db
+class TestReservations:
+
+    def test_if_adding_beyond_available_stock_returns_400(self, add_item, reservations):
+        product = baker.make(Product, inventory=3)
+        first, second = baker.make(Cart, _quantity=2)
+
+        assert add_item(first.id, product.id, 2).status_code == status.HTTP_201_CREATED
+        response = add_item(second.id, product.id, 2)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['quantity'] is not None
+        assert not CartItem.objects.filter(cart=second).exists()
+        assert reservations.available(product.id) == 1
+
+
+    def test_if_cart_does_not_exist_returns_404_and_holds_nothing(self, add_item, reservations):
+        product = baker.make(Product, inventory=3)
+
+        response = add_item(uuid4(), product.id, 3)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert not Reservation.objects.exists()
+        assert reservations.available(product.id) == 3
+
+
+    def test_if_bulk_add_holds_all_lines_or_none(self, api_client, reservations):
+        plenty = baker.make(Product, inventory=10)
+        scarce = baker.make(Product, inventory=1)
+        cart = baker.make(Cart)
+
+        response = api_client.post(
+            reverse('cart-items-bulk', kwargs={'cart_pk': cart.id}),
+            [{'product_id': plenty.id, 'quantity': 5}, {'product_id': scarce.id, 'quantity': 2}],
+            format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert reservations.available(plenty.id) == 10
+
+
+    def test_if_updating_quantity_moves_the_hold(self, api_client, add_item, reservations):
+        product = baker.make(Product, inventory=5)
+        cart = baker.make(Cart)
+        item_id = add_item(cart.id, product.id, 2).data['id']
+        url = reverse('cart-items-detail', kwargs={'cart_pk': cart.id, 'pk': item_id})
+
+        assert api_client.patch(url, {'quantity': 4}, format='json').status_code == status.HTTP_200_OK
+        assert reservations.available(product.id) == 1
+        assert api_client.patch(url, {'quantity': 6}, format='json').status_code == status.HTTP_400_BAD_REQUEST
+        assert api_client.patch(url, {'quantity': 1}, format='json').status_code == status.HTTP_200_OK
+        assert reservations.available(product.id) == 4
+
+
+    def test_if_deleting_the_cart_releases_its_holds(self, api_client, add_item, reservations):
+        product = baker.make(Product, inventory=5)
+        cart = baker.make(Cart)
+        add_item(cart.id, product.id, 5)
+
+        api_client.delete(reverse('cart-detail', kwargs={'pk': cart.id}))
+
+        assert reservations.available(product.id) == 5
+
+
+    def test_if_reaping_carts_releases_their_holds(self, add_item, reservations):
+        product = baker.make(Product, inventory=5)
+        cart = baker.make(Cart)
+        add_item(cart.id, product.id, 5)
+        Cart.objects.filter(pk=cart.pk).update(created_at=timezone.now() - timedelta(days=2))
+
+        reap_carts(timedelta(days=1))
+
+        assert not Reservation.objects.exists()
+        assert reservations.available(product.id) == 5
+
+
+    def test_if_checkout_consumes_the_holds(self, api_client, add_item, reservations, django_capture_on_commit_callbacks):
+        product = baker.make(Product, inventory=5)
+        cart = baker.make(Cart)
+        add_item(cart.id, product.id, 2)
+
+        api_client.force_authenticate(user=baker.make(get_user_model()))
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(reverse('orders-list'), {'cart_id': cart.id}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert not Reservation.objects.exists()
+        assert reservations.available(product.id) == 3
+
+
+    def test_if_expired_holds_are_ignored_and_reconciled(self, add_item, reservations):
+        product = baker.make(Product, inventory=2)
+        baker.make(Reservation, cart_id=uuid4(), product=product, quantity=2,
+                   expires_at=timezone.now() - timedelta(seconds=1))
+
+        assert add_item(baker.make(Cart).id, product.id, 2).status_code == status.HTTP_201_CREATED
+        assert reconcile_reservations() == 1
+        assert Reservation.objects.count() == 1
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.skipif(connection.vendor == 'sqlite', reason='SQLite has no row locks.')
+def test_concurrent_reservations_do_not_oversell(reservations):
+    product = baker.make(Product, inventory=10)
+
+    def perform_reserve(_):
+        try:
+            return reservations.reserve(uuid4(), product.id, 1)
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        results = list(executor.map(perform_reserve, range(50)))
+
+    assert results.count(True) == 10
+    assert reservations.available(product.id) == 0
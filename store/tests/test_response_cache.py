@@ -0,0 +1,109 @@
+from django.core.cache import cache
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework import status
+import pytest
+
+from store.cache import modified_key, version_key
+from store.models import Collection, Product, ProductImage
+
+
+@pytest.mark.django_db
+class TestProductResponseCache:
+
+    def test_if_list_is_served_from_cache(self, api_client, django_assert_num_queries):
+        baker.make(Product, _quantity=3)
+        first = api_client.get(reverse('products-list'), {'ordering': 'unit_price'})
+
+        with django_assert_num_queries(0):
+            second = api_client.get(reverse('products-list'), {'ordering': 'unit_price'})
+
+        assert second.status_code == status.HTTP_200_OK
+        assert second.data == first.data
+
+
+    def test_if_query_params_are_part_of_the_key(self, api_client):
+        baker.make(Product, _quantity=3)
+        api_client.get(reverse('products-list'))
+
+        response = api_client.get(reverse('products-list'), {'fields': 'id'})
+
+        assert list(response.data['results'][0]) == ['id']
+
+
+    def test_if_saving_a_product_invalidates_list_and_its_detail_only(self, api_client, django_assert_num_queries):
+        product, other = baker.make(Product, _quantity=2)
+        api_client.get(reverse('products-list'))
+        api_client.get(reverse('products-detail', kwargs={'pk': product.id}))
+        api_client.get(reverse('products-detail', kwargs={'pk': other.id}))
+
+        product.title = 'Updated'
+        product.save()
+
+        list_response = api_client.get(reverse('products-list'))
+        detail_response = api_client.get(reverse('products-detail', kwargs={'pk': product.id}))
+        with django_assert_num_queries(0):
+            api_client.get(reverse('products-detail', kwargs={'pk': other.id}))
+
+        assert product.id in [item['id'] for item in list_response.data['results'] if item['title'] == 'Updated']
+        assert detail_response.data['title'] == 'Updated'
+
+
+    def test_if_adding_an_image_invalidates_the_product(self, api_client):
+        product = baker.make(Product)
+        api_client.get(reverse('products-detail', kwargs={'pk': product.id}))
+
+        baker.make(ProductImage, product=product, image='store/images/a.jpg')
+
+        response = api_client.get(reverse('products-detail', kwargs={'pk': product.id}))
+        assert len(response.data['images']) == 1
+
+
+    def test_if_deleting_a_product_invalidates_the_list(self, api_client):
+        product = baker.make(Product)
+        api_client.get(reverse('products-list'))
+
+        product.delete()
+
+        response = api_client.get(reverse('products-list'))
+        assert response.data['count'] == 0
+
+
+    @pytest.mark.parametrize('resource, url_name', [('products', 'products-detail'), ('collections', 'collection-detail')])
+    def test_if_missing_objects_leave_no_version_keys(self, api_client, resource, url_name):
+        for pk in ['bogus', 0]:
+            response = api_client.get(reverse(url_name, kwargs={'pk': pk}))
+
+            assert response.status_code == status.HTTP_404_NOT_FOUND
+            assert cache.get(version_key(resource, pk)) is None
+            assert cache.get(modified_key(resource, pk)) is None
+
+
+@pytest.mark.django_db
+class TestCollectionResponseCache:
+
+    def test_if_product_changes_refresh_products_count(self, api_client):
+        collection, other = baker.make(Collection, _quantity=2)
+        product = baker.make(Product, collection=collection)
+        api_client.get(reverse('collection-detail', kwargs={'pk': collection.id}))
+        api_client.get(reverse('collection-detail', kwargs={'pk': other.id}))
+
+        product.collection = other
+        product.save()
+
+        old = api_client.get(reverse('collection-detail', kwargs={'pk': collection.id}))
+        new = api_client.get(reverse('collection-detail', kwargs={'pk': other.id}))
+        assert old.data['products_count'] == 0
+        assert new.data['products_count'] == 1
+
+
+    def test_if_renaming_a_collection_invalidates_the_list(self, api_client):
+        collection = baker.make(Collection)
+        api_client.get(reverse('collection-list'))
+
+        collection.title = 'Renamed'
+        collection.save()
+
+        response = api_client.get(reverse('collection-list'))
+        titles = {item['id']: item['title'] for item in response.data}
+        assert titles[collection.id] == 'Renamed'
@@ -1,45 +1,103 @@
-from django.db.models.aggregates import Count
+from uuid import UUID
+from django.core.cache import cache
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import Http404
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import action
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.generics import get_object_or_404
+from rest_framework.filters import OrderingFilter
 from rest_framework.mixins import CreateModelMixin, DestroyModelMixin, RetrieveModelMixin
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, GenericViewSet
 from rest_framework import status
 
-from .filters import ProductFilter
-from .models import Cart, CartItem, Collection, Customer, Order, OrderItem, Product, ProductImage, Review
+from .analytics import sales_report
+from .cache import CachedResponseMixin, ConditionalGetMixin, cart_summary_key, forget_version, history_key
+from .carts import get_cart_store
+from .customers import customers
+from .exports import EXPORT_FORMATS, export_orders
+from .filters import ArchivedOrderFilter, CustomerSearchFilter, OrderFilter, ProductFilter, ProductSearchFilter
+from .models import ArchivedOrder, ArchivedOrderItem, Cart, CartItem, Collection, Customer, Order, OrderItem, Product, ProductImage, Review
 from .permissions import IsAdminOrReadOnly, ViewCustomerHistoryPermission
-from .pagination import DefaultPagination
-from .serializers import AddCartItemSerializer, CartItemSerializer, CartSerializer, CollectionSerializer, CreateOrderSerializer, CustomerSerializer, OrderSerializer, ProductImageSerializer, ProductSerializer, ReviewSerializer, UpdateCartItemSerializer, UpdateOrderSerializer
+from .pagination import CustomerPagination, DefaultPagination, HistoryPagination, KeysetPagination, OrderPagination
+from .reservations import get_reservation_store
+from .serializers import reserve_stock, CompiledCollectionSerializer, CompiledProductSerializer, CompiledSimpleProductSerializer, AddCartItemSerializer, ArchivedOrderSerializer, BulkAddCartItemSerializer, CartItemSerializer, CartSerializer, CollectionSerializer, CreateOrderSerializer, CustomerSerializer, OrderSerializer, ProductImageSerializer, ProductSerializer, ReviewSerializer, SalesReportQuerySerializer, UpdateCartItemSerializer, UpdateOrderSerializer
 
 
-class ProductViewSet(ModelViewSet):
-    queryset = Product.objects.prefetch_related('images').all()
+class CompiledListMixin:
+    """
+    Renders `list` through a compiled serializer instead of the DRF one.
+    """
+    compiled_serializer_class = None
+
+    def get_compiled_serializer(self):
+        return self.compiled_serializer_class(context=self.get_serializer_context())
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_compiled_serializer()
+        queryset = serializer.get_queryset(
+            self.filter_queryset(self.get_queryset()),
+            extra_columns=getattr(self, 'ordering_fields', None) or ())
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.to_representation(page))
+        return Response(serializer.to_representation(queryset))
+
+
+class ProductViewSet(ConditionalGetMixin, CachedResponseMixin, CompiledListMixin, ModelViewSet):
+    cache_resource = 'products'
     serializer_class = ProductSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, OrderingFilter]
     filterset_class = ProductFilter
     pagination_class = DefaultPagination
     permission_classes = [IsAdminOrReadOnly]
     search_fields = ['title', 'description']
     ordering_fields = ['unit_price', 'last_update']
 
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.request.query_params.get('pagination') == 'cursor':
+                self._paginator = KeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_queryset(self):
+        queryset = Product.objects.all()
+        fields = ProductSerializer.get_requested_fields(self.request)
+        if 'images' in fields:
+            queryset = queryset.prefetch_related('images')
+        if 'description' not in fields:
+            queryset = queryset.defer('description')
+        return queryset
+
     def get_serializer_context(self):
         return {'request': self.request}
 
+    def get_compiled_serializer(self):
+        return CompiledProductSerializer(
+            ProductSerializer.get_requested_fields(self.request),
+            context=self.get_serializer_context())
+
     def destroy(self, request, *args, **kwargs):
-        if OrderItem.objects.filter(product_id=kwargs['pk']).count() > 0:
+        if OrderItem.objects.filter(product_id=kwargs['pk']).exists() or \
+                ArchivedOrderItem.objects.filter(product_id=kwargs['pk']).exists():
             return Response({'error': 'Product cannot be deleted because it is associated with an order item.'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
         return super().destroy(request, *args, **kwargs)
 
 
-class CollectionViewSet(ModelViewSet):
-    queryset = Collection.objects.annotate(
-        products_count=Count('products')).all()
+class CollectionViewSet(CachedResponseMixin, CompiledListMixin, ModelViewSet):
+    cache_resource = 'collections'
+    queryset = Collection.objects.all()
     serializer_class = CollectionSerializer
     permission_classes = [IsAdminOrReadOnly]
+    compiled_serializer_class = CompiledCollectionSerializer
 
     def destroy(self, request, *args, **kwargs):
         if Product.objects.filter(collection_id=kwargs['pk']):
@@ -58,15 +116,214 @@ class ReviewViewSet(ModelViewSet):
         return {'product_id': self.kwargs['product_pk']}
 
 
-class CartViewSet(CreateModelMixin,
+def parse_cart_id(value):
+    try:
+        return UUID(str(value))
+    except ValueError:
+        raise NotFound()
+
+
+def render_stored_items(items):
+    """
+    Render `{product_id: quantity}` the way CartItemSerializer renders
+    CartItem rows, using the product ID as the line ID.
+    """
+    serializer = CompiledSimpleProductSerializer()
+    rows = serializer.get_queryset(Product.objects.filter(pk__in=items))
+    products = {product['id']: product for product in serializer.to_representation(rows)}
+    return [
+        {
+            'id': product_id,
+            'product': products[product_id],
+            'quantity': quantity,
+            'total_price': quantity * products[product_id]['unit_price'],
+        }
+        for product_id, quantity in sorted(items.items())
+        if product_id in products
+    ]
+
+
+def render_stored_cart(cart_id, items):
+    items = render_stored_items(items)
+    return {
+        'id': str(cart_id),
+        'items': items,
+        'total_price': sum(item['total_price'] for item in items),
+    }
+
+
+class StoredCartMixin:
+    """
+    Serves carts from the cart store when STORE_CART_BACKEND is set, with
+    the same responses as the database-backed endpoints.
+    """
+
+    def create(self, request, *args, **kwargs):
+        store = get_cart_store()
+        if store is None:
+            return super().create(request, *args, **kwargs)
+
+        cart_id = store.create()
+        return Response(
+            {'id': str(cart_id), 'items': [], 'total_price': 0},
+            status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, *args, **kwargs):
+        store = get_cart_store()
+        if store is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        cart_id = parse_cart_id(kwargs['pk'])
+        items = store.get_items(cart_id)
+        if items is None:
+            raise NotFound()
+        return Response(render_stored_cart(cart_id, items))
+
+    def destroy(self, request, *args, **kwargs):
+        store = get_cart_store()
+        if store is None:
+            return super().destroy(request, *args, **kwargs)
+
+        cart_id = parse_cart_id(kwargs['pk'])
+        if not store.delete(cart_id):
+            raise NotFound()
+        Cart.objects.filter(pk=cart_id).delete()
+        reservations = get_reservation_store()
+        if reservations is not None:
+            reservations.release_cart(cart_id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class StoredCartItemMixin:
+    """
+    The cart item counterpart of StoredCartMixin.
+    """
+
+    def get_stored_items(self, store):
+        items = store.get_items(parse_cart_id(self.kwargs['cart_pk']))
+        if items is None:
+            raise NotFound()
+        return items
+
+    def get_product_id(self):
+        try:
+            return int(self.kwargs['pk'])
+        except ValueError:
+            raise NotFound()
+
+    def list(self, request, *args, **kwargs):
+        store = get_cart_store()
+        if store is None:
+            return super().list(request, *args, **kwargs)
+
+        return Response(render_stored_items(self.get_stored_items(store)))
+
+    def retrieve(self, request, *args, **kwargs):
+        store = get_cart_store()
+        if store is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        product_id = self.get_product_id()
+        items = self.get_stored_items(store)
+        if product_id not in items:
+            raise NotFound()
+        return Response(render_stored_items({product_id: items[product_id]})[0])
+
+    def create(self, request, *args, **kwargs):
+        store = get_cart_store()
+        if store is None:
+            return super().create(request, *args, **kwargs)
+
+        cart_id = parse_cart_id(self.kwargs['cart_pk'])
+        serializer = AddCartItemSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        product_id = serializer.validated_data['product_id']
+        reserve_stock(cart_id, {product_id: serializer.validated_data['quantity']})
+        quantity = store.add_item(cart_id, product_id, serializer.validated_data['quantity'])
+        if quantity is None:
+            reservations = get_reservation_store()
+            if reservations is not None:
+                reservations.release_cart(cart_id)
+            raise NotFound()
+        return Response(
+            {'id': product_id, 'product_id': product_id, 'quantity': quantity},
+            status=status.HTTP_201_CREATED)
+
+    def partial_update(self, request, *args, **kwargs):
+        store = get_cart_store()
+        if store is None:
+            return super().partial_update(request, *args, **kwargs)
+
+        cart_id = parse_cart_id(self.kwargs['cart_pk'])
+        product_id = self.get_product_id()
+        serializer = UpdateCartItemSerializer(data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        current = self.get_stored_items(store).get(product_id)
+        if current is None:
+            raise NotFound()
+        if 'quantity' not in serializer.validated_data:
+            return Response({'quantity': current})
+
+        quantity = serializer.validated_data['quantity']
+        reservations = get_reservation_store()
+        if reservations is not None and not reservations.adjust(cart_id, product_id, current, quantity):
+            raise ValidationError({'quantity': 'Not enough inventory for this product.'})
+        if store.set_item(cart_id, product_id, quantity) is None:
+            raise NotFound()
+        return Response({'quantity': quantity})
+
+    def destroy(self, request, *args, **kwargs):
+        store = get_cart_store()
+        if store is None:
+            return super().destroy(request, *args, **kwargs)
+
+        cart_id = parse_cart_id(self.kwargs['cart_pk'])
+        product_id = self.get_product_id()
+        if not store.remove_item(cart_id, product_id):
+            raise NotFound()
+        reservations = get_reservation_store()
+        if reservations is not None:
+            reservations.release(cart_id, product_id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CartViewSet(StoredCartMixin,
+                  CreateModelMixin,
                   RetrieveModelMixin,
                   DestroyModelMixin,
                   GenericViewSet):
-    queryset = Cart.objects.prefetch_related('items__product').all()
+    queryset = Cart.objects \
+        .with_totals() \
+        .prefetch_related(Prefetch(
+            'items',
+            queryset=CartItem.objects.with_total_price().select_related('product')))
     serializer_class = CartSerializer
-
-
-class CartItemViewSet(ModelViewSet):
+    summary_timeout = 60 * 10
+
+    @action(detail=True)
+    def summary(self, request, pk):
+        store = get_cart_store()
+        if store is not None:
+            cart_id = parse_cart_id(pk)
+            items = store.get_items(cart_id)
+            if items is None:
+                raise NotFound()
+            return Response({
+                'items_count': sum(items.values()),
+                'total_price': render_stored_cart(cart_id, items)['total_price'],
+            })
+
+        key = cart_summary_key(pk)
+        summary = cache.get(key)
+        if summary is None:
+            summary = get_object_or_404(
+                Cart.objects.with_totals().values('items_count', 'total_price'),
+                pk=pk)
+            cache.set(key, summary, self.summary_timeout)
+        return Response(summary)
+
+
+class CartItemViewSet(StoredCartItemMixin, ModelViewSet):
     http_method_names = ['get', 'post', 'patch', 'delete']
 
     def get_serializer_class(self):
@@ -81,23 +338,91 @@ class CartItemViewSet(ModelViewSet):
 
     def get_queryset(self):
         return CartItem.objects \
+            .with_total_price() \
             .filter(cart_id=self.kwargs['cart_pk']) \
             .select_related('product')
 
+    @action(detail=False, methods=['POST'])
+    def bulk(self, request, cart_pk):
+        serializer = BulkAddCartItemSerializer(
+            data=request.data,
+            many=True,
+            allow_empty=False,
+            context=self.get_serializer_context())
+        store = get_cart_store()
+
+        if store is not None:
+            cart_id = parse_cart_id(cart_pk)
+            if not store.exists(cart_id):
+                raise NotFound()
+            serializer.is_valid(raise_exception=True)
+            reserve_stock(cart_id, serializer.quantities)
+            for product_id, quantity in serializer.quantities.items():
+                store.add_item(cart_id, product_id, quantity)
+            return Response(render_stored_cart(cart_id, store.get_items(cart_id)))
+
+        cart = get_object_or_404(Cart.objects.only('pk'), pk=cart_pk)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        cart = CartViewSet.queryset.get(pk=cart.pk)
+        return Response(CartSerializer(cart).data)
+
+
+def prefetch_items(item_model):
+    """Order items joined to the few product columns SimpleProductSerializer renders."""
+    return Prefetch(
+        'items',
+        queryset=item_model.objects
+            .select_related('product')
+            .only('id', 'order_id', 'unit_price', 'quantity',
+                  'product__id', 'product__title', 'product__unit_price'))
+
 
 class CustomerViewSet(ModelViewSet):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
     permission_classes = [IsAdminUser]
+    # Listing, ordering and search only touch the customer table's own
+    # indexed name columns.
+    filter_backends = [CustomerSearchFilter]
+    search_fields = ['sort_key', 'last_name']
+    pagination_class = CustomerPagination
+
+    history_timeout = 60 * 10
 
     @action(detail=True, permission_classes=[ViewCustomerHistoryPermission])
     def history(self, request, pk):
-        return Response('ok')
+        # Pages are cached per customer and dropped when any of the
+        # customer's orders change. Building a page takes at most five queries
+        # however many orders the customer has: the customer, then the
+        # orders and their items from the order and archive tables.
+        try:
+            pk = int(pk)
+        except ValueError:
+            raise NotFound()
+        paginator = HistoryPagination()
+        key = history_key(pk, paginator.get_page_url(request))
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        if not Customer.objects.filter(pk=pk).exists():
+            forget_version('history', pk)
+            raise NotFound()
+        orders = paginator.paginate_querysets([
+            Order.objects.filter(customer_id=pk).prefetch_related(prefetch_items(OrderItem)),
+            ArchivedOrder.objects.filter(customer_id=pk).prefetch_related(prefetch_items(ArchivedOrderItem)),
+        ], request, self)
+        response = paginator.get_paginated_response([
+            (ArchivedOrderSerializer if isinstance(order, ArchivedOrder) else OrderSerializer)(order).data
+            for order in orders
+        ])
+        cache.set(key, response.data, self.history_timeout)
+        return response
 
     @action(detail=False, methods=['GET', 'PUT'], permission_classes=[IsAuthenticated])
     def me(self, request):
-        customer = Customer.objects.get(
-            user_id=request.user.id)
+        customer = Customer.objects.get(pk=customers.resolve(request))
         if request.method == 'GET':
             serializer = CustomerSerializer(customer)
             return Response(serializer.data)
@@ -110,21 +435,54 @@ class CustomerViewSet(ModelViewSet):
 
 class OrderViewSet(ModelViewSet):
     http_method_names = ['get', 'post', 'patch', 'delete', 'head', 'options']
+    pagination_class = OrderPagination
 
     def get_permissions(self):
-        if self.request.method in ['PATCH', 'DELETE']:
+        if self.request.method in ['PATCH', 'DELETE'] or self.action == 'export':
             return [IsAdminUser()]
         return [IsAuthenticated()]
 
+    @action(detail=False)
+    def export(self, request):
+        export_format = request.query_params.get('export_format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            raise ValidationError({'export_format': f'Choose one of {sorted(EXPORT_FORMATS)}.'})
+        orders = OrderFilter(request.query_params, queryset=Order.objects.all())
+        if not orders.is_valid():
+            raise ValidationError(orders.errors)
+        archived = ArchivedOrderFilter(request.query_params, queryset=ArchivedOrder.objects.all())
+
+        response = StreamingHttpResponse(
+            export_orders([orders.qs, archived.qs], export_format),
+            content_type=EXPORT_FORMATS[export_format])
+        response['Content-Disposition'] = f'attachment; filename="orders.{export_format}"'
+        return response
+
     def create(self, request, *args, **kwargs):
         serializer = CreateOrderSerializer(
             data=request.data,
-            context={'user_id': self.request.user.id})
+            context={'customer_id': customers.resolve(request)})
         serializer.is_valid(raise_exception=True)
         order = serializer.save()
+        prefetch_related_objects([order], 'items__product')
         serializer = OrderSerializer(order)
         return Response(serializer.data)
 
+    def retrieve(self, request, *args, **kwargs):
+        # Orders moved out by `archive_orders` keep their IDs, so a miss in
+        # the Order table falls through to the archive.
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            order = get_object_or_404(self.get_archived_queryset(), pk=kwargs['pk'])
+            return Response(ArchivedOrderSerializer(order).data)
+
+    def get_archived_queryset(self):
+        queryset = ArchivedOrder.objects.prefetch_related(prefetch_items(ArchivedOrderItem))
+        if self.request.user.is_staff:
+            return queryset
+        return queryset.filter(customer_id=customers.resolve(self.request))
+
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return CreateOrderSerializer
@@ -134,13 +492,23 @@ class OrderViewSet(ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
+        # Two queries for any number of orders: the orders, then their items.
+        queryset = Order.objects.prefetch_related(prefetch_items(OrderItem))
 
         if user.is_staff:
-            return Order.objects.all()
+            return queryset
+
+        return queryset.filter(customer_id=customers.resolve(self.request))
+
+
+class AnalyticsViewSet(GenericViewSet):
+    permission_classes = [IsAdminUser]
 
-        customer_id = Customer.objects.only(
-            'id').get(user_id=user.id)
-        return Order.objects.filter(customer_id=customer_id)
+    def list(self, request):
+        # Answered from the daily rollups only; the order tables are not read.
+        query = SalesReportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return Response(sales_report(**query.validated_data))
 
 
 class ProductImageViewSet(ModelViewSet):
@@ -143,7 +143,8 @@ DJOSER = {
 
 SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('JWT',),
-    'ACCESS_TOKEN_LIFETIME': timedelta(days=1)
+    'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
+    'TOKEN_OBTAIN_SERIALIZER': 'core.serializers.TokenObtainPairSerializer',
 }
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -163,7 +164,27 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'playground.tasks.notify_customers',
         'schedule': 5,
         'args': ['Hello World'],
-    }
+    },
+    'flush_carts': {
+        'task': 'store.tasks.flush_carts',
+        'schedule': 5 * 60,
+    },
+    'reap_abandoned_carts': {
+        'task': 'store.tasks.reap_abandoned_carts',
+        'schedule': 60 * 60,
+    },
+    'reconcile_reservations': {
+        'task': 'store.tasks.reconcile_reservations',
+        'schedule': 60,
+    },
+    'relay_outbox': {
+        'task': 'store.tasks.relay_outbox',
+        'schedule': 60,
+    },
+    'archive_old_orders': {
+        'task': 'store.tasks.archive_old_orders',
+        'schedule': 60 * 60 * 24,
+    },
 }
 
 CACHES = {
@@ -176,6 +197,32 @@ CACHES = {
     }
 }
 
+# Set to 'store.carts.RedisCartStore' to keep anonymous carts in Redis and
+# only write them to the database at checkout or from `flush_carts`.
+STORE_CART_BACKEND = None
+STORE_CART_REDIS_URL = 'redis://localhost:6379/3'
+# Carts older than this are deleted by `reap_abandoned_carts`.
+STORE_CART_TTL = timedelta(days=30)
+
+# Set to 'store.reservations.RedisReservationStore' (or the database-backed
+# 'store.reservations.DatabaseReservationStore') to hold stock when items are
+# added to a cart rather than only checking it at checkout.
+STORE_RESERVATION_BACKEND = None
+STORE_RESERVATION_REDIS_URL = 'redis://localhost:6379/4'
+STORE_RESERVATION_TTL = STORE_CART_TTL
+
+# Delivered outbox events are deleted by `relay_outbox` after this long.
+STORE_OUTBOX_RETENTION = timedelta(days=7)
+
+# Lifetimes, in seconds, of the user -> customer mappings kept in each
+# process and in the shared cache.
+STORE_CUSTOMER_LOCAL_TTL = 60
+STORE_CUSTOMER_CACHE_TTL = 60 * 60 * 24
+
+# Orders placed longer ago than this are moved to the archive tables by
+# `archive_old_orders`.
+STORE_ORDER_ARCHIVE_AGE = timedelta(days=365)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,